@@ -0,0 +1,181 @@
+import logging
+import os
+import threading
+from collections import deque
+
+LOGGER = logging.getLogger("Artifacts")
+
+PRIORITY_EVIDENCE = 0
+PRIORITY_DEBUG = 1
+DEFAULT_SCREENSHOT_DIR = os.path.join(os.curdir, "screenshot")
+DEFAULT_QUEUE_MB = 64
+DEFAULT_MAX_FILES = 2000
+DEFAULT_MAX_MB = 1024
+# PNG 压缩等级, 越低编码越快
+DEFAULT_COMPRESS_LEVEL = 3
+# 不受保留策略清理的文件前缀
+PROTECTED_PREFIXES = ("god_pack_", "double_twostar_pack_")
+
+
+def image_bytes(image):
+    return image.width * image.height * len(image.getbands())
+
+
+class ArtifactWriter:
+    """
+    在后台线程编码并写入截图, 队列按字节数限制内存
+    队列满时先丢弃调试截图, 神包截图总是保留
+    """
+
+    def __init__(
+        self,
+        directory=DEFAULT_SCREENSHOT_DIR,
+        max_queue_bytes=DEFAULT_QUEUE_MB * 1024 * 1024,
+        max_files=DEFAULT_MAX_FILES,
+        max_bytes=DEFAULT_MAX_MB * 1024 * 1024,
+        compress_level=DEFAULT_COMPRESS_LEVEL,
+        protected_prefixes=PROTECTED_PREFIXES,
+    ):
+        self.directory = directory
+        self.max_queue_bytes = max_queue_bytes
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.compress_level = compress_level
+        self.protected_prefixes = tuple(protected_prefixes)
+        self.condition = threading.Condition()
+        # (priority, image, path, on_done, size)
+        self.pending = deque()
+        self.pending_bytes = 0
+        self.dropped = 0
+        self.closed = False
+        # 可清理的已有文件, 按修改时间排序
+        self.files = deque()
+        self.files_bytes = 0
+        self._scan()
+        self.thread = threading.Thread(
+            target=self._writer_loop, name="ArtifactWriter", daemon=True
+        )
+        self.thread.start()
+
+    def save(self, image, path, priority=PRIORITY_EVIDENCE, on_done=None):
+        """
+        加入写入队列后立即返回, 被丢弃时返回 False
+        写入完成后以文件路径调用 on_done
+        """
+        size = image_bytes(image)
+        with self.condition:
+            if self.closed:
+                return False
+            if self.pending_bytes + size > self.max_queue_bytes:
+                self._drop_debug(size)
+            if (
+                priority >= PRIORITY_DEBUG
+                and self.pending_bytes + size > self.max_queue_bytes
+            ):
+                self.dropped += 1
+                LOGGER.warning(f"Artifact queue full, dropped {path}")
+                return False
+            self.pending.append((priority, image, path, on_done, size))
+            self.pending_bytes += size
+            self.condition.notify()
+        return True
+
+    def close(self, timeout=30):
+        """
+        等待队列写入完毕
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join(timeout)
+
+    def _drop_debug(self, size):
+        """
+        从最旧的调试截图开始丢弃, 直到能放下新截图
+        """
+        kept = deque()
+        for entry in self.pending:
+            if (
+                entry[0] >= PRIORITY_DEBUG
+                and self.pending_bytes + size > self.max_queue_bytes
+            ):
+                self.pending_bytes -= entry[4]
+                self.dropped += 1
+                LOGGER.warning(f"Artifact queue full, dropped {entry[2]}")
+            else:
+                kept.append(entry)
+        self.pending = kept
+
+    def _writer_loop(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.closed:
+                    self.condition.wait()
+                if not self.pending:
+                    return
+                _, image, path, on_done, size = self.pending.popleft()
+            try:
+                self._write(image, path)
+            except Exception as e:
+                LOGGER.error(f"Failed to save {path}: {e}")
+                path = None
+            with self.condition:
+                self.pending_bytes -= size
+            if path:
+                self._retain(path)
+                if on_done:
+                    try:
+                        on_done(path)
+                    except Exception as e:
+                        LOGGER.error(f"Artifact callback failed for {path}: {e}")
+
+    def _write(self, image, path):
+        tmp_path = f"{path}.tmp"
+        image_format = os.path.splitext(path)[1].lstrip(".").upper() or "PNG"
+        if image_format == "JPG":
+            image_format = "JPEG"
+        if image_format == "PNG":
+            image.save(tmp_path, format="PNG", compress_level=self.compress_level)
+        else:
+            image.save(tmp_path, format=image_format)
+        os.replace(tmp_path, path)
+
+    def _is_protected(self, path):
+        return os.path.basename(path).startswith(self.protected_prefixes)
+
+    def _scan(self):
+        try:
+            entries = [
+                entry
+                for entry in os.scandir(self.directory)
+                if entry.is_file()
+                and not entry.name.endswith(".tmp")
+                and not self._is_protected(entry.name)
+            ]
+        except FileNotFoundError:
+            return
+        for entry in sorted(entries, key=lambda entry: entry.stat().st_mtime):
+            size = entry.stat().st_size
+            self.files.append((entry.path, size))
+            self.files_bytes += size
+
+    def _retain(self, path):
+        """
+        超过数量或大小限制时删除最旧的非保护文件
+        """
+        if self._is_protected(path):
+            return
+        size = os.path.getsize(path)
+        self.files.append((path, size))
+        self.files_bytes += size
+        while self.files and (
+            len(self.files) > self.max_files or self.files_bytes > self.max_bytes
+        ):
+            old_path, old_size = self.files.popleft()
+            self.files_bytes -= old_size
+            try:
+                os.remove(old_path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                LOGGER.warning(f"Failed to remove {old_path}: {e}")
@@ -0,0 +1,301 @@
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+LOGGER = logging.getLogger("BackupCatalog")
+
+DEFAULT_BACKUP_DIR = os.path.join(os.curdir, "backup")
+DEFAULT_CATALOG_PATH = os.path.join(DEFAULT_BACKUP_DIR, "catalog.sqlite3")
+COLUMNS = (
+    "path",
+    "port",
+    "created_at",
+    "account_name",
+    "series",
+    "pack_num",
+    "star_count",
+    "valid",
+    "god_pack",
+    "screenshot",
+    "sha256",
+    "size",
+)
+BACKUP_NAME_PATTERN = re.compile(r"^deviceAccount_(?P<port>\d+)_(?P<ts>\d+)\.xml$")
+FRIEND_BACKUP_NAME_PATTERN = re.compile(r"^(?P<code>\w+)_(?P<valid>valid|invalid)\.xml$")
+
+
+def normalize_path(path):
+    """
+    索引中统一使用绝对路径, 相对路径与绝对路径不会重复记录
+    """
+    return os.path.abspath(path)
+
+
+def file_digest(path):
+    sha256 = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            sha256.update(chunk)
+            size += len(chunk)
+    return sha256.hexdigest(), size
+
+
+class BackupCatalog:
+    """
+    备份账户的 SQLite 索引, 与备份文件一起写入
+    """
+
+    def __init__(self, db_path=DEFAULT_CATALOG_PATH):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        with self.connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS backups (
+                    id INTEGER PRIMARY KEY,
+                    path TEXT UNIQUE NOT NULL,
+                    port TEXT,
+                    created_at REAL,
+                    account_name TEXT,
+                    series TEXT,
+                    pack_num INTEGER,
+                    star_count INTEGER,
+                    valid INTEGER,
+                    god_pack INTEGER,
+                    screenshot TEXT,
+                    sha256 TEXT,
+                    size INTEGER
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sha256 ON backups (sha256)")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_valid_star ON backups (valid, star_count)"
+            )
+
+    @contextmanager
+    def connect(self):
+        """
+        打开连接, 正常退出时提交, 异常时回滚
+        """
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def commit_backup(self, tmp_path, backup_path, **meta):
+        """
+        在同一事务中写入索引并把临时文件移动到备份路径
+        任一步失败则回滚并删除临时文件
+        """
+        sha256, size = file_digest(tmp_path)
+        row = dict(meta, path=backup_path, sha256=sha256, size=size)
+        row.setdefault("created_at", time.time())
+        with self.lock:
+            try:
+                with self.connect() as conn:
+                    self._insert(conn, row)
+                    os.replace(tmp_path, backup_path)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        return sha256
+
+    def add(self, **row):
+        with self.lock:
+            with self.connect() as conn:
+                self._insert(conn, row)
+
+    def _insert(self, conn, row):
+        row = dict(row, path=normalize_path(row["path"]))
+        values = [row.get(column) for column in COLUMNS]
+        conn.execute(
+            f"INSERT OR REPLACE INTO backups ({', '.join(COLUMNS)}) "
+            f"VALUES ({', '.join('?' for _ in COLUMNS)})",
+            values,
+        )
+
+    def query(
+        self,
+        port=None,
+        series=None,
+        min_stars=None,
+        valid=None,
+        god_pack=None,
+        since=None,
+        limit=None,
+    ):
+        conditions = []
+        params = []
+        for column, value in (
+            ("port", port),
+            ("series", series),
+            ("valid", valid),
+            ("god_pack", god_pack),
+        ):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if min_stars is not None:
+            conditions.append("star_count >= ?")
+            params.append(min_stars)
+        if since is not None:
+            conditions.append("created_at >= ?")
+            params.append(since)
+        sql = f"SELECT {', '.join(COLUMNS)} FROM backups"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY created_at DESC"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        with self.connect() as conn:
+            return [dict(zip(COLUMNS, row)) for row in conn.execute(sql, params)]
+
+    def duplicates(self):
+        """
+        按 sha256 分组, 每组第一个为最早的备份
+        """
+        with self.connect() as conn:
+            rows = conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM backups WHERE sha256 IN ("
+                "SELECT sha256 FROM backups GROUP BY sha256 HAVING COUNT(*) > 1"
+                ") ORDER BY sha256, created_at"
+            ).fetchall()
+        groups = {}
+        for row in rows:
+            row = dict(zip(COLUMNS, row))
+            groups.setdefault(row["sha256"], []).append(row)
+        return list(groups.values())
+
+    def remove(self, path):
+        with self.lock:
+            with self.connect() as conn:
+                conn.execute(
+                    "DELETE FROM backups WHERE path IN (?, ?)", (path, normalize_path(path))
+                )
+
+    def scan(self, backup_dir=DEFAULT_BACKUP_DIR):
+        """
+        索引备份目录中尚未记录的文件, 从文件名推断端口和时间
+        整个扫描使用同一个连接, 新增的记录在一个事务中提交
+        """
+        added = 0
+        with self.connect() as conn:
+            known = {
+                normalize_path(row[0]) for row in conn.execute("SELECT path FROM backups")
+            }
+            rows = []
+            for entry in os.scandir(backup_dir):
+                if not entry.is_file() or not entry.name.endswith(".xml"):
+                    continue
+                path = normalize_path(entry.path)
+                if path in known:
+                    continue
+                row = {"path": path, "created_at": entry.stat().st_mtime}
+                match = BACKUP_NAME_PATTERN.match(entry.name)
+                if match:
+                    row["port"] = match.group("port")
+                    row["created_at"] = int(match.group("ts"))
+                match = FRIEND_BACKUP_NAME_PATTERN.match(entry.name)
+                if match:
+                    row["valid"] = int(match.group("valid") == "valid")
+                row["sha256"], row["size"] = file_digest(path)
+                rows.append(row)
+            with self.lock:
+                for row in rows:
+                    self._insert(conn, row)
+                    added += 1
+        return added
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the account backup catalogue")
+    parser.add_argument("--db", default=DEFAULT_CATALOG_PATH)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    scan_parser = subparsers.add_parser("scan", help="index files missing from the catalogue")
+    scan_parser.add_argument("--dir", default=DEFAULT_BACKUP_DIR)
+
+    query_parser = subparsers.add_parser("query", help="list backups")
+    export_parser = subparsers.add_parser("export", help="export backups as csv or json")
+    for sub in (query_parser, export_parser):
+        sub.add_argument("--port")
+        sub.add_argument("--series")
+        sub.add_argument("--min-stars", type=int)
+        sub.add_argument("--valid", type=int, choices=(0, 1))
+        sub.add_argument("--god-pack", type=int, choices=(0, 1))
+        sub.add_argument("--hours", type=float, help="only the last N hours")
+        sub.add_argument("--limit", type=int)
+    export_parser.add_argument("--format", choices=("csv", "json"), default="csv")
+    export_parser.add_argument("--output", help="defaults to stdout")
+
+    dedupe_parser = subparsers.add_parser("dedupe", help="find identical backups")
+    dedupe_parser.add_argument(
+        "--delete", action="store_true", help="delete all but the oldest copy"
+    )
+
+    args = parser.parse_args()
+    catalog = BackupCatalog(args.db)
+
+    if args.command == "scan":
+        print(f"Indexed {catalog.scan(args.dir)} new backups")
+    elif args.command in ("query", "export"):
+        rows = catalog.query(
+            port=args.port,
+            series=args.series,
+            min_stars=args.min_stars,
+            valid=args.valid,
+            god_pack=args.god_pack,
+            since=time.time() - args.hours * 3600 if args.hours else None,
+            limit=args.limit,
+        )
+        if args.command == "query":
+            for row in rows:
+                print(
+                    f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(row['created_at'] or 0))} "
+                    f"{row['port'] or '-'} {row['series'] or '-'} "
+                    f"stars={row['star_count'] if row['star_count'] is not None else '-'} "
+                    f"valid={row['valid'] if row['valid'] is not None else '-'} "
+                    f"{row['path']}"
+                )
+            print(f"{len(rows)} backups")
+        else:
+            output = open(args.output, "w", newline="") if args.output else sys.stdout
+            try:
+                if args.format == "json":
+                    json.dump(rows, output, indent=2)
+                else:
+                    writer = csv.DictWriter(output, fieldnames=COLUMNS)
+                    writer.writeheader()
+                    writer.writerows(rows)
+            finally:
+                if args.output:
+                    output.close()
+    elif args.command == "dedupe":
+        for group in catalog.duplicates():
+            keep, *duplicates = group
+            print(f"{keep['sha256'][:12]} keep {keep['path']}")
+            for row in duplicates:
+                print(f"{keep['sha256'][:12]} duplicate {row['path']}")
+                if args.delete:
+                    if os.path.exists(row["path"]):
+                        os.remove(row["path"])
+                    catalog.remove(row["path"])
+
+
+if __name__ == "__main__":
+    main()
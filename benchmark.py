@@ -0,0 +1,300 @@
+import argparse
+import io
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import time
+from PIL import Image
+from matcher import get_matcher
+from templatepack import collect_template_regions
+
+LOGGER = logging.getLogger("Benchmark")
+
+DEFAULT_CORPUS_DIR = os.path.join(os.curdir, "corpus")
+THRESHOLDS = tuple(round(0.5 + 0.05 * step, 2) for step in range(10))
+DEFAULT_CONFIDENCE = 0.8
+# rarity_check 中按卡牌区域搜索的模板
+BORDER_TEMPLATES = {
+    "Common": "common",
+    "RainbowBorder": "twostar",
+    "FullArtBorder": "twostar",
+    "TrianerBorder": "twostar",
+}
+# 结果变慢超过该比例时视为退化
+LATENCY_REGRESSION_RATIO = 1.2
+
+
+class CorpusDevice:
+    """
+    rarity_check 使用的设备, 截图返回语料中的画面
+    """
+
+    def __init__(self):
+        self.frame = None
+
+    def get_serialno(self):
+        return "127.0.0.1:0"
+
+    def screenshot(self):
+        return self.frame
+
+
+def load_corpus(corpus_dir):
+    """
+    labels.json 为列表, 每项:
+    {"file": "menu.png", "present": ["Menu"], "rarity": ["common", "rare", ...]}
+    present 为画面中可见的模板, rarity 只用于开包结果画面
+    """
+    with open(os.path.join(corpus_dir, "labels.json"), "r", encoding="utf-8") as f:
+        labels = json.load(f)
+    corpus = []
+    for label in labels:
+        with open(os.path.join(corpus_dir, label["file"]), "rb") as f:
+            data = f.read()
+        corpus.append(dict(label, data=data, present=set(label.get("present", []))))
+    return corpus
+
+
+def percentile(values, q):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def latency_summary(seconds):
+    return {
+        "count": len(seconds),
+        "mean_ms": 1000 * statistics.fmean(seconds) if seconds else 0,
+        "p95_ms": 1000 * percentile(seconds, 0.95),
+    }
+
+
+def classification(scores):
+    """
+    scores 为 (分数, 是否应匹配) 列表, 返回各阈值下的 precision/recall
+    """
+    result = {}
+    for threshold in THRESHOLDS:
+        tp = sum(1 for score, positive in scores if positive and score >= threshold)
+        fp = sum(1 for score, positive in scores if not positive and score >= threshold)
+        fn = sum(1 for score, positive in scores if positive and score < threshold)
+        result[str(threshold)] = {
+            "tp": tp,
+            "fp": fp,
+            "fn": fn,
+            "precision": tp / (tp + fp) if tp + fp else 1.0,
+            "recall": tp / (tp + fn) if tp + fn else 1.0,
+        }
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(corpus_dir, language="Chinese", repeat=3):
+    from reroll import BORDER_REGIONS, Reroll
+
+    corpus = load_corpus(corpus_dir)
+    matcher = get_matcher(language)
+    template_dir = os.path.join(os.curdir, "res", language)
+
+    # 解码耗时
+    decode_seconds = []
+    for item in corpus:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            image = Image.open(io.BytesIO(item["data"]))
+            image.load()
+            decode_seconds.append(time.perf_counter() - start)
+        item["image"] = image
+
+    # 每个模板与区域的耗时和准确率
+    pairs = []
+    for name, regions in sorted(collect_template_regions().items()):
+        for region in regions:
+            pairs.append((name, region, None))
+    for name, label in BORDER_TEMPLATES.items():
+        for index, region in enumerate(BORDER_REGIONS):
+            pairs.append((name, region, (index, label)))
+
+    match_seconds = {}
+    accuracy = {}
+    for name, region, border in pairs:
+        image_path = os.path.join(template_dir, f"{name}.png")
+        if not os.path.exists(image_path):
+            LOGGER.warning(f"Missing template {name}")
+            continue
+        key = f"{name}@{','.join(map(str, region)) if region else 'full'}"
+        scores = []
+        for item in corpus:
+            if border:
+                if "rarity" not in item:
+                    continue
+                index, label = border
+                positive = item["rarity"][index] == label
+            else:
+                positive = name in item["present"]
+            for _ in range(repeat):
+                start = time.perf_counter()
+                score, _ = matcher.score(image_path, item["image"], region=region)
+                match_seconds.setdefault(name, []).append(time.perf_counter() - start)
+            scores.append((score if score is not None else -1.0, positive))
+        if scores:
+            accuracy[key] = classification(scores)
+
+    # 完整的 rarity_check
+    device = CorpusDevice()
+    reroll = Reroll(
+        reroll_pack="PALKIA",
+        adb_device=device,
+        friend_code_seeker=None,
+        discord_msg=None,
+        language=language,
+        check_double_twostar=True,
+    )
+    rarity_seconds = []
+    god_pack = {"tp": 0, "fp": 0, "fn": 0}
+    rarity_errors = []
+    for item in corpus:
+        if "rarity" not in item:
+            continue
+        device.frame = item["image"]
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = reroll.rarity_check()
+            rarity_seconds.append(time.perf_counter() - start)
+        is_god_pack, rarity = result[0], result[6]
+        expected_god_pack = "common" not in item["rarity"]
+        if is_god_pack and expected_god_pack:
+            god_pack["tp"] += 1
+        elif is_god_pack:
+            god_pack["fp"] += 1
+        elif expected_god_pack:
+            god_pack["fn"] += 1
+        if rarity != item["rarity"]:
+            rarity_errors.append({"file": item["file"], "expected": item["rarity"], "got": rarity})
+
+    return {
+        "revision": git_revision(),
+        "language": language,
+        "frames": len(corpus),
+        "latency": {
+            "decode": latency_summary(decode_seconds),
+            "rarity_check": latency_summary(rarity_seconds),
+            "match": {
+                name: latency_summary(seconds)
+                for name, seconds in sorted(match_seconds.items())
+            },
+        },
+        "accuracy": accuracy,
+        "god_pack": god_pack,
+        "rarity_errors": rarity_errors,
+    }
+
+
+def compare_reports(base, head, confidence=DEFAULT_CONFIDENCE):
+    """
+    返回 (说明, 是否退化)
+    """
+    lines = [f"{base.get('revision')} -> {head.get('revision')}"]
+    regressed = False
+    for name in ("decode", "rarity_check"):
+        before = base["latency"][name]["mean_ms"]
+        after = head["latency"][name]["mean_ms"]
+        lines.append(f"{name}: {before:.2f}ms -> {after:.2f}ms")
+        if before and after > before * LATENCY_REGRESSION_RATIO:
+            regressed = True
+            lines.append(f"  REGRESSION: {name} is {after / before:.2f}x slower")
+    before_total = sum(item["mean_ms"] for item in base["latency"]["match"].values())
+    after_total = sum(item["mean_ms"] for item in head["latency"]["match"].values())
+    lines.append(f"match (sum of template means): {before_total:.2f}ms -> {after_total:.2f}ms")
+
+    threshold = str(round(confidence, 2))
+    for key, result in sorted(head["accuracy"].items()):
+        before = base["accuracy"].get(key, {}).get(threshold)
+        after = result.get(threshold)
+        if not before or not after:
+            continue
+        if after["precision"] < before["precision"] or after["recall"] < before["recall"]:
+            regressed = True
+            lines.append(
+                f"  REGRESSION: {key} at {threshold}: "
+                f"precision {before['precision']:.3f} -> {after['precision']:.3f}, "
+                f"recall {before['recall']:.3f} -> {after['recall']:.3f}"
+            )
+
+    lines.append(f"god pack: {base['god_pack']} -> {head['god_pack']}")
+    if (
+        head["god_pack"]["fp"] > base["god_pack"]["fp"]
+        or head["god_pack"]["fn"] > base["god_pack"]["fn"]
+    ):
+        regressed = True
+        lines.append("  REGRESSION: god pack classification changed")
+    if len(head["rarity_errors"]) > len(base["rarity_errors"]):
+        regressed = True
+        lines.append(
+            f"  REGRESSION: rarity errors {len(base['rarity_errors'])} -> {len(head['rarity_errors'])}"
+        )
+    return "\n".join(lines), regressed
+
+
+def print_report(report, confidence=DEFAULT_CONFIDENCE):
+    latency = report["latency"]
+    print(f"{report['frames']} frames at {report['revision']}")
+    for name in ("decode", "rarity_check"):
+        print(f"{name}: {latency[name]['mean_ms']:.2f}ms mean, {latency[name]['p95_ms']:.2f}ms p95")
+    threshold = str(round(confidence, 2))
+    for key, result in sorted(report["accuracy"].items()):
+        at = result[threshold]
+        if at["fp"] or at["fn"]:
+            print(f"  {key}: precision {at['precision']:.3f} recall {at['recall']:.3f} at {threshold}")
+    print(f"god pack: {report['god_pack']}, rarity errors: {len(report['rarity_errors'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark template matching on a labelled corpus")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="measure latency and accuracy")
+    run_parser.add_argument("--corpus", default=DEFAULT_CORPUS_DIR)
+    run_parser.add_argument("--language", default="Chinese")
+    run_parser.add_argument("--repeat", type=int, default=3)
+    run_parser.add_argument("--output", help="write the report as json")
+
+    compare_parser = subparsers.add_parser("compare", help="compare two reports")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("head")
+    compare_parser.add_argument("--confidence", type=float, default=DEFAULT_CONFIDENCE)
+
+    args = parser.parse_args()
+    if args.command == "run":
+        report = run_benchmark(args.corpus, args.language, args.repeat)
+        print_report(report)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(report, f, indent=2)
+    elif args.command == "compare":
+        with open(args.base, "r") as f:
+            base = json.load(f)
+        with open(args.head, "r") as f:
+            head = json.load(f)
+        summary, regressed = compare_reports(base, head, args.confidence)
+        print(summary)
+        sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
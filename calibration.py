@@ -0,0 +1,178 @@
+import json
+import logging
+import os
+import threading
+import time
+import numpy as np
+
+LOGGER = logging.getLogger("Calibration")
+
+DEFAULT_CALIBRATION_DIR = os.path.join(os.curdir, "data")
+# 指数滑动平均系数
+LATENCY_EMA_ALPHA = 0.1
+SWIPE_EMA_ALPHA = 0.05
+# delay_ms = 点击到画面变化的延迟的倍数
+DELAY_LATENCY_FACTOR = 1.5
+# 每隔多少次点击测量一次点击到画面变化的延迟
+PROBE_EVERY_TAPS = 20
+# 超过该时间画面仍未变化时不采样 (点击没有可见的效果)
+PROBE_TIMEOUT_SECOND = 2
+# 比较画面前缩小的倍数, 以及视为画面变化的平均灰度差
+FRAME_DIFF_REDUCE = 8
+FRAME_CHANGE_THRESHOLD = 2.0
+MIN_DELAY_MS = 100
+MAX_DELAY_MS = 1000
+MIN_SWIPE_SPEED = 300
+MAX_SWIPE_SPEED = 1000
+# 一次滑动即成功的比例目标
+SWIPE_SUCCESS_LOW = 0.8
+SWIPE_SUCCESS_HIGH = 0.95
+SWIPE_STEP_UP_MS = 50
+SWIPE_STEP_DOWN_MS = 10
+DEFAULT_DOUBLE_TAP_MS = 200
+# 画面延迟超过该值时连点第二下往往落在画面变化之后, 不再双击
+MAX_DOUBLE_TAP_FRAME_LATENCY_MS = 300
+# 每采样多少次保存一次
+SAVE_EVERY_SAMPLES = 10
+
+
+def frame_changed(before, after):
+    """
+    两帧缩小后的平均灰度差超过阈值时视为画面已变化
+    """
+    before = np.asarray(before.convert("L").reduce(FRAME_DIFF_REDUCE), dtype=np.int16)
+    after = np.asarray(after.convert("L").reduce(FRAME_DIFF_REDUCE), dtype=np.int16)
+    if before.shape != after.shape:
+        return True
+    return np.abs(before - after).mean() > FRAME_CHANGE_THRESHOLD
+
+
+class DeviceCalibration:
+    """
+    单设备的延迟与滑动参数校准, 保存在 data/calibration_{port}.json
+    """
+
+    def __init__(
+        self,
+        port,
+        delay_ms,
+        swipe_speed,
+        calibration_dir=DEFAULT_CALIBRATION_DIR,
+    ):
+        self.port = port
+        self.path = os.path.join(calibration_dir, f"calibration_{port}.json")
+        self.lock = threading.Lock()
+        self.delay_ms = delay_ms
+        self.swipe_speed = swipe_speed
+        self.double_tap_ms = DEFAULT_DOUBLE_TAP_MS
+        self.frame_latency_ms = None
+        self.swipe_success_rate = None
+        self.samples = 0
+        self.taps = 0
+        self.load()
+
+    def load(self):
+        """
+        读取已保存的校准参数
+        """
+        try:
+            with open(self.path, "r") as f:
+                profile = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            LOGGER.warning(f"Failed to read calibration {self.path}: {e}")
+            return
+        self.delay_ms = profile.get("delay_ms", self.delay_ms)
+        self.swipe_speed = profile.get("swipe_speed", self.swipe_speed)
+        self.double_tap_ms = profile.get("double_tap_ms", self.double_tap_ms)
+        self.frame_latency_ms = profile.get("frame_latency_ms")
+        self.swipe_success_rate = profile.get("swipe_success_rate")
+        LOGGER.info(f"Loaded calibration for {self.port}: {profile}")
+
+    def save(self):
+        """
+        原子写入校准参数
+        """
+        with self.lock:
+            profile = self.profile()
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(profile, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            LOGGER.warning(f"Failed to save calibration {self.path}: {e}")
+
+    def profile(self):
+        return {
+            "port": self.port,
+            "delay_ms": self.delay_ms,
+            "swipe_speed": self.swipe_speed,
+            "double_tap_ms": self.double_tap_ms,
+            "frame_latency_ms": self.frame_latency_ms,
+            "swipe_success_rate": self.swipe_success_rate,
+            "updated_at": int(time.time()),
+        }
+
+    def probe_due(self):
+        """
+        每 PROBE_EVERY_TAPS 次点击返回一次 True, 由调用方测量这次点击的画面延迟
+        """
+        with self.lock:
+            self.taps += 1
+            return self.taps % PROBE_EVERY_TAPS == 1
+
+    def record_frame_latency(self, seconds):
+        """
+        记录一次从点击到截图中画面变化的延迟
+        """
+        with self.lock:
+            self.frame_latency_ms = self._ema(self.frame_latency_ms, seconds * 1000)
+            self._update_delay()
+        self._sampled()
+
+    def record_swipe(self, swipe_times):
+        """
+        记录开包所需的滑动次数, 调整滑动时长
+        """
+        with self.lock:
+            success = 1.0 if swipe_times <= 1 else 0.0
+            if self.swipe_success_rate is None:
+                self.swipe_success_rate = success
+            else:
+                self.swipe_success_rate += SWIPE_EMA_ALPHA * (
+                    success - self.swipe_success_rate
+                )
+            if self.swipe_success_rate < SWIPE_SUCCESS_LOW:
+                self.swipe_speed = min(
+                    self.swipe_speed + SWIPE_STEP_UP_MS, MAX_SWIPE_SPEED
+                )
+            elif self.swipe_success_rate > SWIPE_SUCCESS_HIGH:
+                self.swipe_speed = max(
+                    self.swipe_speed - SWIPE_STEP_DOWN_MS, MIN_SWIPE_SPEED
+                )
+        self.save()
+
+    def _ema(self, current, value):
+        if current is None:
+            return value
+        return current + LATENCY_EMA_ALPHA * (value - current)
+
+    def _update_delay(self):
+        self.delay_ms = int(
+            max(
+                MIN_DELAY_MS,
+                min(self.frame_latency_ms * DELAY_LATENCY_FACTOR, MAX_DELAY_MS),
+            )
+        )
+        self.double_tap_ms = (
+            DEFAULT_DOUBLE_TAP_MS
+            if self.frame_latency_ms < MAX_DOUBLE_TAP_FRAME_LATENCY_MS
+            else 0
+        )
+
+    def _sampled(self):
+        self.samples += 1
+        if self.samples % SAVE_EVERY_SAMPLES == 0:
+            self.save()
@@ -0,0 +1,52 @@
+import json
+import logging
+import os
+import time
+
+LOGGER = logging.getLogger("Checkpoint")
+
+DEFAULT_CHECKPOINT_DIR = os.path.join(os.curdir, "data")
+
+
+class RerollCheckpoint:
+    """
+    单设备的 Reroll 进度存档, 保存在 data/checkpoint_{port}.json
+    """
+
+    def __init__(self, port, checkpoint_dir=DEFAULT_CHECKPOINT_DIR):
+        self.port = port
+        self.path = os.path.join(checkpoint_dir, f"checkpoint_{port}.json")
+
+    def save(self, data):
+        """
+        原子写入存档, 写入失败不影响 reroll 流程
+        """
+        data = dict(data, port=self.port, saved_at=time.time())
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            LOGGER.warning(f"Failed to save checkpoint {self.path}: {e}")
+
+    def load(self):
+        """
+        读取存档, 不存在或损坏时返回 None
+        """
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            LOGGER.warning(f"Failed to read checkpoint {self.path}: {e}")
+            return None
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
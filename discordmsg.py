@@ -1,52 +1,243 @@
-import requests
+import heapq
+import itertools
+import json
+import logging
 import os
+import threading
 import time
 
+LOGGER = logging.getLogger("DiscordMsg")
+
+PRIORITY_PING = 0
+PRIORITY_NORMAL = 1
+PRIORITY_HEARTBEAT = 2
+DEFAULT_OUTBOX_DIR = os.path.join(os.curdir, "data")
+DEFAULT_QUEUE_SIZE = 100
+MAX_RETRIES = 10
+RETRY_BACKOFF_SECOND = 0.25
+MAX_RETRY_BACKOFF_SECOND = 60
+# 发送线程合并写盘的间隔
+OUTBOX_SAVE_INTERVAL_SECOND = 2
+
+
+class DiscordRateLimited(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Rate limited for {retry_after}s")
+        self.retry_after = retry_after
+
 
 class DiscordMsg:
-    def __init__(self, webhook_url, user_id):
+    """
+    Discord webhook 通知, 消息进入有界优先队列, 由后台线程发送
+    """
+
+    def __init__(
+        self,
+        webhook_url,
+        user_id,
+        name="discord",
+        outbox_dir=DEFAULT_OUTBOX_DIR,
+        max_queue_size=DEFAULT_QUEUE_SIZE,
+    ):
         self.webhook_url = webhook_url
         self.user_id = user_id
+        self.max_queue_size = max_queue_size
+        self.outbox_path = os.path.join(outbox_dir, f"outbox_{name}.json")
+        self.condition = threading.Condition()
+        # (priority, seq, item)
+        self.pending = []
+        self.seq = itertools.count()
+        self.blocked_until = 0
+        # 队列有变化但尚未写盘
+        self.dirty = False
+        self.last_saved = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+        if self.webhook_url:
+            self._load_outbox()
+            self.thread = threading.Thread(
+                target=self._sender_loop, name=f"DiscordMsg-{name}", daemon=True
+            )
+            self.thread.start()
 
-    def send_message(self, message, screenshot_file=None, ping=False, xml_file=None):
-        send_xml = 1  # Set this to your desired value
+    def send_message(
+        self,
+        message,
+        screenshot_file=None,
+        ping=False,
+        xml_file=None,
+        priority=None,
+        coalesce_key=None,
+    ):
+        """
+        加入发送队列后立即返回
+        coalesce_key 相同的未发送消息只保留最新的一条
+        """
+        if not self.webhook_url:
+            return
+        if priority is None:
+            priority = PRIORITY_PING if ping else PRIORITY_NORMAL
+        item = {
+            "message": message,
+            "screenshot_file": screenshot_file,
+            "xml_file": xml_file,
+            "ping": ping,
+            "priority": priority,
+            "coalesce_key": coalesce_key,
+            "retries": 0,
+            "content_sent": False,
+        }
+        with self.condition:
+            if coalesce_key:
+                self.pending = [
+                    entry
+                    for entry in self.pending
+                    if entry[2]["coalesce_key"] != coalesce_key
+                ]
+                heapq.heapify(self.pending)
+            if len(self.pending) >= self.max_queue_size:
+                lowest = max(self.pending)
+                if lowest[0] < priority:
+                    LOGGER.warning(f"Discord queue full, dropped message: {message}")
+                    return
+                self.pending.remove(lowest)
+                heapq.heapify(self.pending)
+                LOGGER.warning(
+                    f"Discord queue full, dropped message: {lowest[2]['message']}"
+                )
+            heapq.heappush(self.pending, (priority, next(self.seq), item))
+            self.dirty = True
+            self.condition.notify()
 
-        if self.webhook_url:
-            max_retries = 10
-            retry_count = 0
-
-            while retry_count < max_retries:
-                try:
-                    # Prepare the message data
-                    if ping and self.user_id:
-                        data = {"content": f"<@{self.user_id}> {message}"}
-                    else:
-                        data = {"content": message}
-
-                    if screenshot_file and os.path.isfile(screenshot_file):
-                        with open(screenshot_file, "rb") as f:
-                            files = {"file": f}
-                            response = requests.post(
-                                self.webhook_url,
-                                data=data,
-                                files=files if files else None,
-                            )
-                            response.raise_for_status()
-                    else:
-                        response = requests.post(self.webhook_url, json=data)
-                        response.raise_for_status()
-
-                    # If an XML file is provided and sendXML is greater than 0, send it
-                    if xml_file and send_xml > 0 and os.path.isfile(xml_file):
-                        with open(xml_file, "rb") as f:
-                            files = {"file": f}
-                            response = requests.post(self.webhook_url, files=files)
-                            response.raise_for_status()
-
-                    break
-                except requests.RequestException as e:
-                    retry_count += 1
-                    if retry_count >= max_retries:
-                        print("Failed to send discord message. Error: ", e)
-                        break
-                    time.sleep(0.25)
+    def close(self, timeout=10):
+        """
+        等待队列发送完毕, 未发送的消息由发送线程退出前写入磁盘
+        """
+        if not self.thread:
+            return
+        deadline = time.time() + timeout
+        with self.condition:
+            while self.pending and time.time() < deadline:
+                self.condition.wait(min(1, deadline - time.time()))
+            self.stop_event.set()
+            self.condition.notify_all()
+        self.thread.join(max(0, deadline - time.time()))
+
+    def _sender_loop(self):
+        # 只有配置了 webhook 时才需要加载 HTTP 客户端
+        from httpclient import HTTP_ERRORS
+
+        while not self.stop_event.is_set():
+            self._save_outbox()
+            with self.condition:
+                if not self.pending:
+                    self.condition.wait(OUTBOX_SAVE_INTERVAL_SECOND if self.dirty else None)
+                    continue
+                wait_time = self.blocked_until - time.time()
+                if wait_time > 0:
+                    self.condition.wait(wait_time)
+                    continue
+                _, seq, item = self.pending[0]
+            try:
+                self._post(item)
+                done = True
+            except DiscordRateLimited as e:
+                LOGGER.warning(f"Discord rate limited, retry after {e.retry_after}s")
+                self.blocked_until = time.time() + e.retry_after
+                done = False
+            except HTTP_ERRORS as e:
+                item["retries"] += 1
+                response = getattr(e, "response", None)
+                done = item["retries"] >= MAX_RETRIES or (
+                    response is not None and 400 <= response.status_code < 500
+                )
+                if done:
+                    LOGGER.error(f"Failed to send discord message. Error: {e}")
+                else:
+                    self.blocked_until = time.time() + min(
+                        RETRY_BACKOFF_SECOND * 2 ** (item["retries"] - 1),
+                        MAX_RETRY_BACKOFF_SECOND,
+                    )
+            with self.condition:
+                if done:
+                    self.pending = [
+                        entry for entry in self.pending if entry[1] != seq
+                    ]
+                    heapq.heapify(self.pending)
+                self.dirty = True
+                self.condition.notify_all()
+        self._save_outbox(force=True)
+
+    def _post(self, item):
+        if not item["content_sent"]:
+            # Prepare the message data
+            if item["ping"] and self.user_id:
+                data = {"content": f"<@{self.user_id}> {item['message']}"}
+            else:
+                data = {"content": item["message"]}
+
+            screenshot_file = item["screenshot_file"]
+            if screenshot_file and os.path.isfile(screenshot_file):
+                with open(screenshot_file, "rb") as f:
+                    self._request(data=data, files={"file": f})
+            else:
+                self._request(json=data)
+            item["content_sent"] = True
+
+        # If an XML file is provided, send it
+        xml_file = item["xml_file"]
+        if xml_file and os.path.isfile(xml_file):
+            with open(xml_file, "rb") as f:
+                self._request(files={"file": f})
+
+    def _request(self, **kwargs):
+        from httpclient import get_client
+
+        response = get_client().post(self.webhook_url, **kwargs)
+        if response.status_code == 429:
+            try:
+                retry_after = float(response.json().get("retry_after"))
+            except (ValueError, TypeError, AttributeError):
+                retry_after = float(response.headers.get("Retry-After", 1))
+            raise DiscordRateLimited(retry_after)
+        response.raise_for_status()
+        # 预留额度用尽时, 等待到重置时间再发送下一条
+        if response.headers.get("X-RateLimit-Remaining") == "0":
+            reset_after = response.headers.get("X-RateLimit-Reset-After")
+            if reset_after:
+                self.blocked_until = time.time() + float(reset_after)
+        return response
+
+    def _load_outbox(self):
+        try:
+            with open(self.outbox_path, "r") as f:
+                items = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            LOGGER.warning(f"Failed to read discord outbox {self.outbox_path}: {e}")
+            return
+        for item in items:
+            heapq.heappush(self.pending, (item["priority"], next(self.seq), item))
+        if items:
+            LOGGER.info(f"Loaded {len(items)} unsent discord messages")
+
+    def _save_outbox(self, force=False):
+        """
+        只在发送线程中调用, 距上次写盘不足间隔时跳过, 退出时 force 写入
+        """
+        with self.condition:
+            if not self.dirty or (
+                not force and time.time() - self.last_saved < OUTBOX_SAVE_INTERVAL_SECOND
+            ):
+                return
+            items = [entry[2] for entry in sorted(self.pending)]
+            self.dirty = False
+            self.last_saved = time.time()
+        tmp_path = f"{self.outbox_path}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(items, f)
+            os.replace(tmp_path, self.outbox_path)
+        except Exception as e:
+            LOGGER.warning(f"Failed to save discord outbox {self.outbox_path}: {e}")
@@ -0,0 +1,123 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+LOGGER = logging.getLogger("FlightRecorder")
+
+DEFAULT_DUMP_DIR = os.path.join(os.curdir, "data", "flight")
+DEFAULT_MAX_FRAMES = 30
+DEFAULT_MAX_EVENTS = 300
+# 帧缩小的倍数, 540x960 缩小 4 倍约 100KB
+DEFAULT_FRAME_SCALE = 4
+DEFAULT_MAX_DUMPS = 20
+
+
+class FlightRecorder:
+    """
+    每台设备最近的截图与操作记录, 只在卡住或重启时写入磁盘
+    """
+
+    def __init__(
+        self,
+        port,
+        max_frames=DEFAULT_MAX_FRAMES,
+        max_events=DEFAULT_MAX_EVENTS,
+        frame_scale=DEFAULT_FRAME_SCALE,
+        dump_dir=DEFAULT_DUMP_DIR,
+        max_dumps=DEFAULT_MAX_DUMPS,
+    ):
+        self.port = port
+        self.frame_scale = frame_scale
+        self.dump_dir = dump_dir
+        self.max_dumps = max_dumps
+        self.lock = threading.Lock()
+        # (time, seq, image)
+        self.frames = deque(maxlen=max_frames)
+        self.events = deque(maxlen=max_events)
+        self.frame_seq = 0
+        self.dump_thread = None
+
+    def record_frame(self, image):
+        """
+        保存缩小后的截图, 返回帧序号
+        """
+        if self.frame_scale > 1:
+            image = image.reduce(self.frame_scale)
+        with self.lock:
+            self.frame_seq += 1
+            self.frames.append((time.time(), self.frame_seq, image))
+            return self.frame_seq
+
+    def record(self, action, **fields):
+        """
+        记录操作, 附带当时最新的帧序号
+        """
+        with self.lock:
+            self.events.append(
+                dict(fields, time=time.time(), action=action, frame=self.frame_seq)
+            )
+
+    def dump(self, reason, **fields):
+        """
+        复制当前记录并在后台线程写入, 返回输出目录
+        """
+        with self.lock:
+            frames = list(self.frames)
+            events = list(self.events)
+        if not frames and not events:
+            return None
+        dumped_at = time.time()
+        timestamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(dumped_at))
+        path = os.path.join(
+            self.dump_dir, f"{self.port}_{timestamp}_{int(dumped_at * 1000) % 1000:03d}"
+        )
+        header = dict(fields, port=self.port, reason=reason, time=dumped_at)
+        self.dump_thread = threading.Thread(
+            target=self._write,
+            args=(path, header, frames, events),
+            name=f"FlightRecorder-{self.port}",
+            daemon=True,
+        )
+        self.dump_thread.start()
+        return path
+
+    def _write(self, path, header, frames, events):
+        try:
+            os.makedirs(path, exist_ok=True)
+            header["frames"] = []
+            for frame_time, seq, image in frames:
+                filename = f"frame_{seq:06d}.png"
+                image.save(os.path.join(path, filename))
+                header["frames"].append(
+                    {"seq": seq, "time": frame_time, "file": filename}
+                )
+            with open(os.path.join(path, "events.json"), "w") as f:
+                json.dump(dict(header, events=events), f, indent=1, default=str)
+            LOGGER.info(f"Flight recorder dumped to {path}")
+        except Exception as e:
+            LOGGER.error(f"Failed to dump flight recorder to {path}: {e}")
+            return
+        self._prune()
+
+    def _prune(self):
+        """
+        每台设备只保留最近 max_dumps 份记录
+        """
+        try:
+            dumps = sorted(
+                entry.path
+                for entry in os.scandir(self.dump_dir)
+                if entry.is_dir() and entry.name.startswith(f"{self.port}_")
+            )
+        except OSError:
+            return
+        for old_path in dumps[: max(0, len(dumps) - self.max_dumps)]:
+            try:
+                for entry in os.scandir(old_path):
+                    os.remove(entry.path)
+                os.rmdir(old_path)
+            except OSError as e:
+                LOGGER.warning(f"Failed to remove {old_path}: {e}")
@@ -1,10 +1,17 @@
 import json
-import requests
-from requests.auth import HTTPBasicAuth
 import logging
+import os
+import threading
+import time
 
 LOGGER = logging.getLogger("FreindSeeker")
 
+DEFAULT_CACHE_TTL_SECOND = 60
+# 首次获取时在请求的最长耗时之外多等待的时间
+FIRST_FETCH_MARGIN_SECOND = 5
+# 刷新失败后的重试间隔
+FAILED_RETRY_SECOND = 10
+
 
 class FriendSeeker:
     def __init__(
@@ -15,6 +22,7 @@ class FriendSeeker:
         local_path=None,
         remote=False,
         local=True,
+        cache_ttl=DEFAULT_CACHE_TTL_SECOND,
     ):
         self.remote = remote
         if remote:
@@ -32,6 +40,18 @@ class FriendSeeker:
             else:
                 self.local = False
                 LOGGER.warning("No local path specified")
+        self.cache_ttl = cache_ttl
+        # 远程 fc 缓存
+        self.lock = threading.Lock()
+        self.refreshed = threading.Condition(self.lock)
+        self.remote_codes = None
+        self.next_refresh_at = 0
+        self.refreshing = False
+        self.etag = None
+        self.last_modified = None
+        # 本地 fc 缓存
+        self.local_codes = []
+        self.local_mtime = None
 
     def get_friend_codes(self):
         """
@@ -50,30 +70,97 @@ class FriendSeeker:
 
     def get_local_friend_codes(self):
         """
-        从local_path的json文件获取fc
+        从local_path的json文件获取fc, 文件未修改时使用缓存
         """
         try:
-            with open(self.local_path, "r") as f:
-                data = json.load(f)
-                LOGGER.info(f"Local fc: {data}")
-                return data
-        except Exception as e:
+            mtime = os.stat(self.local_path).st_mtime
+        except OSError as e:
             LOGGER.error(f"Failed to read local fc: {e}")
-            return []
+            return list(self.local_codes)
+        with self.lock:
+            if mtime == self.local_mtime:
+                return list(self.local_codes)
+            try:
+                with open(self.local_path, "r") as f:
+                    data = json.load(f)
+                    LOGGER.info(f"Local fc: {data}")
+            except Exception as e:
+                LOGGER.error(f"Failed to read local fc: {e}")
+                return list(self.local_codes)
+            self.local_codes = data
+            self.local_mtime = mtime
+            return list(data)
 
     def get_reomte_friend_codes(self):
         """
         获取待验证的ID
+        缓存过期时只由一个线程在后台刷新, 其余线程直接使用旧数据
+        """
+        with self.lock:
+            if time.time() >= self.next_refresh_at and not self.refreshing:
+                self.refreshing = True
+                threading.Thread(
+                    target=self.refresh_remote_friend_codes,
+                    name="FriendSeekerRefresh",
+                    daemon=True,
+                ).start()
+            if self.remote_codes is None:
+                from httpclient import get_client
+
+                # 还没有任何数据时等待首次刷新, 最长为请求用尽超时与重试的时间
+                self.refreshed.wait_for(
+                    lambda: not self.refreshing,
+                    timeout=get_client().max_request_seconds() + FIRST_FETCH_MARGIN_SECOND,
+                )
+            return list(self.remote_codes or [])
+
+    def refresh_remote_friend_codes(self):
+        """
+        带 ETag/If-Modified-Since 的条件请求, 失败时保留旧数据
         """
+        codes = None
+        fetched = False
         try:
-            response = requests.get(
-                self.url + "/get_true_ids",
-                auth=HTTPBasicAuth(self.username, self.password),
-            )
-            response.raise_for_status()  # 检查请求是否成功
-            data = response.json()
-            LOGGER.info(f"Pack check response: {data}")
-            return data.get("ids", [])
-        except requests.exceptions.RequestException as e:
-            LOGGER.error(f"HTTP Request failed: {e}")
-            return []
+            # 只使用本地 fc 时不加载 HTTP 客户端
+            from httpclient import HTTP_ERRORS, get_client
+
+            headers = {}
+            if self.etag:
+                headers["If-None-Match"] = self.etag
+            if self.last_modified:
+                headers["If-Modified-Since"] = self.last_modified
+            try:
+                response = get_client().get(
+                    self.url + "/get_true_ids",
+                    auth=(self.username, self.password),
+                    headers=headers,
+                )
+                if response.status_code == 304:
+                    LOGGER.info("Pack check ids not modified")
+                else:
+                    response.raise_for_status()  # 检查请求是否成功
+                    data = response.json()
+                    LOGGER.info(f"Pack check response: {data}")
+                    codes = data.get("ids", []) if isinstance(data, dict) else None
+                    if not isinstance(codes, list):
+                        codes = None
+                        raise ValueError(f"unexpected body {data!r}")
+                    self.etag = response.headers.get("ETag")
+                    self.last_modified = response.headers.get("Last-Modified")
+                fetched = True
+            except HTTP_ERRORS as e:
+                LOGGER.error(f"HTTP Request failed: {e}")
+            except ValueError as e:
+                LOGGER.error(f"Invalid pack check response: {e}")
+        except Exception as e:
+            LOGGER.error(f"Failed to refresh pack check ids: {e}")
+        finally:
+            # 无论刷新是否成功都要释放等待的线程
+            with self.lock:
+                if codes is not None:
+                    self.remote_codes = codes
+                self.next_refresh_at = time.time() + (
+                    self.cache_ttl if fetched else min(self.cache_ttl, FAILED_RETRY_SECOND)
+                )
+                self.refreshing = False
+                self.refreshed.notify_all()
@@ -0,0 +1,136 @@
+import logging
+import time
+from collections import deque
+from discordmsg import PRIORITY_HEARTBEAT
+
+LOGGER = logging.getLogger("Heartbeat")
+
+DEFAULT_INTERVAL_MINUTES = 30
+DEFAULT_STALL_MINUTES = 20
+DEFAULT_ALERT_WINDOW_MINUTES = 30
+DEFAULT_ALERT_COOLDOWN_MINUTES = 60
+CHECK_INTERVAL_SECOND = 60
+
+
+class Heartbeat:
+    """
+    定时汇报农场状态, 吞吐量过低时立即告警
+    """
+
+    def __init__(
+        self,
+        discord_msg,
+        account_name,
+        adb_ports,
+        interval_minutes=DEFAULT_INTERVAL_MINUTES,
+        stall_minutes=DEFAULT_STALL_MINUTES,
+        min_packs_per_hour=None,
+        alert_window_minutes=DEFAULT_ALERT_WINDOW_MINUTES,
+        alert_cooldown_minutes=DEFAULT_ALERT_COOLDOWN_MINUTES,
+    ):
+        self.discord_msg = discord_msg
+        self.account_name = account_name
+        self.adb_ports = adb_ports
+        self.interval = interval_minutes * 60
+        self.stall_seconds = stall_minutes * 60
+        self.min_packs_per_hour = min_packs_per_hour
+        self.alert_window = alert_window_minutes * 60
+        self.alert_cooldown = alert_cooldown_minutes * 60
+        self.start_time = time.time()
+        self.last_alert_time = 0
+        self.last_restarts = {}
+        # (时间, 总开包数), 用于计算告警窗口内的吞吐量
+        self.samples = deque()
+
+    def report(self, statuses, now=None):
+        """
+        生成心跳消息
+        """
+        now = now or time.time()
+        online_workers = [status["port"] for status in statuses]
+        offline_workers = sorted(set(self.adb_ports) - set(online_workers))
+        running_time = (now - self.start_time) / 60
+        total_pack = sum(status["total_pack"] for status in statuses)
+        session_pack = sum(status["session_pack"] for status in statuses)
+        hours = (now - self.start_time) / 3600
+        cycle_times = [
+            status["avg_cycle_seconds"]
+            for status in statuses
+            if status["avg_cycle_seconds"] is not None
+        ]
+        lines = [
+            f"{self.account_name}",
+            f'Online: {", ".join(online_workers) if online_workers else "none"}.',
+            f'Offline: {", ".join(offline_workers) if offline_workers else "none"}.',
+            f"Time: {running_time:.0f}m Packs: {total_pack} "
+            f"({session_pack / hours if hours else 0:.1f}/h)",
+        ]
+        if cycle_times:
+            lines.append(
+                f"Avg cycle: {sum(cycle_times) / len(cycle_times) / 60:.1f}m"
+            )
+        stalled = []
+        for status in sorted(statuses, key=lambda status: status["port"]):
+            port = status["port"]
+            device_hours = status["running_seconds"] / 3600
+            restarts = status["restarts"] - self.last_restarts.get(port, 0)
+            self.last_restarts[port] = status["restarts"]
+            lines.append(
+                f"{port}: {status['session_pack'] / device_hours if device_hours else 0:.1f}/h "
+                f"{status['state']} {status['state_seconds'] / 60:.0f}m "
+                f"restarts +{restarts}"
+            )
+            if status["state_seconds"] >= self.stall_seconds:
+                stalled.append(port)
+        lines.append(f'Stalled: {", ".join(stalled) if stalled else "none"}.')
+        return "\n".join(lines) + "\n"
+
+    def check_throughput(self, statuses, now=None):
+        """
+        告警窗口内每小时开包数低于阈值时返回告警消息
+        """
+        now = now or time.time()
+        session_pack = sum(status["session_pack"] for status in statuses)
+        self.samples.append((now, session_pack))
+        while self.samples and now - self.samples[0][0] > self.alert_window:
+            self.samples.popleft()
+        if not self.min_packs_per_hour:
+            return None
+        if now - self.start_time < self.alert_window:
+            return None
+        if now - self.last_alert_time < self.alert_cooldown:
+            return None
+        first_time, first_pack = self.samples[0]
+        if now - first_time <= 0:
+            return None
+        packs_per_hour = (session_pack - first_pack) / ((now - first_time) / 3600)
+        if packs_per_hour >= self.min_packs_per_hour:
+            return None
+        self.last_alert_time = now
+        return (
+            f"{self.account_name}\n"
+            f"Throughput dropped: {packs_per_hour:.1f} packs/h "
+            f"(threshold {self.min_packs_per_hour}/h)\n"
+        )
+
+    def run(self, get_statuses, stop_event):
+        """
+        持续发送心跳直到 stop_event 被设置
+        """
+        next_report = 0
+        while not stop_event.is_set():
+            now = time.time()
+            statuses = get_statuses()
+            alert = self.check_throughput(statuses, now)
+            if alert:
+                LOGGER.warning(alert.strip())
+                if self.discord_msg:
+                    self.discord_msg.send_message(alert, ping=True)
+            if now >= next_report and self.discord_msg:
+                self.discord_msg.send_message(
+                    self.report(statuses, now),
+                    priority=PRIORITY_HEARTBEAT,
+                    coalesce_key="heartbeat",
+                )
+                next_report = now + self.interval
+            stop_event.wait(CHECK_INTERVAL_SECOND)
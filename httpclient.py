@@ -0,0 +1,128 @@
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+LOGGER = logging.getLogger("HttpClient")
+
+# (连接超时, 读取超时)
+DEFAULT_TIMEOUT_SECOND = (5, 30)
+DEFAULT_RETRIES = 3
+DEFAULT_POOL_SIZE = 32
+RETRY_BACKOFF_FACTOR = 0.5
+RETRY_STATUS = (500, 502, 503, 504)
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import h2
+except ImportError:
+    h2 = None
+
+HTTP_ERRORS = (requests.RequestException,) + ((httpx.HTTPError,) if httpx else ())
+
+
+class HttpClient:
+    """
+    线程安全的 HTTP 客户端, 所有线程共享同一个长连接池
+    """
+
+    def __init__(
+        self,
+        timeout=DEFAULT_TIMEOUT_SECOND,
+        retries=DEFAULT_RETRIES,
+        pool_size=DEFAULT_POOL_SIZE,
+        http2=False,
+    ):
+        self.timeout = timeout
+        self.retries = retries
+        self.http2 = False
+        if http2:
+            if not httpx:
+                LOGGER.warning("httpx is not installed, falling back to HTTP/1.1")
+            elif not h2:
+                LOGGER.warning("h2 is not installed, falling back to HTTP/1.1")
+            else:
+                connect_timeout, read_timeout = timeout
+                # 传入自定义 transport 时 httpx 忽略 Client 的 limits, 需设置在 transport 上
+                self.client = httpx.Client(
+                    timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+                    transport=httpx.HTTPTransport(
+                        http2=True,
+                        limits=httpx.Limits(
+                            max_connections=pool_size,
+                            max_keepalive_connections=pool_size,
+                        ),
+                        retries=retries,
+                    ),
+                )
+                self.http2 = True
+        if not self.http2:
+            # 连接池在 adapter 中, 多个线程的 session 共享同一个 adapter
+            self.adapter = HTTPAdapter(
+                pool_connections=pool_size,
+                pool_maxsize=pool_size,
+                max_retries=Retry(
+                    total=retries,
+                    backoff_factor=RETRY_BACKOFF_FACTOR,
+                    status_forcelist=RETRY_STATUS,
+                    allowed_methods=frozenset(["GET", "HEAD"]),
+                    raise_on_status=False,
+                ),
+            )
+            self.local = threading.local()
+
+    def max_request_seconds(self):
+        """
+        一次请求用尽所有重试, 每次都等满连接与读取超时的最长耗时
+        """
+        connect_timeout, read_timeout = self.timeout
+        backoff = sum(RETRY_BACKOFF_FACTOR * 2**attempt for attempt in range(self.retries))
+        return (connect_timeout + read_timeout) * (self.retries + 1) + backoff
+
+    def session(self):
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.mount("http://", self.adapter)
+            session.mount("https://", self.adapter)
+            self.local.session = session
+        return session
+
+    def request(self, method, url, **kwargs):
+        if self.http2:
+            return self.client.request(method, url, **kwargs)
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session().request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def configure(**kwargs):
+    """
+    使用 settings.yaml 中的参数创建共享客户端
+    """
+    global _client
+    with _client_lock:
+        _client = HttpClient(**kwargs)
+    return _client
+
+
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient()
+        return _client
@@ -0,0 +1,81 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+LOGGER = logging.getLogger("ImageExport")
+
+DEFAULT_FORMAT = "webp"
+DEFAULT_QUALITY = 80
+DEFAULT_SCALE = 1.0
+CROP_PADDING = 10
+FORMAT_EXTENSIONS = {"webp": ".webp", "jpeg": ".jpg"}
+
+
+class EvidenceExporter:
+    """
+    在后台线程裁剪卡牌区域并压缩, 生成用于上传的小图
+    """
+
+    def __init__(self, image_format=DEFAULT_FORMAT, quality=DEFAULT_QUALITY, scale=DEFAULT_SCALE):
+        self.image_format = image_format.lower()
+        if self.image_format == "jpg":
+            self.image_format = "jpeg"
+        if self.image_format not in FORMAT_EXTENSIONS:
+            LOGGER.warning(f"Unsupported format {image_format}, using jpeg")
+            self.image_format = "jpeg"
+        self.quality = quality
+        self.scale = scale
+        self.executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="EvidenceExporter"
+        )
+
+    def export(self, screenshot, full_path, regions, on_done=None):
+        """
+        full_path 为原图保存路径, 压缩图保存在同目录下
+        完成后以压缩图路径调用 on_done, 失败时传入原图路径
+        """
+        return self.executor.submit(self._export, screenshot, full_path, regions, on_done)
+
+    def _export(self, screenshot, full_path, regions, on_done):
+        try:
+            path = self.encode(screenshot, full_path, regions)
+        except Exception as e:
+            LOGGER.error(f"Failed to export {full_path}: {e}")
+            path = full_path
+        if on_done:
+            on_done(path)
+        return path
+
+    def encode(self, screenshot, full_path, regions):
+        image = screenshot.crop(self.crop_box(regions, screenshot.size))
+        if self.scale != 1.0:
+            image = image.resize(
+                (
+                    max(1, int(image.width * self.scale)),
+                    max(1, int(image.height * self.scale)),
+                )
+            )
+        image = image.convert("RGB")
+        path = os.path.splitext(full_path)[0] + FORMAT_EXTENSIONS[self.image_format]
+        image.save(path, format=self.image_format.upper(), quality=self.quality)
+        return path
+
+    def crop_box(self, regions, size):
+        """
+        由卡牌边框区域推算卡牌所在范围, 上方补一行卡牌的高度
+        """
+        left = min(x for x, _, _, _ in regions)
+        right = max(x + w for x, _, w, _ in regions)
+        top = min(y for _, y, _, _ in regions)
+        bottom = max(y + h for _, y, _, h in regions)
+        row_height = max(y for _, y, _, _ in regions) - top
+        width, height = size
+        return (
+            max(0, left - CROP_PADDING),
+            max(0, top - row_height - CROP_PADDING),
+            min(width, right + CROP_PADDING),
+            min(height, bottom + CROP_PADDING),
+        )
+
+    def close(self):
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,222 @@
+import argparse
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+
+LOGGER = logging.getLogger("Journal")
+
+DEFAULT_JOURNAL_PATH = os.path.join(os.curdir, "data", "events.jsonl")
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 10
+DEFAULT_QUEUE_SIZE = 10000
+FLUSH_INTERVAL_SECOND = 1
+
+
+class EventJournal:
+    """
+    追加写入的 JSONL 事件日志, 由后台线程写盘并按大小轮转
+    """
+
+    def __init__(
+        self,
+        path=DEFAULT_JOURNAL_PATH,
+        max_bytes=DEFAULT_MAX_BYTES,
+        backup_count=DEFAULT_BACKUP_COUNT,
+        queue_size=DEFAULT_QUEUE_SIZE,
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(
+            target=self._writer_loop, name="EventJournal", daemon=True
+        )
+        self.thread.start()
+
+    def emit(self, event, device=None, **fields):
+        """
+        记录一个事件, 不阻塞调用线程, 队列满时丢弃
+        """
+        record = {"ts": time.time(), "event": event, "device": device}
+        record.update(fields)
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout=5):
+        self.stop_event.set()
+        self.thread.join(timeout)
+
+    def _writer_loop(self):
+        f = None
+        last_flush = time.time()
+        while not (self.stop_event.is_set() and self.queue.empty()):
+            try:
+                record = self.queue.get(timeout=FLUSH_INTERVAL_SECOND)
+            except queue.Empty:
+                record = None
+            try:
+                if record is not None:
+                    if f is None:
+                        f = open(self.path, "a", encoding="utf-8")
+                    f.write(json.dumps(record, default=str) + "\n")
+                if f is not None and (
+                    record is None or time.time() - last_flush >= FLUSH_INTERVAL_SECOND
+                ):
+                    f.flush()
+                    last_flush = time.time()
+                    if f.tell() >= self.max_bytes:
+                        f.close()
+                        f = None
+                        self._rotate()
+            except Exception as e:
+                LOGGER.error(f"Failed to write event journal: {e}")
+        if f is not None:
+            f.close()
+
+    def _rotate(self):
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+
+def read_events(path=DEFAULT_JOURNAL_PATH, since=None):
+    """
+    按时间顺序读取日志及其轮转文件
+    """
+    rotated = sorted(
+        (
+            name
+            for name in glob.glob(f"{glob.escape(path)}.*")
+            if name.rsplit(".", 1)[-1].isdigit()
+        ),
+        key=lambda name: int(name.rsplit(".", 1)[-1]),
+        reverse=True,
+    )
+    for name in rotated + [path]:
+        if not os.path.exists(name):
+            continue
+        with open(name, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if since is None or record.get("ts", 0) >= since:
+                    yield record
+
+
+def summarize(events):
+    """
+    统计每小时开包数, 各阶段耗时和失败率
+    """
+    first_ts = None
+    last_ts = None
+    packs = defaultdict(int)
+    pack_durations = defaultdict(list)
+    phase_seconds = defaultdict(float)
+    counts = defaultdict(lambda: defaultdict(int))
+    cycle_durations = []
+    for record in events:
+        ts = record.get("ts")
+        if ts is None:
+            continue
+        first_ts = ts if first_ts is None else min(first_ts, ts)
+        last_ts = ts if last_ts is None else max(last_ts, ts)
+        device = record.get("device")
+        event = record.get("event")
+        counts[event][device] += 1
+        if event == "pack_opened":
+            packs[device] += 1
+            pack_durations[record.get("pack_num")].append(record.get("duration", 0))
+        elif event == "state_changed":
+            phase_seconds[record.get("previous")] += record.get("duration", 0)
+        elif event == "account_cycle":
+            cycle_durations.append(record.get("duration", 0))
+    hours = (last_ts - first_ts) / 3600 if first_ts is not None else 0
+    accounts = sum(counts["account_cycle"].values())
+    return {
+        "hours": hours,
+        "packs": sum(packs.values()),
+        "packs_per_hour": sum(packs.values()) / hours if hours else 0,
+        "device_packs_per_hour": {
+            device: num / hours if hours else 0 for device, num in packs.items()
+        },
+        "pack_duration": {
+            pack_num: sum(durations) / len(durations)
+            for pack_num, durations in pack_durations.items()
+        },
+        "phase_seconds": dict(phase_seconds),
+        "accounts": accounts,
+        "cycle_duration": (
+            sum(cycle_durations) / len(cycle_durations) if cycle_durations else 0
+        ),
+        "event_counts": {
+            event: sum(devices.values()) for event, devices in counts.items()
+        },
+        "failure_rates": {
+            event: {
+                "per_hour": sum(counts[event].values()) / hours if hours else 0,
+                "per_account": (
+                    sum(counts[event].values()) / accounts if accounts else 0
+                ),
+            }
+            for event in ("stuck", "restart")
+        },
+    }
+
+
+def print_summary(summary):
+    print(f"Time: {summary['hours']:.2f}h Accounts: {summary['accounts']}")
+    print(
+        f"Packs: {summary['packs']} ({summary['packs_per_hour']:.1f}/h) "
+        f"Cycle: {summary['cycle_duration']:.0f}s"
+    )
+    print("Packs/hour by device:")
+    for device, rate in sorted(summary["device_packs_per_hour"].items()):
+        print(f"  {device}: {rate:.1f}")
+    print("Average pack duration:")
+    for pack_num, duration in sorted(summary["pack_duration"].items()):
+        print(f"  pack {pack_num}: {duration:.1f}s")
+    total_phase = sum(summary["phase_seconds"].values())
+    print("Time by state:")
+    for state, seconds in sorted(
+        summary["phase_seconds"].items(), key=lambda item: -item[1]
+    ):
+        share = seconds / total_phase * 100 if total_phase else 0
+        print(f"  {state}: {seconds:.0f}s ({share:.1f}%)")
+    print("Failures:")
+    for event, rates in summary["failure_rates"].items():
+        print(
+            f"  {event}: {rates['per_hour']:.2f}/h {rates['per_account']:.2f}/account"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize the reroll event journal")
+    parser.add_argument("--path", default=DEFAULT_JOURNAL_PATH)
+    parser.add_argument(
+        "--hours", type=float, default=None, help="only use the last N hours"
+    )
+    parser.add_argument("--json", action="store_true", help="print raw JSON")
+    args = parser.parse_args()
+    since = time.time() - args.hours * 3600 if args.hours else None
+    summary = summarize(read_events(args.path, since=since))
+    if args.json:
+        print(json.dumps(summary, indent=2, default=str))
+    else:
+        print_summary(summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+import logging
+import re
+
+LOGGER = logging.getLogger("Layout")
+
+# 所有坐标与模板均以该分辨率为基准
+BASE_RESOLUTION = (540, 960)
+
+# 模板的搜索区域 (x, y, w, h), 先列出多个流程或模块共用的, 其后按流程分组
+REGIONS = {
+    "screen": (0, 0, 540, 960),
+    "error": (245, 258, 50, 24),
+    "date_change": (235, 405, 54, 19),
+    "not_found": (162, 389, 72, 19),
+    "region_select": (206, 212, 128, 25),
+    "menu_title": (245, 71, 50, 23),
+    "home": (251, 906, 38, 38),
+    "wonder_icon": (120, 681, 49, 29),
+    "on_community": (251, 907, 36, 36),
+    "community": (44, 798, 44, 40),
+    "friend_num": (158, 136, 20, 15),
+    "friend_num_wide": (158, 136, 30, 15),
+    "friend_search": (432, 784, 30, 30),
+    "setting": (190, 762, 32, 32),
+    "account_manage": (52, 393, 35, 38),
+    "nin_account": (114, 781, 78, 21),
+    "friend_code": (157, 566, 225, 33),
+    "result": (220, 54, 100, 25),
+    "dex": (240, 51, 50, 50),
+    "choose": (179, 122, 31, 21),
+    "get": (99, 72, 68, 68),
+    # 开包结果
+    "immerse": (26, 445, 468, 260),
+    "rare_marks": (30, 465, 395, 240),
+    # 开包
+    "skip": (467, 888, 32, 32),
+    "pack_hourglass": (133, 797, 168, 836),
+    "pack_icon": (405, 454, 26, 17),
+    "to_swipe": (282, 228, 75, 25),
+    "weak": (114, 821, 32, 11),
+    "move": (170, 86, 50, 25),
+    "unlock": (207, 405, 54, 20),
+    "hourglass": (283, 171, 147, 51),
+    "timer": (194, 634, 27, 27),
+    "use_hourglass": (169, 365, 53, 34),
+    # 奇迹选择
+    "wp_confirm": (228, 676, 42, 21),
+    "tutorial": (267, 354, 59, 24),
+    # 注册
+    "confirm_birth": (261, 494, 72, 20),
+    "region_unselected": (95, 361, 108, 31),
+    "choose_region": (182, 226, 50, 25),
+    "year_selected": (444, 691, 24, 18),
+    "month_selected": (211, 691, 24, 18),
+    "tos_screen": (179, 211, 72, 24),
+    "close": (238, 832, 64, 64),
+    "register_nin_account": (112, 585, 190, 606),
+    "uncomplete": (235, 365, 34, 18),
+    "download": (144, 472, 72, 20),
+    "complete": (252, 419, 72, 20),
+    "welcome": (77, 587, 72, 18),
+    "name": (280, 479, 72, 20),
+    # 新手教程
+    "back": (238, 873, 64, 64),
+    "dex_task": (30, 332, 24, 24),
+    "reward": (252, 201, 36, 18),
+    "full": (363, 520, 36, 48),
+    "notification": (309, 641, 72, 18),
+    "wonder": (189, 547, 72, 18),
+    "wonder_back": (237, 804, 64, 64),
+    "task": (463, 816, 34, 40),
+    # 选择卡包
+    "point": (464, 700, 28, 48),
+    "small_back": (250, 820, 38, 32),
+    # 更换称号
+    "profile": (412, 456, 27, 27),
+    "checked": (436, 488, 19, 13),
+    "badge": (234, 601, 72, 19),
+    # 添加好友
+    "ok": (481, 899, 23, 24),
+    "friend_result": (479, 304, 24, 24),
+    "apply": (324, 407, 55, 43),
+    "friend_all": (171, 444, 72, 20),
+    # 删除好友
+    "no_friend": (225, 445, 72, 18),
+    "friended": (164, 703, 24, 16),
+    "unfriend_apply": (149, 690, 55, 43),
+    # 接受好友
+    "to_accept": (440, 291, 55, 55),
+    # 删除账号
+    "warning_delete": (239, 149, 60, 60),
+    "confirm_delete": (207, 505, 54, 18),
+    "deleted": (172, 365, 125, 20),
+    # 额外的奇迹选择
+    "extra_wp_confirm": (228, 676, 270, 697),
+    "wp_card_back": (63, 320, 134, 389),
+    "sneak_one": (213, 101, 244, 127),
+    "sneak_tool": (226, 319, 310, 395),
+    "wonder_pick": (217, 33, 323, 72),
+    "wp_reward": (181, 416, 324, 443),
+    "accomplish": (231, 715, 302, 747),
+    "mission_hourglass": (168, 417, 248, 515),
+    "mission_close": (237, 873, 301, 937),
+    "wonder_icon_wide": (120, 681, 169, 710),
+}
+
+# 点击位置 (x, y), 分组方式与 REGIONS 相同
+POINTS = {
+    # 点击对话框外的区域关闭弹窗
+    "dismiss": (270, 20),
+    "error_retry": (235, 675),
+    "not_found_ok": (271, 666),
+    "title": (494, 75),
+    "nav_home": (70, 924),
+    "nav_community": (270, 924),
+    "menu": (474, 893),
+    "friends": (70, 831),
+    "friends_back": (271, 882),
+    "friend_search": (485, 143),
+    "settings": (270, 786),
+    "account": (235, 415),
+    # 加速菜单
+    "speed_menu": (37, 142),
+    "speed_1": (33, 262),
+    "speed_2": (200, 264),
+    "speed_3": (365, 264),
+    "speed_close": (326, 490),
+    # 多个流程共用的按钮
+    "next": (522, 889),
+    "wp_pick": (385, 821),
+    "wp_card": (270, 350),
+    # 开包
+    "pack_open_hourglass": (349, 791),
+    "pack_hourglass": (395, 747),
+    "pack_open": (270, 763),
+    "pack_skip": (487, 905),
+    "tutorial_pack": (268, 754),
+    "pack_swipe_start": (42, 555),
+    "pack_swipe_end": (502, 555),
+    "tutorial_cards": (268, 582),
+    "swipe_up_start": (277, 856),
+    "swipe_up_end": (277, 207),
+    "tutorial_move": (272, 606),
+    "tutorial_move_next": (268, 861),
+    "tutorial_move_ok": (368, 639),
+    "pack_result": (478, 905),
+    "pack_next": (268, 903),
+    "unlock": (272, 853),
+    "hourglass": (272, 869),
+    "hourglass_timer": (324, 742),
+    "hourglass_use": (324, 735),
+    "hourglass_ok": (324, 758),
+    "pack_home": (340, 861),
+    # 奇迹选择
+    "wp_select": (280, 410),
+    "wp_tutorial": (272, 865),
+    # 注册
+    "register_ok": (275, 859),
+    "region_dropdown": (278, 378),
+    "region_option": (274, 680),
+    "region_ok": (274, 817),
+    "year_dropdown": (378, 697),
+    "year_option": (389, 642),
+    "month_dropdown": (156, 697),
+    "month_option": (160, 655),
+    "birth_confirm": (378, 634),
+    "tos_terms": (254, 500),
+    "tos_close": (275, 856),
+    "tos_privacy": (255, 576),
+    "tos_agree_terms": (80, 642),
+    "tos_agree_privacy": (84, 705),
+    "account_link": (263, 592),
+    "download": (264, 826),
+    "download_confirm": (439, 630),
+    "download_ok": (276, 630),
+    "skip_intro": (490, 910),
+    "name_start": (338, 765),
+    "name_input": (262, 410),
+    "input_done": (478, 910),
+    "name_ok": (405, 632),
+    "name_confirm": (349, 637),
+    "name_done": (353, 637),
+    # 新手教程
+    "tutorial_start": (268, 585),
+    "tutorial_dex": (483, 826),
+    "dex_task": (47, 406),
+    "task_reward": (274, 889),
+    "reward_full": (268, 366),
+    "notification_ok": (336, 763),
+    "tutorial_home": (268, 611),
+    "wonder": (148, 695),
+    "wonder_start": (340, 775),
+    "tutorial_task": (347, 793),
+    # 选择卡包
+    "pack_select_a1": (403, 320),
+    "pack_left": (108, 529),
+    "pack_right": (422, 529),
+    "pack_select_a1a": (184, 366),
+    "pack_select_a2": (420, 312),
+    "pack_select_a2b": (268, 312),
+    "result_home": (276, 889),
+    # 更换称号
+    "tag_home": (276, 832),
+    "tag_profile": (269, 93),
+    "tag_select": (267, 521),
+    "tag_badge": (268, 821),
+    # 添加好友
+    "friend_search_input": (251, 795),
+    "friend_search_clear": (382, 795),
+    "friend_search_ok": (445, 795),
+    "friend_not_found_back": (271, 919),
+    "friend_apply": (469, 422),
+    "friend_list": (269, 823),
+    # 删除好友
+    "unfriend_first": (271, 277),
+    "unfriend": (271, 705),
+    "unfriend_ok": (438, 632),
+    # 接受好友
+    "accept_back": (268, 884),
+    "friend_requests": (434, 821),
+    "friend_accept": (467, 318),
+    # 删除账号
+    "title_account": (224, 435),
+    "delete_data": (467, 905),
+    "delete_confirm": (387, 865),
+    "delete_ok": (457, 635),
+    "delete_done": (277, 635),
+    # 额外的奇迹选择
+    "extra_wp_select": (240, 635),
+    "sneak_choose": (275, 861),
+    "wp_back": (279, 880),
+    "wp_home": (271, 837),
+    "mission": (483, 837),
+    "mission_reward": (280, 493),
+    "mission_complete": (267, 731),
+    "mission_hourglass": (268, 621),
+    "mission_close": (273, 905),
+}
+
+# 开包结果中五张卡牌的边框
+BORDER_REGIONS = [
+    (36, 468, 135, 10),
+    (198, 468, 135, 10),
+    (362, 468, 135, 10),
+    (115, 694, 135, 10),
+    (281, 694, 135, 10),
+]
+
+WM_SIZE_PATTERN = re.compile(r"(Physical|Override) size:\s*(\d+)x(\d+)")
+
+
+def detect_resolution(adb_device):
+    """
+    读取 wm size, 有 Override size 时优先, 无法读取时返回 None
+    """
+    try:
+        output = adb_device.shell("wm size")
+    except Exception as e:
+        LOGGER.warning(f"Failed to read resolution of {adb_device.serial}: {e}")
+        return None
+    sizes = {
+        kind: (int(width), int(height))
+        for kind, width, height in WM_SIZE_PATTERN.findall(output)
+    }
+    return sizes.get("Override") or sizes.get("Physical")
+
+
+class Layout:
+    """
+    把基准分辨率下的坐标与区域换算到设备分辨率
+    """
+
+    def __init__(self, width=BASE_RESOLUTION[0], height=BASE_RESOLUTION[1]):
+        self.width = width
+        self.height = height
+        self.scale_x = width / BASE_RESOLUTION[0]
+        self.scale_y = height / BASE_RESOLUTION[1]
+
+    @property
+    def native(self):
+        return self.scale_x == 1 and self.scale_y == 1
+
+    @property
+    def scale(self):
+        """
+        模板的缩放比例, 基准分辨率时为 None
+        """
+        return None if self.native else (self.scale_x, self.scale_y)
+
+    def point(self, x, y):
+        if self.native:
+            return x, y
+        return round(x * self.scale_x), round(y * self.scale_y)
+
+    def region(self, region):
+        if region is None or self.native:
+            return region
+        x, y, w, h = region
+        return (
+            round(x * self.scale_x),
+            round(y * self.scale_y),
+            max(1, round(w * self.scale_x)),
+            max(1, round(h * self.scale_y)),
+        )
+
+    def named_point(self, name):
+        return self.point(*POINTS[name])
+
+    def named_region(self, name):
+        return self.region(REGIONS[name])
@@ -0,0 +1,146 @@
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+
+DEFAULT_LOG_DIR = os.path.join(os.curdir, "log")
+DEFAULT_LOG_FORMAT = "%(asctime)s - [%(levelname)s] [%(threadName)s] %(message)s"
+DEFAULT_MAX_MB = 20
+DEFAULT_BACKUP_COUNT = 5
+DEFAULT_QUEUE_SIZE = 10000
+
+
+class DeviceLoggerAdapter(logging.LoggerAdapter):
+    """
+    为日志加上设备前缀, 只有在级别允许输出时才拼接
+    """
+
+    def __init__(self, logger, port):
+        super().__init__(logger, {"device": port})
+        self.prefix = f"[127.0.0.1:{port}] "
+
+    def process(self, msg, kwargs):
+        kwargs["extra"] = dict(kwargs.get("extra") or {}, **self.extra)
+        return self.prefix + str(msg), kwargs
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    同进程内传递原始记录, 格式化留给后台线程
+    """
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # 写入跟不上时丢弃, 不阻塞工作线程
+            pass
+
+
+class DeviceFileHandler(logging.Handler):
+    """
+    按记录中的 device 字段写入各设备自己的轮转日志文件
+    """
+
+    def __init__(self, log_dir, max_bytes, backup_count):
+        super().__init__()
+        self.log_dir = log_dir
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.handlers = {}
+
+    def setFormatter(self, fmt):
+        super().setFormatter(fmt)
+        for handler in self.handlers.values():
+            handler.setFormatter(fmt)
+
+    def emit(self, record):
+        device = getattr(record, "device", None)
+        if device is None:
+            return
+        handler = self.handlers.get(device)
+        if handler is None:
+            handler = logging.handlers.RotatingFileHandler(
+                os.path.join(self.log_dir, f"reroll_{device}.log"),
+                maxBytes=self.max_bytes,
+                backupCount=self.backup_count,
+                encoding="utf-8",
+            )
+            handler.setFormatter(self.formatter)
+            self.handlers[device] = handler
+        handler.emit(record)
+
+    def close(self):
+        for handler in self.handlers.values():
+            handler.close()
+        super().close()
+
+
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def setup_logging(
+    level=logging.WARNING,
+    log_dir=DEFAULT_LOG_DIR,
+    per_device=False,
+    max_bytes=DEFAULT_MAX_MB * 1024 * 1024,
+    backup_count=DEFAULT_BACKUP_COUNT,
+    queue_size=DEFAULT_QUEUE_SIZE,
+    log_format=DEFAULT_LOG_FORMAT,
+):
+    """
+    根 logger 只挂一个队列 handler, 文件写入在后台 listener 线程完成
+    """
+    global _listener
+    with _listener_lock:
+        if _listener:
+            return _listener
+        formatter = logging.Formatter(log_format)
+        handlers = []
+        file_handler = logging.handlers.RotatingFileHandler(
+            os.path.join(log_dir, "reroll.log"),
+            maxBytes=max_bytes,
+            backupCount=backup_count,
+            encoding="utf-8",
+        )
+        file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
+        if per_device:
+            device_handler = DeviceFileHandler(log_dir, max_bytes, backup_count)
+            device_handler.setFormatter(formatter)
+            handlers.append(device_handler)
+
+        log_queue = queue.Queue(queue_size)
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(LazyQueueHandler(log_queue))
+        root.setLevel(level)
+        # 格式中用不到的信息不再收集, 线程名只在格式包含时记录
+        logging.logThreads = "%(thread" in log_format
+        logging.logProcesses = False
+        logging.logMultiprocessing = False
+
+        _listener = logging.handlers.QueueListener(
+            log_queue, *handlers, respect_handler_level=True
+        )
+        _listener.start()
+        return _listener
+
+
+def shutdown_logging():
+    """
+    写完队列中剩余的记录
+    """
+    global _listener
+    with _listener_lock:
+        if _listener:
+            _listener.stop()
+            for handler in _listener.handlers:
+                handler.close()
+            _listener = None
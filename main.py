@@ -1,72 +1,160 @@
+import time
+
+STARTED_AT = time.perf_counter()
+
 import concurrent.futures
 import logging
 import os
-import pytesseract
-import time
 import threading
-import yaml
 from adbutils import adb
-from discordmsg import DiscordMsg
+from artifacts import ArtifactWriter
+from backupcatalog import BackupCatalog
 from friendseeker import FriendSeeker
-from reroll import Reroll
+from heartbeat import Heartbeat
+from layout import detect_resolution
+from logsetup import setup_logging, shutdown_logging
+from metrics import start_metrics_server
+from scheduler import AdmissionScheduler
 
 DEAFULT_SCREENSHOT_DIR = "screenshot"
 DEFAUlT_BACKUP_DIR = "backup"
 DEFAUlT_LOG_DIR = "log"
 DEFAUlT_DATA_DIR = "data"
+DEFAULT_CONFIG_PATH = "settings.yaml"
+
+
+def load_config(path=DEFAULT_CONFIG_PATH):
+    """Load configuration from settings.yaml."""
+    import yaml
+
+    with open(path, "r") as config_file:
+        return yaml.safe_load(config_file)
+
+
+def create_services(config):
+    """Create the shared subsystems; optional ones are only imported when enabled."""
+    services = {}
+    debug_mode = config.get("debug", False)
+
+    log_config = config.get("logging", {})
+    setup_logging(
+        level=logging.WARNING if not debug_mode else logging.INFO,
+        log_dir=DEFAUlT_LOG_DIR,
+        per_device=log_config.get("per_device", False),
+        max_bytes=log_config.get("max_mb", 20) * 1024 * 1024,
+        backup_count=log_config.get("backup_count", 5),
+    )
+
+    friends_config = config.get("friend_codes", {})
+    discord_config = config.get("discord", {})
+    remote_friend_config = friends_config.get("remote_friend_codes", {})
+    local_friend_config = friends_config.get("local_friend_codes", {})
+    if (
+        friends_config.get("use_remote")
+        or discord_config.get("webhook_url")
+        or discord_config.get("heat_beat_url")
+    ):
+        import httpclient
+
+        http_config = config.get("http", {})
+        httpclient.configure(
+            timeout=(
+                http_config.get("connect_timeout", 5),
+                http_config.get("read_timeout", 30),
+            ),
+            retries=http_config.get("retries", 3),
+            pool_size=http_config.get("pool_size", 32),
+            http2=http_config.get("http2", False),
+        )
+    services["friend_seeker"] = FriendSeeker(
+        url=remote_friend_config.get("url"),
+        username=remote_friend_config.get("username"),
+        password=remote_friend_config.get("password"),
+        local_path=local_friend_config.get("path"),
+        remote=friends_config.get("use_remote"),
+        local=friends_config.get("use_local"),
+        cache_ttl=friends_config.get("cache_ttl", 60),
+    )
+
+    services["discord_msg"] = None
+    services["heartbeat_discord_msg"] = None
+    if discord_config.get("webhook_url") or discord_config.get("heat_beat_url"):
+        from discordmsg import DiscordMsg
+
+        if discord_config.get("webhook_url"):
+            services["discord_msg"] = DiscordMsg(
+                webhook_url=discord_config.get("webhook_url"),
+                user_id=discord_config.get("user_id"),
+                name="notify",
+                outbox_dir=DEFAUlT_DATA_DIR,
+            )
+        if discord_config.get("heat_beat_url"):
+            services["heartbeat_discord_msg"] = DiscordMsg(
+                webhook_url=discord_config.get("heat_beat_url"),
+                user_id=discord_config.get("user_id"),
+                name="heartbeat",
+                outbox_dir=DEFAUlT_DATA_DIR,
+            )
+
+    journal_config = config.get("journal", {})
+    services["event_journal"] = None
+    if journal_config.get("enabled", False):
+        from journal import EventJournal
+
+        services["event_journal"] = EventJournal(
+            path=journal_config.get("path", f"{DEFAUlT_DATA_DIR}/events.jsonl"),
+            max_bytes=journal_config.get("max_mb", 50) * 1024 * 1024,
+            backup_count=journal_config.get("backup_count", 10),
+        )
+
+    evidence_config = discord_config.get("evidence", {})
+    services["evidence_exporter"] = None
+    if services["discord_msg"] and evidence_config.get("enabled", False):
+        from imageexport import EvidenceExporter
+
+        services["evidence_exporter"] = EvidenceExporter(
+            image_format=evidence_config.get("format", "webp"),
+            quality=evidence_config.get("quality", 80),
+            scale=evidence_config.get("scale", 1.0),
+        )
+
+    screenshot_config = config.get("screenshot", {})
+    services["artifact_writer"] = ArtifactWriter(
+        directory=DEAFULT_SCREENSHOT_DIR,
+        max_queue_bytes=screenshot_config.get("queue_mb", 64) * 1024 * 1024,
+        max_files=screenshot_config.get("max_files", 2000),
+        max_bytes=screenshot_config.get("max_mb", 1024) * 1024 * 1024,
+        compress_level=screenshot_config.get("compress_level", 3),
+    )
+    services["backup_catalog"] = BackupCatalog(
+        f"{DEFAUlT_BACKUP_DIR}/catalog.sqlite3"
+    )
+    return services
+
 
-os.makedirs(DEAFULT_SCREENSHOT_DIR, exist_ok=True)
-os.makedirs(DEFAUlT_BACKUP_DIR, exist_ok=True)
-os.makedirs(DEFAUlT_LOG_DIR, exist_ok=True)
-os.makedirs(DEFAUlT_DATA_DIR, exist_ok=True)
-
-# Load configuration from settings.yaml
-with open("settings.yaml", "r") as config_file:
-    config = yaml.safe_load(config_file)
-
-debug_mode = config.get("debug", False)
-reroll_config = config.get("reroll", {})
-adb_ports = config.get("adb_ports", [])
-friends_config = config.get("friend_codes", [])
-remote_friend_config = friends_config.get("remote_friend_codes", {})
-local_friend_config = friends_config.get("local_friend_codes", {})
-friend_seeker = FriendSeeker(
-    url=remote_friend_config.get("url"),
-    username=remote_friend_config.get("username"),
-    password=remote_friend_config.get("password"),
-    local_path=local_friend_config.get("path"),
-    remote=friends_config.get("use_remote"),
-    local=friends_config.get("use_local"),
-)
-discord_config = config.get("discord", {})
-discord_msg = DiscordMsg(
-    webhook_url=discord_config.get("webhook_url"),
-    user_id=discord_config.get("user_id"),
-)
-heatbeat_discord_msg = DiscordMsg(
-    webhook_url=discord_config.get("heat_beat_url"),
-    user_id=discord_config.get("user_id"),
-)
-tesseract_path = config.get("tesseract_path", None)
-if tesseract_path:
-    pytesseract.pytesseract.tesseract_cmd = tesseract_path
-
-logging.basicConfig(
-    level=logging.WARNING if not debug_mode else logging.INFO,
-    format="%(asctime)s - [%(levelname)s] [%(threadName)s] %(message)s",
-    filename=f"{DEFAUlT_LOG_DIR}/reroll.log",
-    filemode="a",
-)
-
-
-def get_reroll_instance(adb_device):
+def close_services(services):
+    if services["event_journal"]:
+        services["event_journal"].close()
+    services["artifact_writer"].close()
+    if services["evidence_exporter"]:
+        services["evidence_exporter"].close()
+    for name in ("discord_msg", "heartbeat_discord_msg"):
+        if services[name]:
+            services[name].close()
+
+
+def get_reroll_instance(adb_device, config, services):
+    reroll_config = config.get("reroll", {})
     if adb_device.get_state() == "device":
+        # Reroll pulls in cv2 and numpy; import it only once a device is ready.
+        from reroll import Reroll
+
         return Reroll(
             reroll_pack=reroll_config.get("pack", None),
             adb_device=adb_device,
-            friend_code_seeker=friend_seeker,
-            discord_msg=discord_msg,
-            debug_mode=debug_mode,
+            friend_code_seeker=services["friend_seeker"],
+            discord_msg=services["discord_msg"],
+            debug_mode=config.get("debug", False),
             delay_ms=reroll_config.get("delay_ms"),
             game_speed=reroll_config.get("game_speed"),
             swipe_speed=reroll_config.get("swipe_speed"),
@@ -77,59 +165,118 @@ def get_reroll_instance(adb_device):
             max_packs_to_open=reroll_config.get("max_packs_to_open"),
             check_double_twostar=reroll_config.get("check_double_twostar"),
             sneak_peek_event=reroll_config.get("sneak_peek_event"),
+            calibrate=reroll_config.get("calibrate", False),
+            resume=reroll_config.get("resume", False),
+            journal=services["event_journal"],
+            evidence_exporter=services["evidence_exporter"],
+            backup_catalog=services["backup_catalog"],
+            artifact_writer=services["artifact_writer"],
+            flight_recorder=reroll_config.get("flight_recorder", False),
+            flight_frames=reroll_config.get("flight_frames", 30),
+            watchdog=reroll_config.get("watchdog", False),
+            watchdog_stall_seconds=reroll_config.get("watchdog_stall_seconds", 90),
+            watchdog_step_seconds=reroll_config.get("watchdog_step_seconds", 60),
+            watchdog_max_stall_seconds=reroll_config.get("watchdog_max_stall_seconds", 900),
+            navigate=reroll_config.get("navigate", False),
+            launch_timeout=reroll_config.get("launch_timeout", 30),
+            recycle_mode=reroll_config.get("recycle_mode", "ui"),
+            resolution=reroll_config.get("resolution") or detect_resolution(adb_device),
+            tesseract_path=config.get("tesseract_path", None),
         )
     else:
         logging.warning(f"Device {adb_device.serial} is not connected")
 
 
-if __name__ == "__main__":
+def main():
+    startup = {"imports": time.perf_counter() - STARTED_AT}
+    phase_start = time.perf_counter()
+
+    os.makedirs(DEAFULT_SCREENSHOT_DIR, exist_ok=True)
+    os.makedirs(DEFAUlT_BACKUP_DIR, exist_ok=True)
+    os.makedirs(DEFAUlT_LOG_DIR, exist_ok=True)
+    os.makedirs(DEFAUlT_DATA_DIR, exist_ok=True)
+
+    config = load_config()
+    reroll_config = config.get("reroll", {})
+    adb_ports = config.get("adb_ports", [])
+    services = create_services(config)
+    startup["config"] = time.perf_counter() - phase_start
+    phase_start = time.perf_counter()
+
     for adb_port in adb_ports:
         adb.connect(f"127.0.0.1:{adb_port}")
     max_workers = config.get("max_workers", None)
 
+    metrics_config = config.get("metrics", {})
+    if metrics_config.get("enabled", False):
+        start_metrics_server(
+            host=metrics_config.get("host", "127.0.0.1"),
+            port=metrics_config.get("port", 9108),
+        )
+
     # Stop event for heartbeat
     heartbeat_stop_event = threading.Event()
     reroll_futures = {}  # Will hold mapping future -> worker
 
-    start_time = time.time()
+    heartbeat_config = config.get("heartbeat", {})
+    heartbeat = Heartbeat(
+        discord_msg=services["heartbeat_discord_msg"],
+        account_name=reroll_config.get("account_name"),
+        adb_ports=adb_ports,
+        interval_minutes=heartbeat_config.get("interval_minutes", 30),
+        stall_minutes=heartbeat_config.get("stall_minutes", 20),
+        min_packs_per_hour=heartbeat_config.get("min_packs_per_hour"),
+        alert_window_minutes=heartbeat_config.get("alert_window_minutes", 30),
+    )
+
+    def get_worker_statuses():
+        # Only check running workers; finished ones are removed in main loop.
+        return [
+            worker.status()
+            for future, worker in dict(reroll_futures).items()
+            if future.running()
+        ]
 
     def heartbeat_loop():
         """Continuously send heartbeat messages until the stop event is set."""
-        while not heartbeat_stop_event.is_set():
-            futures_copy = dict(reroll_futures)
-            total_pack_opened = 0
-            online_workers = []
-            for future, worker in futures_copy.items():
-                # Only check running workers; finished ones are removed in main loop.
-                if future.running():
-                    worker_status = worker.status()
-                    total_pack_opened += worker_status["total_pack"]
-                    online_workers.append(worker_status["port"])
-            offline_workers = list(set(adb_ports) - set(online_workers))
-            running_time = (time.time() - start_time) / 60
-            heartbeat_message = (
-                f'{reroll_config.get("account_name")}\n'
-                f'Online: {", ".join(online_workers) if online_workers else "none"}.\n'
-                f'Offline: {", ".join(offline_workers) if offline_workers else "none"}.\n'
-                f"Time: {running_time:.0f}m Packs: {total_pack_opened}\n"
-            )
-            heatbeat_discord_msg.send_message(heartbeat_message)
-            # Sleep in short intervals to be responsive to a stop signal.
-            for _ in range(30):
-                if heartbeat_stop_event.is_set():
-                    break
-                time.sleep(60)
+        heartbeat.run(get_worker_statuses, heartbeat_stop_event)
+
+    scheduler_config = config.get("scheduler", {})
+    reroll_workers = []
+    for device in adb.device_list():
+        instance = get_reroll_instance(device, config, services)
+        if instance is not None:
+            reroll_workers.append(instance)
+    scheduler = None
+    if scheduler_config.get("enabled", False) and reroll_workers:
+        # Every device gets a thread; the scheduler decides how many are active.
+        scheduler = AdmissionScheduler(
+            reroll_workers,
+            max_active=scheduler_config.get("max_active"),
+            min_active=scheduler_config.get("min_active", 1),
+            initial_active=max_workers,
+            interval=scheduler_config.get("interval_seconds", 30),
+            cpu_high=scheduler_config.get("cpu_high_percent", 90),
+            cpu_low=scheduler_config.get("cpu_low_percent", 70),
+            min_memory_percent=scheduler_config.get("min_memory_percent", 10),
+            max_load_per_cpu=scheduler_config.get("max_load_per_cpu", 1.5),
+            max_latency_inflation=scheduler_config.get("max_latency_inflation", 2.0),
+        )
+        max_workers = len(reroll_workers)
 
     # Using a thread pool that includes an extra thread for the heartbeat loop.
     with concurrent.futures.ThreadPoolExecutor(
         max_workers=(max_workers or 1) + 1
     ) as executor:
-        # Submit worker tasks.
-        reroll_workers = []
-        for device in adb.device_list():
-            instance = get_reroll_instance(device)
-            if instance is not None:
-                reroll_workers.append(instance)
+        startup["devices"] = time.perf_counter() - phase_start
+        phase_start = time.perf_counter()
+
+        # Templates are decoded once and shared by every worker.
+        if reroll_workers:
+            reroll_workers[0].matcher.preload()
+        startup["templates"] = time.perf_counter() - phase_start
+        startup["total"] = time.perf_counter() - STARTED_AT
+        report_startup(startup, services["event_journal"])
 
         reroll_futures = {
             executor.submit(worker.start): worker for worker in reroll_workers
@@ -137,6 +284,13 @@ if __name__ == "__main__":
 
         # Submit the heartbeat loop to run concurrently.
         heartbeat_future = executor.submit(heartbeat_loop)
+        if scheduler:
+            threading.Thread(
+                target=scheduler.run,
+                args=(heartbeat_stop_event,),
+                name="Scheduler",
+                daemon=True,
+            ).start()
 
         # Main loop: monitor worker statuses.
         while True:
@@ -152,4 +306,20 @@ if __name__ == "__main__":
         # Signal the heartbeat thread to stop and wait for it to finish.
         heartbeat_stop_event.set()
         heartbeat_future.result()
+        close_services(services)
         print("All workers are done")
+        shutdown_logging()
+
+
+def report_startup(startup, event_journal=None):
+    """Log and record how long each cold start phase took."""
+    phases = ", ".join(
+        f"{name} {seconds * 1000:.0f}ms" for name, seconds in startup.items()
+    )
+    logging.getLogger("Main").warning(f"Cold start: {phases}")
+    if event_journal:
+        event_journal.emit("startup", **startup)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+import logging
+import os
+import threading
+from collections import namedtuple
+import cv2
+import numpy as np
+from templatepack import load_pack
+
+LOGGER = logging.getLogger("Matcher")
+
+DEFAULT_RES_DIR = os.path.join(os.curdir, "res")
+# 候选位置多于该数量时先在金字塔上粗匹配, 再在原图上精匹配
+COARSE_MIN_POSITIONS = 40000
+# 纹理太少的模板在缩小后没有可区分的峰值, 不做粗匹配
+COARSE_MIN_STD = 12
+# 粗匹配所用的金字塔层的最短边
+COARSE_MIN_SIDE = 12
+COARSE_CANDIDATES = 3
+
+Box = namedtuple("Box", "left top width height")
+
+
+def to_array(image, region=None):
+    """
+    截图转为 RGB 数组, 有 region 时只转换该区域
+    """
+    if isinstance(image, np.ndarray):
+        if region:
+            x, y, w, h = region
+            image = image[y : y + h, x : x + w]
+        return image
+    if region:
+        x, y, w, h = region
+        image = image.crop(
+            (x, y, min(x + w, image.width), min(y + h, image.height))
+        )
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    return np.asarray(image)
+
+
+class TemplateMatcher:
+    """
+    基于 cv2.matchTemplate (TM_CCOEFF_NORMED) 的模板匹配
+    模板在首次使用时解码并缓存, 所有设备共享
+    有最新的模板包时直接使用其中预先解码的数组, 大区域搜索时利用包中的金字塔先粗后精
+    非基准分辨率的设备按 scale 缩放模板, 缩放结果同样缓存
+    """
+
+    def __init__(self, template_dir, grayscale=False, pack=None):
+        self.template_dir = template_dir
+        self.grayscale = grayscale
+        self.pack = pack
+        self.lock = threading.Lock()
+        self.templates = {}
+
+    def template(self, image_path, scale=None):
+        key = (image_path, scale) if scale else image_path
+        template = self.templates.get(key)
+        if template is None:
+            # 基准模板需在加锁前取得
+            base = self.template(image_path) if scale else None
+            with self.lock:
+                template = self.templates.get(key)
+                if template is None:
+                    if scale:
+                        template = self.rescale(base, scale)
+                    else:
+                        template = self.load_template(image_path)
+                    self.templates[key] = template
+        return template
+
+    def rescale(self, template, scale):
+        scale_x, scale_y = scale
+        height, width = template.shape[:2]
+        size = (max(1, round(width * scale_x)), max(1, round(height * scale_y)))
+        interpolation = cv2.INTER_AREA if scale_x * scale_y < 1 else cv2.INTER_LINEAR
+        return cv2.resize(np.ascontiguousarray(template), size, interpolation=interpolation)
+
+    def load_template(self, image_path):
+        if self.pack:
+            name = os.path.splitext(os.path.basename(image_path))[0]
+            if name in self.pack.templates:
+                return self.pack.get(name, "gray" if self.grayscale else "color")
+        template = cv2.imread(image_path, cv2.IMREAD_COLOR)
+        if template is None:
+            raise FileNotFoundError(f"Failed to read template {image_path}")
+        if self.grayscale:
+            return cv2.cvtColor(template, cv2.COLOR_BGR2GRAY)
+        return cv2.cvtColor(template, cv2.COLOR_BGR2RGB)
+
+    def preload(self):
+        """
+        加载目录下所有模板, 返回数量
+        """
+        count = 0
+        for entry in os.scandir(self.template_dir):
+            if entry.is_file() and entry.name.endswith(".png"):
+                self.template(entry.path)
+                count += 1
+        return count
+
+    def score(self, image_path, screenshot, region=None, scale=None):
+        """
+        返回最佳匹配的分数和位置, 区域小于模板时返回 (None, None)
+        region 与返回的位置均为截图的实际坐标
+        """
+        template = self.template(image_path, scale)
+        haystack = to_array(screenshot, region)
+        if self.grayscale and haystack.ndim == 3:
+            haystack = cv2.cvtColor(haystack, cv2.COLOR_RGB2GRAY)
+        height, width = template.shape[:2]
+        if haystack.shape[0] < height or haystack.shape[1] < width:
+            return None, None
+        coarse = None if scale else self.coarse_template(image_path)
+        positions = (haystack.shape[0] - height + 1) * (haystack.shape[1] - width + 1)
+        if coarse is not None and positions >= COARSE_MIN_POSITIONS:
+            max_score, (left, top) = self.coarse_to_fine(haystack, template, *coarse)
+        else:
+            result = cv2.matchTemplate(haystack, template, cv2.TM_CCOEFF_NORMED)
+            _, max_score, _, (left, top) = cv2.minMaxLoc(result)
+        if region:
+            left += region[0]
+            top += region[1]
+        return max_score, Box(left, top, width, height)
+
+    def coarse_template(self, image_path):
+        """
+        模板包中最短边不小于 COARSE_MIN_SIDE 的最小一层金字塔及其层数
+        不适合粗匹配时返回 None
+        """
+        if not self.pack:
+            return None
+        name = os.path.splitext(os.path.basename(image_path))[0]
+        if name not in self.pack.templates:
+            return None
+        if self.pack.signature(name)["std"] < COARSE_MIN_STD:
+            return None
+        pyramid = self.pack.pyramid(name)
+        for levels in range(len(pyramid), 0, -1):
+            if min(pyramid[levels - 1].shape[:2]) >= COARSE_MIN_SIDE:
+                return pyramid[levels - 1], levels
+        return None
+
+    def coarse_to_fine(self, haystack, template, coarse, levels):
+        """
+        在缩小 levels 层的灰度图上取几个最佳候选, 再在原图的候选附近精确匹配
+        """
+        gray = haystack if haystack.ndim == 2 else cv2.cvtColor(haystack, cv2.COLOR_RGB2GRAY)
+        for _ in range(levels):
+            gray = cv2.pyrDown(gray)
+        if gray.shape[0] < coarse.shape[0] or gray.shape[1] < coarse.shape[1]:
+            result = cv2.matchTemplate(haystack, template, cv2.TM_CCOEFF_NORMED)
+            _, max_score, _, location = cv2.minMaxLoc(result)
+            return max_score, location
+        result = cv2.matchTemplate(gray, coarse, cv2.TM_CCOEFF_NORMED)
+        factor = 2**levels
+        height, width = template.shape[:2]
+        best_score, best_location = -1.0, (0, 0)
+        for _ in range(COARSE_CANDIDATES):
+            _, _, _, (x, y) = cv2.minMaxLoc(result)
+            # 精匹配窗口在候选位置周围各留 factor 个像素
+            left = max(0, (x - 1) * factor)
+            top = max(0, (y - 1) * factor)
+            right = min(haystack.shape[1], (x + 1) * factor + width + factor)
+            bottom = min(haystack.shape[0], (y + 1) * factor + height + factor)
+            window = haystack[top:bottom, left:right]
+            fine = cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED)
+            _, score, _, (dx, dy) = cv2.minMaxLoc(fine)
+            if score > best_score:
+                best_score, best_location = score, (left + dx, top + dy)
+            # 排除该候选附近, 继续取下一个峰值
+            result[max(0, y - 2) : y + 3, max(0, x - 2) : x + 3] = -1
+        return best_score, best_location
+
+    def locate(self, image_path, screenshot, region=None, confidence=0.8, scale=None):
+        max_score, box = self.score(image_path, screenshot, region, scale)
+        if max_score is None or max_score < confidence:
+            return None
+        return box
+
+
+_matchers = {}
+_matchers_lock = threading.Lock()
+
+
+def get_matcher(language, res_dir=DEFAULT_RES_DIR):
+    """
+    每种语言共用一个 matcher
+    """
+    with _matchers_lock:
+        matcher = _matchers.get(language)
+        if matcher is None:
+            matcher = TemplateMatcher(
+                os.path.join(res_dir, language), pack=load_pack(language, res_dir)
+            )
+            _matchers[language] = matcher
+        return matcher
@@ -0,0 +1,258 @@
+import bisect
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LOGGER = logging.getLogger("Metrics")
+
+DEFAULT_METRICS_HOST = "127.0.0.1"
+DEFAULT_METRICS_PORT = 9108
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """
+    按标签计数
+    """
+
+    type_name = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def collect(self):
+        with self.lock:
+            values = dict(self.values)
+        for labels, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+
+
+class Histogram:
+    """
+    按标签统计耗时分布
+    """
+
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        # labels -> [bucket counts..., sum, count]
+        self.values = {}
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.values.get(labels)
+            if series is None:
+                series = [0] * (len(self.buckets) + 2)
+                self.values[labels] = series
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start_time, *labels)
+
+    def snapshot(self):
+        """
+        返回 labels -> [各区间计数..., 总和, 次数] 的副本
+        """
+        with self.lock:
+            return {labels: list(series) for labels, series in self.values.items()}
+
+    def quantile(self, series, q):
+        """
+        由区间计数估算分位数, 返回所在区间的上界
+        """
+        target = series[-1] * q
+        cumulative = 0
+        for bound, count in zip(self.buckets, series):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return float("inf")
+
+    def collect(self):
+        values = self.snapshot()
+        for labels, series in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                bucket_labels = _format_labels(self.labelnames, labels, f'le="{bound}"')
+                yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+            bucket_labels = _format_labels(self.labelnames, labels, 'le="+Inf"')
+            yield f"{self.name}_bucket{bucket_labels} {series[-1]}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {series[-2]}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {series[-1]}"
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = []
+
+    def register(self, metric):
+        with self.lock:
+            self.metrics.append(metric)
+        return metric
+
+    def exposition(self):
+        """
+        Prometheus 文本格式
+        """
+        with self.lock:
+            metrics = list(self.metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STEP_LATENCY = REGISTRY.register(
+    Histogram(
+        "ptcg_step_duration_seconds",
+        "Latency of reroll steps",
+        ("device", "step", "image"),
+    )
+)
+STEP_TOTAL = REGISTRY.register(
+    Counter(
+        "ptcg_step_total",
+        "Reroll steps by result",
+        ("device", "step", "image", "result"),
+    )
+)
+
+
+@contextmanager
+def timed_step(device, step, image=""):
+    """
+    记录一个步骤的耗时与结果
+    """
+    start_time = time.perf_counter()
+    result = "ok"
+    try:
+        yield
+    except BaseException:
+        result = "error"
+        raise
+    finally:
+        STEP_LATENCY.observe(time.perf_counter() - start_time, device, step, image)
+        STEP_TOTAL.inc(device, step, image, result)
+
+
+def timed(step, image_arg=None):
+    """
+    记录 Reroll 方法的耗时, image_arg 为作为 image 标签的参数名 (需为第一个参数)
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            image = ""
+            if image_arg:
+                image = kwargs.get(image_arg, args[0] if args else "")
+            with timed_step(self.adb_port, step, image):
+                return func(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+# 其他模块注册的额外路径, handler(query) 返回 (状态码, 文本)
+ROUTES = {}
+
+
+def register_route(path, handler):
+    ROUTES[path] = handler
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path, _, query = self.path.partition("?")
+        if path == "/metrics":
+            status = 200
+            body = REGISTRY.exposition()
+        elif path in ROUTES:
+            try:
+                status, body = ROUTES[path](query)
+            except Exception as e:
+                LOGGER.error(f"Error handling {path}: {e}")
+                status, body = 500, f"{e}\n"
+        else:
+            self.send_error(404)
+            return
+        body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        LOGGER.debug(format % args)
+
+
+def start_metrics_server(host=DEFAULT_METRICS_HOST, port=DEFAULT_METRICS_PORT):
+    """
+    在后台线程启动 /metrics 服务
+    """
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(
+        target=server.serve_forever, name="MetricsServer", daemon=True
+    )
+    thread.start()
+    LOGGER.info(f"Metrics server listening on http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,115 @@
+from collections import deque
+from layout import POINTS, REGIONS
+
+# 返回键, 用于没有固定按钮的边
+BACK = "back"
+MAX_NAVIGATION_STEPS = 8
+
+# 画面 -> 用于识别的 (模板, 区域), 与 reroll 中等待这些画面时使用的区域一致
+SCREENS = {
+    "home": (("WonderIcon", REGIONS["wonder_icon"]), ("Home", REGIONS["home"])),
+    "community": (("OnCommu", REGIONS["on_community"]), ("Commu", REGIONS["community"])),
+    "friends": (
+        ("FriendNum", REGIONS["friend_num"]),
+        ("FriendNum", REGIONS["friend_num_wide"]),
+    ),
+    "friend_search": (("Search", REGIONS["friend_search"]),),
+    "menu": (("Setting", REGIONS["setting"]),),
+    "settings": (("AccountM", REGIONS["account_manage"]),),
+    "account": (("NinAccount", REGIONS["nin_account"]),),
+}
+
+# (起点, 终点) -> 点击坐标或 BACK
+TRANSITIONS = {
+    ("home", "community"): POINTS["nav_community"],
+    ("home", "menu"): POINTS["menu"],
+    ("community", "home"): POINTS["nav_home"],
+    ("community", "friends"): POINTS["friends"],
+    ("friends", "community"): POINTS["friends_back"],
+    ("friends", "friend_search"): POINTS["friend_search"],
+    ("friend_search", "friends"): BACK,
+    ("menu", "home"): BACK,
+    ("menu", "settings"): POINTS["settings"],
+    ("settings", "menu"): BACK,
+    ("settings", "account"): POINTS["account"],
+    ("account", "settings"): BACK,
+}
+
+# 弹窗 -> (识别区域, 关闭时点击的坐标)
+POPUPS = {
+    "Error": (REGIONS["error"], POINTS["error_retry"]),
+    "NotFound": (REGIONS["not_found"], POINTS["not_found_ok"]),
+}
+
+
+class Navigator:
+    """
+    已知画面之间的导航图, 卡住时识别当前画面并沿最短路径返回
+    """
+
+    def __init__(self, screens=SCREENS, transitions=TRANSITIONS, popups=POPUPS):
+        self.screens = screens
+        self.transitions = transitions
+        self.popups = popups
+        self.neighbors = {}
+        for source, target in transitions:
+            self.neighbors.setdefault(source, []).append(target)
+
+    def screen_of(self, image_name, region=None):
+        """
+        等待的模板属于哪个画面, 不在图中时返回 None
+        """
+        for screen, templates in self.screens.items():
+            for name, screen_region in templates:
+                if name == image_name and (region is None or tuple(region) == screen_region):
+                    return screen
+        return None
+
+    def identify(self, search):
+        """
+        search(模板, 区域) 返回是否匹配
+        返回 ("popup", 名称) 或 ("screen", 名称), 无法识别时返回 (None, None)
+        """
+        for name, (region, _) in self.popups.items():
+            if search(name, region):
+                return "popup", name
+        for screen, templates in self.screens.items():
+            for name, region in templates:
+                if search(name, region):
+                    return "screen", screen
+        return None, None
+
+    def path(self, source, target):
+        """
+        广度优先搜索, 返回动作列表, 不可达时返回 None
+        """
+        if source == target:
+            return []
+        previous = {source: None}
+        queue = deque([source])
+        while queue:
+            screen = queue.popleft()
+            for neighbor in self.neighbors.get(screen, []):
+                if neighbor in previous:
+                    continue
+                previous[neighbor] = screen
+                if neighbor == target:
+                    actions = []
+                    while previous[neighbor] is not None:
+                        actions.append(self.transitions[(previous[neighbor], neighbor)])
+                        neighbor = previous[neighbor]
+                    return actions[::-1]
+                queue.append(neighbor)
+        return None
+
+    def next_action(self, kind, current, target):
+        """
+        返回下一步的动作, 没有可用的动作时返回 None
+        """
+        if kind == "popup":
+            return self.popups[current][1]
+        if kind == "screen" and target:
+            actions = self.path(current, target)
+            if actions:
+                return actions[0]
+        return None
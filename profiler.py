@@ -0,0 +1,184 @@
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from urllib.parse import parse_qs
+from metrics import register_route
+
+LOGGER = logging.getLogger("Profiler")
+
+DEFAULT_OUTPUT_DIR = os.path.join(os.curdir, "data")
+DEFAULT_SAMPLE_HZ = 50
+MAX_SAMPLE_HZ = 1000
+MAX_STACK_DEPTH = 64
+# 不显示在火焰图中的包装函数
+SKIPPED_FRAMES = {
+    ("metrics.py", "wrapper"),
+    ("contextlib.py", "__enter__"),
+    ("contextlib.py", "__exit__"),
+}
+
+# 线程 id -> 设备端口
+WORKER_THREADS = {}
+
+
+def register_worker(device):
+    """
+    由工作线程调用, 之后可以按设备采样
+    """
+    WORKER_THREADS[threading.get_ident()] = str(device)
+
+
+def unregister_worker():
+    WORKER_THREADS.pop(threading.get_ident(), None)
+
+
+def frame_label(frame):
+    code = frame.f_code
+    filename = os.path.basename(code.co_filename)
+    label = f"{filename}:{code.co_name}"
+    if code.co_name == "tap_until" and filename == "reroll.py":
+        # 等待的画面名
+        image_name = frame.f_locals.get("image_name")
+        if image_name:
+            label += f"[{image_name}]"
+    return filename, code.co_name, label
+
+
+class SamplingProfiler:
+    """
+    定时读取 sys._current_frames, 统计折叠后的调用栈
+    """
+
+    def __init__(self, device=None, hz=DEFAULT_SAMPLE_HZ, output_dir=DEFAULT_OUTPUT_DIR):
+        self.device = str(device) if device else None
+        self.interval = 1 / max(1, min(hz, MAX_SAMPLE_HZ))
+        self.output_dir = output_dir
+        self.stacks = Counter()
+        self.samples = 0
+        self.started_at = None
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.started_at = time.time()
+        self.thread = threading.Thread(target=self._run, name="Profiler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        停止采样并写入文件, 返回文件路径
+        """
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+        return self.write()
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                device = WORKER_THREADS.get(ident)
+                if self.device and device != self.device:
+                    continue
+                root = device or names.get(ident, str(ident))
+                self.stacks[self.collapse(frame, root)] += 1
+            self.samples += 1
+
+    def collapse(self, frame, root):
+        labels = []
+        while frame is not None and len(labels) < MAX_STACK_DEPTH:
+            filename, name, label = frame_label(frame)
+            if (filename, name) not in SKIPPED_FRAMES:
+                labels.append(label)
+            frame = frame.f_back
+        labels.append(root)
+        return ";".join(reversed(labels))
+
+    def write(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        target = self.device or "all"
+        timestamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(self.started_at))
+        path = os.path.join(self.output_dir, f"profile_{target}_{timestamp}.collapsed")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        LOGGER.warning(f"Wrote {self.samples} profile samples to {path}")
+        return path
+
+
+_profilers = {}
+_profilers_lock = threading.Lock()
+
+
+def start_profiling(device=None, hz=DEFAULT_SAMPLE_HZ):
+    """
+    开始采样, device 为空时采样整个进程
+    """
+    key = str(device) if device else None
+    with _profilers_lock:
+        if key in _profilers:
+            return False
+        profiler = SamplingProfiler(device=key, hz=hz)
+        profiler.start()
+        _profilers[key] = profiler
+    LOGGER.warning(f"Profiling {key or 'all threads'} at {hz}Hz")
+    return True
+
+
+def stop_profiling(device=None):
+    """
+    停止采样, 返回写入的文件路径
+    """
+    key = str(device) if device else None
+    with _profilers_lock:
+        profiler = _profilers.pop(key, None)
+    if not profiler:
+        return None
+    return profiler.stop()
+
+
+def profiling_status():
+    with _profilers_lock:
+        return {
+            key or "all": {"samples": profiler.samples, "started_at": profiler.started_at}
+            for key, profiler in _profilers.items()
+        }
+
+
+def _query_value(query, name, default=None):
+    return parse_qs(query).get(name, [default])[0]
+
+
+def _handle_start(query):
+    device = _query_value(query, "device")
+    hz = int(_query_value(query, "hz", DEFAULT_SAMPLE_HZ))
+    if not start_profiling(device, hz):
+        return 409, f"Already profiling {device or 'all threads'}\n"
+    return 200, f"Profiling {device or 'all threads'} at {hz}Hz\n"
+
+
+def _handle_stop(query):
+    device = _query_value(query, "device")
+    path = stop_profiling(device)
+    if not path:
+        return 404, f"Not profiling {device or 'all threads'}\n"
+    return 200, f"{path}\n"
+
+
+def _handle_status(query):
+    lines = [
+        f"{key} {status['samples']} samples since {status['started_at']:.0f}"
+        for key, status in profiling_status().items()
+    ]
+    return 200, "\n".join(lines) + "\n" if lines else "Not profiling\n"
+
+
+register_route("/profile/start", _handle_start)
+register_route("/profile/stop", _handle_stop)
+register_route("/profile/status", _handle_status)
@@ -1,31 +1,50 @@
 import os
+import hashlib
+import posixpath
 import logging
 import time
-import pyautogui
-import pytesseract
-import cv2
 import random
+import re
+import threading
 from datetime import datetime, timezone
 from enum import Enum, auto
-from adbutils import AdbDevice
-from friendseeker import FriendSeeker
-from discordmsg import DiscordMsg
+from typing import TYPE_CHECKING
+from adbutils import AdbDevice, adb
+from artifacts import PRIORITY_DEBUG, PRIORITY_EVIDENCE
+from calibration import PROBE_TIMEOUT_SECOND, DeviceCalibration, frame_changed
+from checkpoint import RerollCheckpoint
+from flightrecorder import FlightRecorder
+from layout import BORDER_REGIONS, POINTS, REGIONS, Layout
+from logsetup import DeviceLoggerAdapter
+from matcher import get_matcher, to_array
+from metrics import STEP_LATENCY, timed, timed_step
+from navigator import BACK, MAX_NAVIGATION_STEPS, SCREENS, Navigator
+from profiler import register_worker, unregister_worker
+from watchdog import (
+    DEFAULT_MAX_STALL_SECONDS,
+    DEFAULT_STALL_SECONDS,
+    DEFAULT_STEP_SECONDS,
+    REMEDY_BACK,
+    REMEDY_DISMISS,
+    REMEDY_RECONNECT,
+    REMEDY_RESTART,
+    ProgressWatchdog,
+)
+
+if TYPE_CHECKING:
+    from discordmsg import DiscordMsg
+    from friendseeker import FriendSeeker
 
 
 LOGGER = logging.getLogger("Reroll")
 
-SCREEN_REGION = (0, 0, 540, 960)
-BORDER_REGIONS = [
-    (36, 468, 135, 10),
-    (198, 468, 135, 10),
-    (362, 468, 135, 10),
-    (115, 694, 135, 10),
-    (281, 694, 135, 10),
-]
+# 坐标与区域均为 540x960 下的值, 由 Layout 换算到设备分辨率
+SCREEN_REGION = REGIONS["screen"]
 DEFAULT_DELAY_MS = 300
 DEFAULT_GAME_SPEED = 3
 DEFAULT_SWIPE_SPEED = 480
 MAX_SWIPE_SPEED = 1000
+DEFAULT_DOUBLE_TAP_MS = 200
 DEFAULT_CONFIDENCE = 0.8
 DEFAULT_LANGUAGE = "Chinese"
 DEFAULT_TIME_OUT = 45
@@ -34,6 +53,87 @@ MAX_WAIT_FRIEND_TIME_SECOND = 15
 DEFAULT_MAX_PACKS_TO_OPEN = 4
 DEFAULT_CHECK_DOUBLE_TWOSTAR = False
 DEFAULT_SNEAK_PEEK_EVENT = False
+DEFAULT_CALIBRATE = False
+DEFAULT_RESUME = False
+DEFAULT_FLIGHT_RECORDER = False
+DEFAULT_FLIGHT_FRAMES = 30
+DEFAULT_WATCHDOG = False
+DEFAULT_NAVIGATE = False
+DEFAULT_LAUNCH_TIMEOUT = 30
+# 完成的账户的回收方式: ui 为游戏内删除, wipe 为直接删除账户文件
+RECYCLE_UI = "ui"
+RECYCLE_WIPE = "wipe"
+DEFAULT_RECYCLE_MODE = RECYCLE_UI
+# 删除账户文件后等待出现选择地区画面的秒数
+WIPE_VERIFY_SECOND = 30
+MD5_PATTERN = re.compile(r"^[0-9a-f]{32}\b")
+GAME_PACKAGE = "jp.pokemon.pokemontcgp"
+GAME_ACTIVITY = "com.unity3d.player.UnityPlayerActivity"
+STOP_TIMEOUT_SECOND = 5
+READY_POLL_SECOND = 0.25
+# 亮度范围小于该值的画面视为空白 (黑屏或纯色启动画面)
+BLANK_FRAME_RANGE = 16
+# 窗口时间内启动失败达到次数时视为崩溃循环, 重连模拟器
+CRASH_LOOP_WINDOW_SECOND = 5 * 60
+CRASH_LOOP_THRESHOLD = 3
+# 导航时每一步点击后等待画面切换的时间
+NAVIGATION_SETTLE_SECOND = 1
+KEYCODE_BACK = 4
+ACCOUNT_DATA_PATH = (
+    "/data/data/jp.pokemon.pokemontcgp/shared_prefs/deviceAccount:.xml"
+)
+# 备份时账户文件暂存的位置, 确认备份成功后于下次备份时清除
+ACCOUNT_STAGED_PATH = (
+    "/data/data/jp.pokemon.pokemontcgp/shared_prefs/.deviceAccount.staged"
+)
+# 改名保留的暂存文件超过天数后删除
+STAGED_RETENTION_DAYS = 7
+STAGED_EXPIRE_COMMAND = (
+    f"find {posixpath.dirname(ACCOUNT_STAGED_PATH)} "
+    f"-name {posixpath.basename(ACCOUNT_STAGED_PATH)}.\\* "
+    f"-mtime +{STAGED_RETENTION_DAYS} -delete; "
+)
+
+
+def staged_cleanup_command(staged_md5=None):
+    """
+    暂存文件与上次确认备份的 md5 一致时删除, 否则改名保留
+    不知道上次备份的 md5 时 (例如未开启 resume 的首次备份) 直接改名保留
+    """
+    if not staged_md5:
+        return (
+            f"[ -f {ACCOUNT_STAGED_PATH} ] && "
+            f"mv {ACCOUNT_STAGED_PATH} {ACCOUNT_STAGED_PATH}.$(date +%s); "
+        )
+    return (
+        f"if [ -f {ACCOUNT_STAGED_PATH} ]; then "
+        f'if [ "$(md5sum {ACCOUNT_STAGED_PATH} | cut -c1-32)" = "{staged_md5}" ]; '
+        f"then rm -f {ACCOUNT_STAGED_PATH}; "
+        f"else mv {ACCOUNT_STAGED_PATH} {ACCOUNT_STAGED_PATH}.$(date +%s); fi; fi; "
+    )
+
+
+def backup_command(staged_md5=None):
+    """
+    输出 "<md5>  <path>" 一行后紧跟文件内容, 无账户时输出 MISSING
+    """
+    return (
+        f"su -c '{staged_cleanup_command(staged_md5)}"
+        f"{STAGED_EXPIRE_COMMAND}"
+        f"if [ -f {ACCOUNT_DATA_PATH} ]; then "
+        f"mv {ACCOUNT_DATA_PATH} {ACCOUNT_STAGED_PATH} && "
+        f"md5sum {ACCOUNT_STAGED_PATH} && cat {ACCOUNT_STAGED_PATH}; "
+        "else echo MISSING; fi'"
+    )
+
+
+WIPE_COMMAND = (
+    f"su -c 'rm -f {ACCOUNT_DATA_PATH} && [ ! -f {ACCOUNT_DATA_PATH} ] && echo WIPED'"
+)
+ACCOUNT_MD5_COMMAND = f"su -c 'md5sum {ACCOUNT_DATA_PATH}'"
+BACKUP_RETRY_COMMAND = (
+    f"su -c 'md5sum {ACCOUNT_STAGED_PATH} && cat {ACCOUNT_STAGED_PATH}'"
+)
 
 
 class RerollState(Enum):
@@ -49,6 +149,18 @@ class RerollState(Enum):
     BREAKDOWN = auto()
 
 
+# 可以暂停的状态, 此时设备上没有未备份的账户
+SAFE_PAUSE_STATES = (RerollState.INIT, RerollState.RESET)
+# 从存档恢复时, 画面上出现 (模板, 区域) 之一即可从头重新进入该状态
+RESUME_SCREENS = {
+    # pass_tutorial 第一步等待的按钮
+    RerollState.REGISTERED: (("Back", REGIONS["back"]),),
+    # 额外的奇迹选择与添加好友均从主页开始
+    RerollState.FINISHED_TUTORIAL: SCREENS["home"],
+    RerollState.AUTOFRIEND: SCREENS["home"],
+}
+
+
 class RerollPack(Enum):
     MEWTWO = (1, "A1")
     CHARIZARD = (2, "A1")
@@ -69,10 +181,19 @@ class RerollStuckException(Exception):
     pass
 
 
+class RerollStoppedException(Exception):
+    pass
+
+
+class RerollBreakdownException(Exception):
+    pass
+
+
 class Reroll:
     delay_ms = DEFAULT_DELAY_MS
     game_speed = DEFAULT_GAME_SPEED
     swipe_speed = DEFAULT_SWIPE_SPEED
+    double_tap_ms = DEFAULT_DOUBLE_TAP_MS
     confidence = DEFAULT_CONFIDENCE
     timeout = DEFAULT_TIME_OUT
     max_packs_to_open = DEFAULT_MAX_PACKS_TO_OPEN
@@ -81,8 +202,8 @@ class Reroll:
         self,
         reroll_pack,
         adb_device: AdbDevice,
-        friend_code_seeker: FriendSeeker,
-        discord_msg: DiscordMsg,
+        friend_code_seeker: "FriendSeeker",
+        discord_msg: "DiscordMsg",
         debug_mode=False,
         delay_ms=DEFAULT_DELAY_MS,
         game_speed=DEFAULT_GAME_SPEED,
@@ -94,6 +215,23 @@ class Reroll:
         max_packs_to_open=DEFAULT_MAX_PACKS_TO_OPEN,
         check_double_twostar=DEFAULT_CHECK_DOUBLE_TWOSTAR,
         sneak_peek_event=DEFAULT_SNEAK_PEEK_EVENT,
+        calibrate=DEFAULT_CALIBRATE,
+        resume=DEFAULT_RESUME,
+        journal=None,
+        evidence_exporter=None,
+        backup_catalog=None,
+        artifact_writer=None,
+        flight_recorder=DEFAULT_FLIGHT_RECORDER,
+        flight_frames=DEFAULT_FLIGHT_FRAMES,
+        watchdog=DEFAULT_WATCHDOG,
+        watchdog_stall_seconds=DEFAULT_STALL_SECONDS,
+        watchdog_step_seconds=DEFAULT_STEP_SECONDS,
+        watchdog_max_stall_seconds=DEFAULT_MAX_STALL_SECONDS,
+        navigate=DEFAULT_NAVIGATE,
+        launch_timeout=DEFAULT_LAUNCH_TIMEOUT,
+        recycle_mode=DEFAULT_RECYCLE_MODE,
+        resolution=None,
+        tesseract_path=None,
     ):
         if isinstance(reroll_pack, RerollPack):
             self.reroll_pack = reroll_pack
@@ -105,29 +243,146 @@ class Reroll:
         self.swipe_speed = swipe_speed
         self.confidence = confidence
         self.timeout = timeout
+        self.launch_timeout = launch_timeout
+        self.recycle_mode = recycle_mode
         self.language = language
+        self.matcher = get_matcher(language)
+        self.tesseract_path = tesseract_path
         self.account_name = account_name
         self.temp_account_name = account_name
         self.friend_code_seeker = friend_code_seeker
         if isinstance(max_packs_to_open, int):
             self.max_packs_to_open = max(1, min(max_packs_to_open, 4))
         # 初始化
-        self.state = RerollState.INIT
+        self._state = RerollState.INIT
+        self.state_since = time.time()
+        self.started_at = time.time()
+        self.account_started_at = time.time()
+        self.account_count = 0
+        self.cycle_seconds = 0
+        self.restart_count = 0
+        self.launch_failures = []
+        self.last_launch_seconds = None
+        self.session_start_pack = 0
+        self.journal = journal
+        self.evidence_exporter = evidence_exporter
+        self.backup_catalog = backup_catalog
+        self.artifact_writer = artifact_writer
+        self.found_pack = None
+        # 上次确认备份的暂存文件 md5, 写入存档以便重启后清理
+        self.committed_staged_md5 = None
         self.total_pack = 0
         self.current_pack = 0
         self.wp_checked = False
+        self.stop_event = threading.Event()
+        self.pause_requested = threading.Event()
+        self.resume_event = threading.Event()
+        self.paused_at = None
+        # reroll 循环已退出 (完成, 故障或出错)
+        self.finished = False
         # 连接到 ADB 服务器
         self.adb_device = adb_device
         # 获取设备端口号
         self.adb_port = adb_device.get_serialno().split(":")[-1]
+        self.logger = DeviceLoggerAdapter(LOGGER, self.adb_port)
+        # 设备分辨率, 默认为 540x960
+        self.layout = Layout(*resolution) if resolution else Layout()
+        if not self.layout.native:
+            self.logger.warning(
+                "Scaling layout to %sx%s", self.layout.width, self.layout.height
+            )
         self.discord_msg = discord_msg
         self.check_double_twostar = check_double_twostar
         self.sneak_peek_event = sneak_peek_event
+        # 按设备校准延迟与滑动参数
+        self.calibration = None
+        if calibrate:
+            self.calibration = DeviceCalibration(
+                port=self.adb_port,
+                delay_ms=self.delay_ms,
+                swipe_speed=self.swipe_speed,
+            )
+            self.apply_calibration()
+        # 状态切换时写入存档, 重启后从存档恢复
+        self.checkpoint = RerollCheckpoint(port=self.adb_port)
+        if not resume:
+            # 不恢复时删除旧存档, 之后开启 resume 时不会读到过期的进度
+            self.checkpoint.clear()
+            self.checkpoint = None
+        # 保留最近的截图与操作, 卡住或重启时写入 data/flight
+        self.flight_recorder = (
+            FlightRecorder(port=self.adb_port, max_frames=flight_frames)
+            if flight_recorder
+            else None
+        )
+        # 长时间没有进展时先尝试返回键与关闭弹窗, 再重启游戏与重连模拟器
+        self.watchdog = (
+            ProgressWatchdog(
+                stall_seconds=watchdog_stall_seconds,
+                step_seconds=watchdog_step_seconds,
+                max_stall_seconds=watchdog_max_stall_seconds,
+            )
+            if watchdog
+            else None
+        )
+        # 卡住时先尝试关闭弹窗或沿导航图返回, 失败后才重启游戏
+        self.navigator = Navigator() if navigate else None
+
+    @property
+    def state(self):
+        return self._state
+
+    @state.setter
+    def state(self, state):
+        now = time.time()
+        if state != self._state:
+            self.record_event(
+                "state_changed",
+                previous=self._state.name,
+                state=state.name,
+                duration=now - self.state_since,
+            )
+            self.state_since = now
+        # 重启与故障不算进展
+        if self.watchdog and state not in (RerollState.RESTART, RerollState.BREAKDOWN):
+            self.watchdog.transition(state.name)
+        self._state = state
+        self.save_checkpoint()
+
+    def record_event(self, event, **fields):
+        if self.journal:
+            self.journal.emit(event, device=self.adb_port, **fields)
+
+    def save_checkpoint(self):
+        if self.checkpoint:
+            self.checkpoint.save(
+                {
+                    "state": self.state.name,
+                    "current_pack": self.current_pack,
+                    "total_pack": self.total_pack,
+                    "temp_account_name": self.temp_account_name,
+                    "wp_checked": self.wp_checked,
+                    "found_pack": self.found_pack,
+                    "staged_md5": self.committed_staged_md5,
+                }
+            )
 
-    def format_log(self, message):
-        return f"[127.0.0.1:{self.adb_port}] {message}"
+    def apply_calibration(self):
+        self.delay_ms = self.calibration.delay_ms
+        self.swipe_speed = self.calibration.swipe_speed
+        self.double_tap_ms = self.calibration.double_tap_ms
 
     def reset(self):
+        now = time.time()
+        self.record_event(
+            "account_cycle",
+            packs=self.current_pack,
+            duration=now - self.account_started_at,
+        )
+        self.account_count += 1
+        self.cycle_seconds += now - self.account_started_at
+        self.account_started_at = now
+        self.found_pack = None
         self.current_pack = 0
         self.wp_checked = False
         self.state = RerollState.RESET
@@ -136,10 +391,33 @@ class Reroll:
         """
         使用 ADB 点击模拟器屏幕上的特定位置
         """
-        self.adb_device.click(x, y)
+        x, y = self.layout.point(x, y)
+        before = None
+        if self.calibration and self.calibration.probe_due():
+            before = self.adb_device.screenshot()
+            # 点击前画面仍在变化 (动画) 时无法测量, 跳过这次采样
+            if frame_changed(before, self.adb_device.screenshot()):
+                before = None
+        tap_start = time.time()
+        with timed_step(self.adb_port, "tap"):
+            self.adb_device.click(x, y)
+        if self.flight_recorder:
+            self.flight_recorder.record("tap", x=x, y=y)
+        if before is not None:
+            self.probe_frame_latency(before, tap_start)
         if delay:
             time.sleep(self.delay_ms / 1000)
 
+    def probe_frame_latency(self, before, tap_start):
+        """
+        点击后连续截图, 记录直到画面与点击前不同的时间
+        """
+        while time.time() - tap_start < PROBE_TIMEOUT_SECOND:
+            if frame_changed(before, self.adb_device.screenshot()):
+                self.calibration.record_frame_latency(time.time() - tap_start)
+                self.apply_calibration()
+                return
+
     def adb_swipe(self, x1, y1, x2, y2, duration=None):
         """
         使用 ADB 模拟滑动操作
@@ -151,7 +429,14 @@ class Reroll:
         """
         if duration is None:
             duration = self.swipe_speed
-        self.adb_device.swipe(x1, y1, x2, y2, duration / 1000)
+        x1, y1 = self.layout.point(x1, y1)
+        x2, y2 = self.layout.point(x2, y2)
+        with timed_step(self.adb_port, "swipe"):
+            self.adb_device.swipe(x1, y1, x2, y2, duration / 1000)
+        if self.flight_recorder:
+            self.flight_recorder.record(
+                "swipe", x1=x1, y1=y1, x2=x2, y2=y2, duration=duration
+            )
         time.sleep(duration * 1.2 / 1000)
 
     def adb_input(self, text):
@@ -165,39 +450,211 @@ class Reroll:
         """
         使用 ADB 捕获设备屏幕内容
         """
-        return self.adb_device.screenshot()
+        if self.watchdog:
+            self.check_progress()
+        with timed_step(self.adb_port, "capture"):
+            screenshot = self.adb_device.screenshot()
+        if self.flight_recorder:
+            self.flight_recorder.record_frame(screenshot)
+        return screenshot
+
+    def save_screenshot(self, image, path, priority=PRIORITY_EVIDENCE, on_done=None):
+        """
+        保存截图, 有 artifact_writer 时在后台写入
+        """
+        if self.artifact_writer:
+            return self.artifact_writer.save(image, path, priority, on_done)
+        try:
+            image.save(path)
+        except Exception as e:
+            self.logger.error("Failed to save %s: %s", path, e)
+            return False
+        if on_done:
+            on_done(path)
+        return True
+
+    def mark_progress(self, marker):
+        """
+        流程中重复画面之外的进展, 例如开了一包或搜索了一个好友
+        """
+        if self.watchdog:
+            self.watchdog.progress(marker)
+
+    def check_progress(self):
+        """
+        没有进展时按看门狗给出的措施补救, 每次截图前调用
+        """
+        remedy = self.watchdog.check()
+        if not remedy:
+            return
+        stalled = self.watchdog.stalled_seconds()
+        self.logger.warning("No progress for %.0fs, trying %s", stalled, remedy)
+        self.record_event(
+            "watchdog", state=self.state.name, remedy=remedy, stalled=stalled
+        )
+        if self.flight_recorder:
+            self.flight_recorder.record("watchdog", remedy=remedy, stalled=stalled)
+        if remedy == REMEDY_BACK:
+            self.adb_device.keyevent(KEYCODE_BACK)
+        elif remedy == REMEDY_DISMISS:
+            self.adb_tap(*POINTS["dismiss"])
+        elif remedy == REMEDY_RESTART:
+            raise RerollStuckException(
+                f"Instance {self.adb_port} made no progress for {stalled:.0f}s"
+            )
+        elif remedy == REMEDY_RECONNECT:
+            self.reconnect_device()
+            raise RerollStuckException(
+                f"Instance {self.adb_port} made no progress for {stalled:.0f}s, reconnected"
+            )
+        else:
+            raise RerollBreakdownException(
+                f"Instance {self.adb_port} made no progress for {stalled:.0f}s, giving up"
+            )
 
-    def restart_game_instance(self):
+    def reconnect_device(self):
         """
-        重启游戏
+        断开并重新连接模拟器
         """
-        self.adb_device.app_stop("jp.pokemon.pokemontcgp")
-        time.sleep(1)
-        self.adb_device.app_start(
-            "jp.pokemon.pokemontcgp", "com.unity3d.player.UnityPlayerActivity"
+        serial = self.adb_device.serial
+        try:
+            adb.disconnect(serial, raise_error=False)
+            adb.connect(serial, timeout=10)
+            self.adb_device = adb.device(serial)
+            self.record_event("reconnect", state=self.state.name)
+        except Exception as e:
+            self.logger.error("Failed to reconnect %s: %s", serial, e)
+
+    def game_pid(self):
+        return self.adb_device.shell(f"pidof {GAME_PACKAGE}").strip()
+
+    def game_focused(self):
+        return GAME_PACKAGE in self.adb_device.shell(
+            "dumpsys window | grep mCurrentFocus"
         )
-        time.sleep(1)
+
+    def is_blank(self, screenshot):
+        array = to_array(screenshot)[::8, ::8]
+        return int(array.max()) - int(array.min()) < BLANK_FRAME_RANGE
+
+    def stop_game(self):
+        """
+        停止游戏并等待进程退出
+        """
+        self.adb_device.app_stop(GAME_PACKAGE)
+        deadline = time.time() + STOP_TIMEOUT_SECOND
+        while self.game_pid():
+            if time.time() >= deadline:
+                self.logger.warning("Game process still alive after stop")
+                return False
+            time.sleep(READY_POLL_SECOND)
+        return True
+
+    def launch_game(self):
+        """
+        启动游戏, 依次等待进程, 窗口焦点与第一帧非空白画面
+        返回可交互前的耗时, 超时或进程退出时返回 None
+        """
+        start_time = time.time()
+        self.adb_device.app_start(GAME_PACKAGE, GAME_ACTIVITY)
+        phase = "process"
+        while time.time() - start_time < self.launch_timeout:
+            if not self.game_pid():
+                if phase != "process":
+                    self.logger.warning(
+                        "Game process exited while waiting for %s", phase
+                    )
+                    self.record_event("launch_failed", phase=phase, reason="crash")
+                    return None
+            elif phase == "process":
+                phase = "focus"
+                STEP_LATENCY.observe(
+                    time.time() - start_time, self.adb_port, "launch", "process"
+                )
+                continue
+            elif phase == "focus" and self.game_focused():
+                phase = "frame"
+                STEP_LATENCY.observe(
+                    time.time() - start_time, self.adb_port, "launch", "focus"
+                )
+                continue
+            elif phase == "frame" and not self.is_blank(self.adb_device.screenshot()):
+                ready_seconds = time.time() - start_time
+                STEP_LATENCY.observe(ready_seconds, self.adb_port, "launch", "frame")
+                self.last_launch_seconds = ready_seconds
+                self.logger.info("Game ready in %.2fs", ready_seconds)
+                return ready_seconds
+            time.sleep(READY_POLL_SECOND)
+        self.logger.warning(
+            "Game not ready after %ss, waiting for %s", self.launch_timeout, phase
+        )
+        self.record_event("launch_failed", phase=phase, reason="timeout")
+        return None
+
+    def is_crash_looping(self):
+        now = time.time()
+        self.launch_failures = [
+            failed_at
+            for failed_at in self.launch_failures
+            if now - failed_at < CRASH_LOOP_WINDOW_SECOND
+        ]
+        self.launch_failures.append(now)
+        return len(self.launch_failures) >= CRASH_LOOP_THRESHOLD
+
+    @timed("restart_game_instance")
+    def restart_game_instance(self, reason="restart"):
+        """
+        重启游戏, 连续启动失败时重连模拟器
+        """
+        if self.flight_recorder:
+            self.flight_recorder.dump(reason, state=self.state.name)
+        self.stop_game()
+        ready_seconds = self.launch_game()
+        if ready_seconds is None and self.is_crash_looping():
+            self.logger.error(
+                "Game failed to start %s times, reconnecting", len(self.launch_failures)
+            )
+            self.record_event("crash_loop", failures=len(self.launch_failures))
+            self.launch_failures = []
+            self.reconnect_device()
+            self.stop_game()
+            ready_seconds = self.launch_game()
+        self.record_event(
+            "restart", state=self.state.name, time_to_interactive=ready_seconds
+        )
+        self.restart_count += 1
         self.wp_checked = True
         if self.state != RerollState.FOUNDGP:
             self.state = RerollState.RESTART
 
+    @timed("backup_account")
     def backup_account(self, valid=False, friend_code=None):
         """
         备份账户数据
         """
         try:
-            # 停止应用
-            self.adb_device.app_stop("jp.pokemon.pokemontcgp")
-            time.sleep(1)
-
-            # 检查账户数据文件是否存在
-            result = self.adb_device.shell(
-                "su -c 'ls /data/data/jp.pokemon.pokemontcgp/shared_prefs/deviceAccount:.xml'"
-            )
-            if "No such file or directory" in result:
-                LOGGER.warning(self.format_log("No account data found."))
+            # 停止应用, 等待进程退出后再移动账户文件
+            self.stop_game()
+
+            # 在设备端一次完成检查, 读取和移除, 账户文件移到私有目录暂存
+            command = backup_command(self.committed_staged_md5)
+            self.committed_staged_md5 = None
+            output = self.adb_exec_out(command)
+            if output.strip() == b"MISSING":
+                self.logger.warning("No account data found.")
                 self.reset()
                 return
+            content = self.verify_backup_output(output)
+            if content is None:
+                # 校验失败时重新读取暂存文件
+                self.logger.warning("Backup checksum mismatch, retrying")
+                content = self.verify_backup_output(
+                    self.adb_exec_out(BACKUP_RETRY_COMMAND)
+                )
+                if content is None:
+                    raise Exception(
+                        f"Backup checksum mismatch, account data kept at {ACCOUNT_STAGED_PATH}"
+                    )
 
             # 备份文件名
             if friend_code:
@@ -207,58 +664,116 @@ class Reroll:
                     f"deviceAccount_{self.adb_port}_{int(time.time())}.xml"
                 )
 
-            # 复制账户数据文件到 SD 卡
-            result = self.adb_device.shell(
-                "su -c 'cp /data/data/jp.pokemon.pokemontcgp/shared_prefs/deviceAccount:.xml /sdcard/'"
-            )
-            if result:
-                raise Exception(result)
-
             backup_path = os.path.join(os.curdir, "backup", backup_filename)
-            # 从 SD 卡拉取备份文件到本地
-            result = self.adb_device.sync.pull(
-                "/sdcard/deviceAccount:.xml",
-                backup_path,
-            )
-            if int(result) == 0:
-                raise Exception("Failed to pull backup file")
-
-            # 删除设备上的账户数据文件
-            result = self.adb_device.shell(
-                "su -c 'rm -f /data/data/jp.pokemon.pokemontcgp/shared_prefs/deviceAccount:.xml'"
+            tmp_path = f"{backup_path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(content)
+            self.commit_backup(tmp_path, backup_path, valid)
+            self.committed_staged_md5 = hashlib.md5(content).hexdigest()
+
+            self.logger.info("Account data backed up as %s", backup_filename)
+            self.record_event(
+                "backup_written",
+                path=backup_path,
+                valid=valid,
+                account_name=self.temp_account_name,
             )
-            if result:
-                raise Exception(result)
-
-            LOGGER.info(self.format_log(f"Account data backed up as {backup_filename}"))
             self.reset()
             return backup_path
 
         except Exception as e:
-            LOGGER.error(self.format_log(f"Error during backup: {e}"))
+            self.logger.error("Error during backup: %s", e)
             self.state = RerollState.BREAKDOWN
 
+    def adb_exec_out(self, command):
+        """
+        通过 exec 服务执行命令, 返回未经 pty 转换的原始输出
+        """
+        connection = self.adb_device.open_transport()
+        try:
+            connection.send_command(f"exec:{command}")
+            connection.check_okay()
+            return connection.read_until_close(encoding=None)
+        finally:
+            connection.close()
+
+    def verify_backup_output(self, output):
+        """
+        校验 md5, 通过时返回文件内容
+        """
+        header, separator, content = output.partition(b"\n")
+        if not separator or not header.strip():
+            return None
+        expected = header.split()[0].decode("ascii", errors="replace")
+        if hashlib.md5(content).hexdigest() != expected:
+            return None
+        return content
+
+    def commit_backup(self, tmp_path, backup_path, valid):
+        """
+        将临时文件移动到备份路径, 同时写入备份索引
+        """
+        if not self.backup_catalog:
+            os.replace(tmp_path, backup_path)
+            return
+        found_pack = self.found_pack or {}
+        self.backup_catalog.commit_backup(
+            tmp_path,
+            backup_path,
+            port=self.adb_port,
+            account_name=self.temp_account_name,
+            series=found_pack.get("series", self.reroll_pack.series),
+            pack_num=found_pack.get("pack_num"),
+            star_count=found_pack.get("star_num"),
+            valid=int(valid),
+            god_pack=int(found_pack.get("god_pack", False)),
+            screenshot=found_pack.get("screenshot"),
+        )
+
     def image_search(self, image_path, screenshot, region=None, confidence=confidence):
         """
         在图片中搜索指定图像
         """
+        match_start = time.perf_counter()
+        score = None
+        result = None
+        region = self.layout.region(region)
         try:
-            result = pyautogui.locate(
-                image_path, screenshot, region=region, confidence=confidence
+            score, box = self.matcher.score(
+                image_path, screenshot, region=region, scale=self.layout.scale
             )
-            if result:
-                LOGGER.info(
-                    self.format_log(
-                        f"Found {image_path} at ({result.left}, {result.top}, {result.left + result.width}, {result.top + result.height})"
-                    )
+            if score is not None and score >= confidence:
+                result = box
+                self.logger.info(
+                    "Found %s at (%s, %s, %s, %s)",
+                    image_path,
+                    result.left,
+                    result.top,
+                    result.left + result.width,
+                    result.top + result.height,
                 )
+                if self.watchdog:
+                    self.watchdog.progress(image_path)
+            else:
+                self.logger.debug("Image not found: %s (%s)", image_path, score)
             return result
-        except pyautogui.ImageNotFoundException as e:
-            LOGGER.debug(self.format_log(f"Image not found: {image_path}"))
-            return None
         except Exception as e:
-            LOGGER.error(self.format_log(f"Error during image search: {e}"))
+            self.logger.error("Error during image search: %s", e)
             return None
+        finally:
+            image_name = os.path.splitext(os.path.basename(image_path))[0]
+            STEP_LATENCY.observe(
+                time.perf_counter() - match_start, self.adb_port, "match", image_name
+            )
+            if self.flight_recorder:
+                self.flight_recorder.record(
+                    "match",
+                    image=image_name,
+                    region=region,
+                    confidence=confidence,
+                    score=score,
+                    box=tuple(result) if result else None,
+                )
 
     def get_image_path(self, image_name):
         return os.path.join(os.curdir, "res", self.language, f"{image_name}.png")
@@ -285,18 +800,16 @@ class Reroll:
         if self.image_search(
             image_path=self.get_image_path("Error"),
             screenshot=screenshot,
-            region=(245, 258, 50, 24),
+            region=REGIONS["error"],
         ):
-            LOGGER.warning(self.format_log("Error message found. Clicking retry..."))
-            self.adb_tap(235, 675)
+            self.logger.warning("Error message found. Clicking retry...")
+            self.adb_tap(*POINTS["error_retry"])
             time.sleep(1)
         elif self.image_search(
             image_path=self.get_image_path("App"),
             screenshot=screenshot,
         ):
-            LOGGER.warning(
-                self.format_log("Found myself at the home page. Restarting...")
-            )
+            self.logger.warning("Found myself at the home page. Restarting...")
             raise RerollStuckException(
                 f"Instance {self.adb_port} has been stuck at home page"
             )
@@ -306,43 +819,47 @@ class Reroll:
             if self.image_search(
                 image_path=self.get_image_path("DateChange"),
                 screenshot=screenshot,
-                region=(235, 405, 54, 19),
+                region=REGIONS["date_change"],
             ):
-                LOGGER.warning(
-                    self.format_log("Found date change. Restarting game instance...")
-                )
-                self.restart_game_instance()
+                self.logger.warning("Found date change. Restarting game instance...")
+                self.restart_game_instance(reason="date change")
 
+    @timed("tap_until", image_arg="image_name")
     def tap_until(
         self,
         image_name,
         region=None,
         confidence=confidence,
-        click_x=0,
-        click_y=0,
-        delay_ms=delay_ms,
+        click=None,
+        delay_ms=None,
         skip_time_ms=0,
         timeout_ms=timeout,
         safe_time=0,
     ):
+        if delay_ms is None:
+            delay_ms = self.delay_ms
         image_path = self.get_image_path(image_name)
-        click = click_x > 0 and click_y > 0
         start_time = time.time()
         confirmed = False
         click_time = 0
 
-        LOGGER.info(self.format_log(f"Looking for {image_name}"))
+        self.logger.info("Looking for %s", image_name)
+        if self.flight_recorder:
+            self.flight_recorder.record("wait", image=image_name, region=region)
 
         while True:
+            if self.stop_event.is_set():
+                raise RerollStoppedException(f"Instance {self.adb_port} stopped")
             if click:
                 elapsed_click_time = time.time() - click_time
                 if elapsed_click_time > delay_ms / 1000:
-                    self.adb_tap(click_x, click_y, delay=False)
-                    if delay_ms < 200:
+                    self.adb_tap(*click, delay=False)
+                    if delay_ms < self.double_tap_ms:
                         time.sleep(delay_ms / 1000)
-                        self.adb_tap(click_x, click_y, delay=False)
+                        self.adb_tap(*click, delay=False)
                     else:
-                        time.sleep((delay_ms - 200) / 1000)
+                        # 不双击时 double_tap_ms 为 0, 等待完整的 delay_ms
+                        time.sleep(max(0, delay_ms - self.double_tap_ms) / 1000)
                     click_time = time.time()
 
             if self.screen_search(image_path, region, confidence=confidence):
@@ -351,10 +868,8 @@ class Reroll:
             else:
                 elapsed_time = time.time() - start_time
                 if elapsed_time >= timeout_ms or safe_time >= timeout_ms:
-                    LOGGER.warning(
-                        self.format_log(
-                            f"Timeout for {image_name}. Elapsed time: {elapsed_time}s"
-                        )
+                    self.logger.warning(
+                        "Timeout for %s. Elapsed time: %ss", image_name, elapsed_time
                     )
                     if self.debug_mode:
                         # save screenshot
@@ -364,16 +879,23 @@ class Reroll:
                             "screenshot",
                             f"screenshot_{self.adb_port}_{int(time.time())}.png",
                         )
-                        stuck_screenshot.save(stuck_screenshot_path)
+                        self.save_screenshot(
+                            stuck_screenshot, stuck_screenshot_path, PRIORITY_DEBUG
+                        )
 
+                    if self.navigator and self.navigate_to(
+                        image_name, region, confidence
+                    ):
+                        confirmed = True
+                        break
                     raise RerollStuckException(
                         f"Instance {self.adb_port} has been stuck at {image_name}"
                     )
                 elif elapsed_time >= self.timeout / 3:
-                    LOGGER.warning(
-                        self.format_log(
-                            f"Start error check for {image_name}. Elapsed time: {elapsed_time}s"
-                        )
+                    self.logger.warning(
+                        "Start error check for %s. Elapsed time: %ss",
+                        image_name,
+                        elapsed_time,
                     )
                     self.error_check()
 
@@ -384,6 +906,40 @@ class Reroll:
 
         return confirmed
 
+    @timed("navigate_to", image_arg="image_name")
+    def navigate_to(self, image_name, region=None, confidence=confidence):
+        """
+        识别当前画面, 关闭弹窗或沿最短路径回到等待的画面
+        """
+        image_path = self.get_image_path(image_name)
+        target = self.navigator.screen_of(image_name, region)
+        for _ in range(MAX_NAVIGATION_STEPS):
+            screenshot = self.adb_screenshot()
+            if self.image_search(image_path, screenshot, region, confidence):
+                self.record_event("navigated", state=self.state.name, target=image_name)
+                return True
+            kind, current = self.navigator.identify(
+                lambda name, screen_region: self.image_search(
+                    self.get_image_path(name), screenshot, screen_region
+                )
+            )
+            action = self.navigator.next_action(kind, current, target)
+            if not action:
+                self.logger.warning(
+                    "Cannot navigate from %s to %s", current or "unknown screen", image_name
+                )
+                return False
+            self.logger.warning("Navigating from %s to %s", current, image_name)
+            if self.flight_recorder:
+                self.flight_recorder.record("navigate", current=current, target=image_name)
+            if action == BACK:
+                self.adb_device.keyevent(KEYCODE_BACK)
+            else:
+                self.adb_tap(*action)
+            time.sleep(NAVIGATION_SETTLE_SECOND)
+        return False
+
+    @timed("rarity_check")
     def rarity_check(self):
         """
         检查是否有稀有卡牌
@@ -391,14 +947,17 @@ class Reroll:
         check_need = False
         common_card_num = 0
         twostar_card_num = 0
+        rarity = []
         screenshot = self.adb_screenshot()
         for region in BORDER_REGIONS:
-            if self.image_search(
+            is_common = self.image_search(
                 image_path=self.get_image_path("Common"),
                 screenshot=screenshot,
                 region=region,
-            ):
+            )
+            if is_common:
                 common_card_num += 1
+            is_twostar = False
             if self.check_double_twostar:
                 if self.image_search(
                     image_path=self.get_image_path("RainbowBorder"),
@@ -414,32 +973,35 @@ class Reroll:
                     region=region,
                 ):
                     twostar_card_num += 1
+                    is_twostar = True
+            rarity.append(
+                "common" if is_common else "twostar" if is_twostar else "rare"
+            )
         is_god_pack = common_card_num == 0
         is_double_twostar_pack = twostar_card_num == 2 and not is_god_pack
         check_need = True
         
         two_star_num = 0
-        LOGGER.info(self.format_log(f"Found {common_card_num} common cards"))
+        self.logger.info("Found %s common cards", common_card_num)
         if is_god_pack:
-            # save screenshot
+            # screenshot is saved by check_pack_result
             god_pack_screenshot_path = os.path.join(
                 os.curdir,
                 "screenshot",
                 f"god_pack_{self.adb_port}_{int(time.time())}.png",
             )
-            screenshot.save(god_pack_screenshot_path)
             if self.image_search(
                 image_path=self.get_image_path("Immerse"),
                 screenshot=screenshot,
-                region=(26, 445, 468, 260),
+                region=REGIONS["immerse"],
             ) or self.image_search(
                 image_path=self.get_image_path("Crown"),
                 screenshot=screenshot,
-                region=(30, 465, 395, 240),
+                region=REGIONS["rare_marks"],
             ) or self.image_search(
                 image_path=self.get_image_path("ShinyBorder"),
                 screenshot=screenshot,
-                region=(30, 465, 395, 240),
+                region=REGIONS["rare_marks"],
             ):
                 check_need = False
             for border_region in BORDER_REGIONS:
@@ -456,7 +1018,6 @@ class Reroll:
                 "screenshot",
                 f"double_twostar_pack_{self.adb_port}_{int(time.time())}.png",
             )
-            screenshot.save(double_twostar_pack_screenshot_path)
 
         return (
             is_god_pack,
@@ -465,6 +1026,8 @@ class Reroll:
             two_star_num,
             god_pack_screenshot_path if is_god_pack else None,
             double_twostar_pack_screenshot_path if is_double_twostar_pack else None,
+            rarity,
+            screenshot,
         )
 
     def open_pack(self, pack_num=2):
@@ -475,87 +1038,86 @@ class Reroll:
             self.reroll_pack.series if pack_num > 1 else RerollPack.MEWTWO.series
         )
         swipe_duration = self.swipe_speed
+        pack_start = time.time()
 
         if pack_num > 0:
             self.current_pack += 1
+            self.mark_progress(f"pack:{self.account_started_at}:{self.current_pack}")
             if pack_num > 3 and pack_num < 5:
                 self.tap_until(
-                    region=(467, 888, 32, 32),
+                    region=REGIONS["skip"],
                     image_name="Skip",
-                    click_x=349,
-                    click_y=791,
+                    click=POINTS["pack_open_hourglass"],
                 )
             elif pack_num > 4:
                 self.tap_until(
-                    region=(133, 797, 168, 836),
+                    region=REGIONS["pack_hourglass"],
                     image_name="PackHourglass",
-                    click_x=395,
-                    click_y=747,
+                    click=POINTS["pack_hourglass"],
                 )
                 self.tap_until(
-                    region=(467, 888, 32, 32),
+                    region=REGIONS["skip"],
                     image_name="Skip",
-                    click_x=349,
-                    click_y=791,
+                    click=POINTS["pack_open_hourglass"],
                 )
             else:
                 self.tap_until(
-                    region=(467, 888, 32, 32),
+                    region=REGIONS["skip"],
                     image_name="Skip",
-                    click_x=270,
-                    click_y=763,
+                    click=POINTS["pack_open"],
                 )
             self.tap_until(
-                region=(405, 454, 26, 17),
+                region=REGIONS["pack_icon"],
                 image_name=pack_icon_name,
-                click_x=487,
-                click_y=905,
+                click=POINTS["pack_skip"],
             )
         else:
             self.tap_until(
-                region=(282, 228, 75, 25),
+                region=REGIONS["to_swipe"],
                 image_name="ToSwipe",
-                click_x=268,
-                click_y=754,
+                click=POINTS["tutorial_pack"],
             )
 
         if self.game_speed == 3:
-            self.adb_tap(37, 142)
-            self.adb_tap(33, 262)
+            self.adb_tap(*POINTS["speed_menu"])
+            self.adb_tap(*POINTS["speed_1"])
 
         swipe_times = 0
         while self.screen_search(
             image_path=self.get_image_path(pack_icon_name),
-            region=(405, 454, 26, 17),
+            region=REGIONS["pack_icon"],
         ):
             if swipe_times > 1:
                 swipe_duration = min(swipe_duration + 50, MAX_SWIPE_SPEED)
-            self.adb_swipe(42, 555, 502, 555, duration=swipe_duration)
+            self.adb_swipe(*POINTS["pack_swipe_start"], *POINTS["pack_swipe_end"], duration=swipe_duration)
             swipe_times += 1
-        if swipe_times < 2:
-            swipe_duration = max(swipe_duration - 10, DEFAULT_SWIPE_SPEED)
-        self.swipe_speed = swipe_duration
+        if self.calibration:
+            self.calibration.record_swipe(swipe_times)
+            self.apply_calibration()
+        else:
+            if swipe_times < 2:
+                swipe_duration = max(swipe_duration - 10, DEFAULT_SWIPE_SPEED)
+            self.swipe_speed = swipe_duration
 
         if pack_num == 0:
             if self.game_speed == 3:
-                self.adb_tap(200, 264)
+                self.adb_tap(*POINTS["speed_2"])
 
             self.tap_until(
-                region=(114, 821, 32, 11),
+                region=REGIONS["weak"],
                 image_name="Weak",
-                click_x=268,
-                click_y=582,
+                click=POINTS["tutorial_cards"],
             )
 
             if self.game_speed == 3:
-                self.adb_tap(33, 262)
+                self.adb_tap(*POINTS["speed_1"])
 
             start_time = time.time()
             while self.screen_search(
                 self.get_image_path("Weak"),
-                region=(114, 821, 32, 11),
+                region=REGIONS["weak"],
             ):
-                self.adb_swipe(277, 856, 277, 207, duration=160)
+                self.adb_swipe(*POINTS["swipe_up_start"], *POINTS["swipe_up_end"], duration=160)
                 elapsed_time = time.time() - start_time
                 if elapsed_time > 45:
                     raise RerollStuckException(
@@ -563,130 +1125,165 @@ class Reroll:
                     )
 
             if self.game_speed == 3:
-                self.adb_tap(365, 264)
+                self.adb_tap(*POINTS["speed_3"])
 
-                self.adb_tap(326, 490)
+                self.adb_tap(*POINTS["speed_close"])
 
             self.tap_until(
-                region=(170, 86, 50, 25),
+                region=REGIONS["move"],
                 image_name="Move",
-                click_x=272,
-                click_y=606,
+                click=POINTS["tutorial_move"],
             )
-            self.adb_tap(268, 861)
-            self.adb_tap(368, 639)
+            self.adb_tap(*POINTS["tutorial_move_next"])
+            self.adb_tap(*POINTS["tutorial_move_ok"])
 
         else:
             if self.game_speed == 3:
-                self.adb_tap(365, 264)
-                self.adb_tap(326, 490)
+                self.adb_tap(*POINTS["speed_3"])
+                self.adb_tap(*POINTS["speed_close"])
 
             self.tap_until(
-                region=(220, 54, 100, 25),
+                region=REGIONS["result"],
                 image_name="Result",
-                click_x=478,
-                click_y=905,
+                click=POINTS["pack_result"],
                 delay_ms=110,
             )
             time.sleep(self.delay_ms / 1000)
-            is_god_pack, is_double_twostar_pack, check_need = False, False, False
+            rarity = None
             if pack_num > 1:
-                pack_screenshot = self.adb_screenshot()
-                for border_region in BORDER_REGIONS:
-                    while self.image_search(
-                        image_path=self.get_image_path("Blank"),
-                        screenshot=pack_screenshot,
-                        region=border_region,
-                    ):
-                        time.sleep(1)
-                        pack_screenshot = self.adb_screenshot()
-                time.sleep(0.5)
-                is_god_pack, is_double_twostar_pack, check_need, two_star_num, god_pack_screenshot_path, double_twostar_pack_screenshot_path = (
-                    self.rarity_check()
-                )
-            if is_god_pack or is_double_twostar_pack:
-                if check_need:
-                    self.state = RerollState.FOUNDGP
-                elif self.state != RerollState.FOUNDGP:
-                    self.state = RerollState.FOUNDINVALID
-                if self.discord_msg:
-                    if is_god_pack:
-                        message = self.get_god_pack_notification(star_num=two_star_num, pack_num=pack_num, valid=check_need)
-                        screenshot_path = god_pack_screenshot_path
-                    elif is_double_twostar_pack:
-                        message = self.get_double_twostar_pack_notification(pack_num=pack_num, valid=check_need)
-                        screenshot_path = double_twostar_pack_screenshot_path
-                    self.discord_msg.send_message(
-                        message,
-                        screenshot_file=screenshot_path,
-                        ping=check_need,
-                    )
-            
-            self.adb_tap(268, 903)
+                rarity = self.check_pack_result(pack_num)
+            self.record_event(
+                "pack_opened",
+                series=pack_icon_name,
+                pack_num=pack_num,
+                rarity=rarity,
+                duration=time.time() - pack_start,
+            )
+
+            self.adb_tap(*POINTS["pack_next"])
             if pack_num == 1:
                 self.tap_until(
-                    region=(240, 51, 50, 50),
+                    region=REGIONS["dex"],
                     image_name="Dex",
-                    click_x=522,
-                    click_y=889,
+                    click=POINTS["next"],
                     delay_ms=110,
                     skip_time_ms=10,
                 )
                 self.tap_until(
-                    region=(207, 405, 54, 20),
+                    region=REGIONS["unlock"],
                     image_name="Unlock",
-                    click_x=272,
-                    click_y=853,
+                    click=POINTS["unlock"],
                 )
             elif pack_num == 3:
                 self.tap_until(
-                    region=(240, 51, 50, 50),
+                    region=REGIONS["dex"],
                     image_name="Dex",
-                    click_x=522,
-                    click_y=889,
+                    click=POINTS["next"],
                     delay_ms=110,
                     skip_time_ms=10,
                 )
                 self.tap_until(
-                    region=(283, 171, 147, 51),
+                    region=REGIONS["hourglass"],
                     image_name="Hourglass",
-                    click_x=272,
-                    click_y=869,
+                    click=POINTS["hourglass"],
                 )
                 self.tap_until(
-                    region=(194, 634, 27, 27),
+                    region=REGIONS["timer"],
                     image_name="Timer",
-                    click_x=324,
-                    click_y=742,
+                    click=POINTS["hourglass_timer"],
                 )
                 self.tap_until(
-                    region=(169, 365, 53, 34),
+                    region=REGIONS["use_hourglass"],
                     image_name="UseHourglass",
-                    click_x=324,
-                    click_y=735,
+                    click=POINTS["hourglass_use"],
                 )
                 self.tap_until(
-                    region=(194, 634, 27, 27),
+                    region=REGIONS["timer"],
                     image_name="Timer",
-                    click_x=324,
-                    click_y=758,
+                    click=POINTS["hourglass_ok"],
                 )
             else:
                 self.tap_until(
-                    region=(240, 51, 50, 50),
+                    region=REGIONS["dex"],
                     image_name="Dex",
-                    click_x=522,
-                    click_y=889,
+                    click=POINTS["next"],
                     delay_ms=110,
                     skip_time_ms=10,
                 )
                 self.tap_until(
-                    region=(251, 906, 38, 38),
+                    region=REGIONS["home"],
                     image_name="Home",
-                    click_x=340,
-                    click_y=861,
+                    click=POINTS["pack_home"],
                 )
 
+    def check_pack_result(self, pack_num):
+        """
+        检查开包结果, 发现神包时通知
+        """
+        pack_screenshot = self.adb_screenshot()
+        for border_region in BORDER_REGIONS:
+            while self.image_search(
+                image_path=self.get_image_path("Blank"),
+                screenshot=pack_screenshot,
+                region=border_region,
+            ):
+                time.sleep(1)
+                pack_screenshot = self.adb_screenshot()
+        time.sleep(0.5)
+        is_god_pack, is_double_twostar_pack, check_need, two_star_num, god_pack_screenshot_path, double_twostar_pack_screenshot_path, rarity, screenshot = (
+            self.rarity_check()
+        )
+        if is_god_pack or is_double_twostar_pack:
+            found_pack = {
+                "series": self.reroll_pack.series,
+                "pack_num": pack_num,
+                "god_pack": is_god_pack,
+                "star_num": two_star_num,
+                "valid": check_need,
+                "screenshot": god_pack_screenshot_path or double_twostar_pack_screenshot_path,
+            }
+            # 保留最好的一包用于备份索引
+            if not self.found_pack or (check_need and not self.found_pack["valid"]):
+                self.found_pack = found_pack
+            self.record_event(
+                "god_pack_found" if is_god_pack else "double_twostar_found",
+                **found_pack,
+            )
+            if check_need:
+                self.state = RerollState.FOUNDGP
+            elif self.state != RerollState.FOUNDGP:
+                self.state = RerollState.FOUNDINVALID
+            screenshot_path = god_pack_screenshot_path or double_twostar_pack_screenshot_path
+            on_saved = None
+            if self.discord_msg:
+                if is_god_pack:
+                    message = self.get_god_pack_notification(star_num=two_star_num, pack_num=pack_num, valid=check_need)
+                elif is_double_twostar_pack:
+                    message = self.get_double_twostar_pack_notification(pack_num=pack_num, valid=check_need)
+                if self.evidence_exporter:
+                    # 上传裁剪压缩后的小图, 原图保留在本地
+                    self.evidence_exporter.export(
+                        screenshot,
+                        screenshot_path,
+                        regions=[
+                            self.layout.region(region) for region in BORDER_REGIONS
+                        ],
+                        on_done=lambda path: self.discord_msg.send_message(
+                            message,
+                            screenshot_file=path,
+                            ping=check_need,
+                        ),
+                    )
+                else:
+                    # 原图写入后再发送
+                    on_saved = lambda path: self.discord_msg.send_message(
+                        message,
+                        screenshot_file=path,
+                        ping=check_need,
+                    )
+            self.save_screenshot(screenshot, screenshot_path, on_done=on_saved)
+        return rarity
+
     def get_god_pack_notification(self, star_num: int, pack_num: int, valid: bool):
         return (
             "Found god pack!!\n"
@@ -705,62 +1302,57 @@ class Reroll:
 
     def wonder_pick(self, tutorial_pack=False):
         self.tap_until(
-            region=(228, 676, 42, 21),
+            region=REGIONS["wp_confirm"],
             image_name="WPComfirm",
-            click_x=280,
-            click_y=410,
+            click=POINTS["wp_select"],
         )
         self.tap_until(
-            region=(179, 122, 31, 21),
+            region=REGIONS["choose"],
             image_name="Choose",
-            click_x=385,
-            click_y=821,
+            click=POINTS["wp_pick"],
         )
         self.tap_until(
-            region=(99, 72, 68, 68),
+            region=REGIONS["get"],
             image_name="Get",
-            click_x=270,
-            click_y=350,
+            click=POINTS["wp_card"],
         )
         if tutorial_pack:
             self.tap_until(
-                region=(240, 51, 50, 50),
+                region=REGIONS["dex"],
                 image_name="Dex",
-                click_x=522,
-                click_y=889,
+                click=POINTS["next"],
                 delay_ms=110,
                 skip_time_ms=8,
             )
             self.tap_until(
-                region=(267, 354, 59, 24),
+                region=REGIONS["tutorial"],
                 image_name="Tutorial",
-                click_x=272,
-                click_y=865,
+                click=POINTS["wp_tutorial"],
             )
         else:
             self.tap_until(
-                region=(251, 906, 38, 38),
+                region=REGIONS["home"],
                 image_name="Home",
-                click_x=522,
-                click_y=889,
+                click=POINTS["next"],
                 skip_time_ms=5,
             )
 
     def register(self):
+        register_start = time.time()
         start_time = time.time()
         elapsed_time = 0
 
         while True:
-            self.adb_tap(494, 75)
+            self.adb_tap(*POINTS["title"])
             if self.tap_until(
-                region=(206, 212, 128, 25),
+                region=REGIONS["region_select"],
                 image_name="Region",
                 safe_time=elapsed_time,
                 skip_time_ms=1,
             ):
                 break
             elif self.tap_until(
-                region=(245, 71, 50, 23),
+                region=REGIONS["menu_title"],
                 image_name="Menu",
                 safe_time=elapsed_time,
                 skip_time_ms=1,
@@ -769,28 +1361,25 @@ class Reroll:
                 break
             self.error_check()
 
-            LOGGER.info(self.format_log("Registering new account"))
+            self.logger.info("Registering new account")
 
             elapsed_time = time.time() - start_time
-            LOGGER.info(
-                self.format_log(f"Open screen not found. Elapsed time: {elapsed_time}s")
-            )
+            self.logger.info("Open screen not found. Elapsed time: %ss", elapsed_time)
 
         start_time = time.time()
         elapsed_time = 0
         if self.game_speed > 1 and self.state != RerollState.RESET:
-            self.adb_tap(37, 142)
+            self.adb_tap(*POINTS["speed_menu"])
             if self.game_speed == 3:
-                self.adb_tap(365, 264)
+                self.adb_tap(*POINTS["speed_3"])
             else:
-                self.adb_tap(200, 264)
-            self.adb_tap(326, 490)
+                self.adb_tap(*POINTS["speed_2"])
+            self.adb_tap(*POINTS["speed_close"])
 
         while not self.tap_until(
-            region=(261, 494, 72, 20),
+            region=REGIONS["confirm_birth"],
             image_name="ConfirmBirth",
-            click_x=275,
-            click_y=859,
+            click=POINTS["register_ok"],
             safe_time=elapsed_time,
             skip_time_ms=1,
         ):
@@ -799,215 +1388,201 @@ class Reroll:
             if self.image_search(
                 image_path=self.get_image_path(image_name="RegionUnselected"),
                 screenshot=open_screenshot,
-                region=(95, 361, 108, 31),
+                region=REGIONS["region_unselected"],
             ):
-                self.adb_tap(278, 378)
-                self.adb_tap(274, 680)
-                self.adb_tap(274, 817)
+                self.adb_tap(*POINTS["region_dropdown"])
+                self.adb_tap(*POINTS["region_option"])
+                self.adb_tap(*POINTS["region_ok"])
             elif self.image_search(
                 image_path=self.get_image_path(image_name="ChooseRegion"),
                 screenshot=open_screenshot,
-                region=(182, 226, 50, 25),
+                region=REGIONS["choose_region"],
             ):
-                self.adb_tap(274, 680)
-                self.adb_tap(274, 817)
+                self.adb_tap(*POINTS["region_option"])
+                self.adb_tap(*POINTS["region_ok"])
 
             if not self.screen_search(
                 image_path=self.get_image_path(image_name="Selected"),
-                region=(444, 691, 24, 18),
+                region=REGIONS["year_selected"],
             ):
                 elapsed_time = time.time() - start_time
-                LOGGER.info(f"Select year. Elapsed time: {elapsed_time}s")
-                self.adb_tap(378, 697)
-                self.adb_tap(389, 642)
+                self.logger.info("Select year. Elapsed time: %ss", elapsed_time)
+                self.adb_tap(*POINTS["year_dropdown"])
+                self.adb_tap(*POINTS["year_option"])
 
             if not self.screen_search(
                 image_path=self.get_image_path(image_name="Selected"),
-                region=(211, 691, 24, 18),
+                region=REGIONS["month_selected"],
             ):
                 elapsed_time = time.time() - start_time
-                LOGGER.info(f"Select month. Elapsed time: {elapsed_time}s")
-                self.adb_tap(156, 697)
-                self.adb_tap(160, 655)
+                self.logger.info("Select month. Elapsed time: %ss", elapsed_time)
+                self.adb_tap(*POINTS["month_dropdown"])
+                self.adb_tap(*POINTS["month_option"])
 
         self.tap_until(
-            region=(179, 211, 72, 24),
+            region=REGIONS["tos_screen"],
             image_name="TosScreen",
-            click_x=378,
-            click_y=634,
+            click=POINTS["birth_confirm"],
             delay_ms=1000,
         )
         self.tap_until(
-            region=(238, 832, 64, 64),
+            region=REGIONS["close"],
             image_name="Close",
-            click_x=254,
-            click_y=500,
+            click=POINTS["tos_terms"],
             delay_ms=1000,
         )
         self.tap_until(
-            region=(179, 211, 72, 24),
+            region=REGIONS["tos_screen"],
             image_name="TosScreen",
-            click_x=275,
-            click_y=856,
+            click=POINTS["tos_close"],
         )
         self.tap_until(
-            region=(238, 832, 64, 64),
+            region=REGIONS["close"],
             image_name="Close",
-            click_x=255,
-            click_y=576,
+            click=POINTS["tos_privacy"],
             delay_ms=1000,
         )
         self.tap_until(
-            region=(179, 211, 72, 24),
+            region=REGIONS["tos_screen"],
             image_name="TosScreen",
-            click_x=275,
-            click_y=856,
+            click=POINTS["tos_close"],
         )
 
-        self.adb_tap(80, 642)
-        self.adb_tap(84, 705)
-        self.adb_tap(275, 859)
+        self.adb_tap(*POINTS["tos_agree_terms"])
+        self.adb_tap(*POINTS["tos_agree_privacy"])
+        self.adb_tap(*POINTS["register_ok"])
         self.tap_until(
-            region=(112, 585, 190, 606),
+            region=REGIONS["register_nin_account"],
             image_name="NinAccount",
-            click_x=263,
-            click_y=592,
+            click=POINTS["account_link"],
         )
         if not self.screen_search(
             image_path=self.get_image_path("Uncomplete"),
-            region=(235, 365, 34, 18),
+            region=REGIONS["uncomplete"],
         ):
             self.tap_until(
-                region=(144, 472, 72, 20),
+                region=REGIONS["download"],
                 image_name="Download",
-                click_x=264,
-                click_y=826,
+                click=POINTS["download"],
             )
             self.tap_until(
-                region=(252, 419, 72, 20),
+                region=REGIONS["complete"],
                 image_name="Complete",
-                click_x=439,
-                click_y=630,
+                click=POINTS["download_confirm"],
             )
 
-        self.adb_tap(276, 630)
+        self.adb_tap(*POINTS["download_ok"])
 
         if self.game_speed == 3:
-            self.adb_tap(37, 142)
-            self.adb_tap(33, 262)
+            self.adb_tap(*POINTS["speed_menu"])
+            self.adb_tap(*POINTS["speed_1"])
 
         self.tap_until(
-            region=(77, 587, 72, 18),
+            region=REGIONS["welcome"],
             image_name="Welcome",
-            click_x=490,
-            click_y=910,
+            click=POINTS["skip_intro"],
         )
 
         if self.game_speed == 3:
-            self.adb_tap(365, 264)
-            self.adb_tap(326, 490)
+            self.adb_tap(*POINTS["speed_3"])
+            self.adb_tap(*POINTS["speed_close"])
 
         self.tap_until(
-            region=(280, 479, 72, 20), image_name="Name", click_x=338, click_y=765
+            region=REGIONS["name"], image_name="Name", click=POINTS["name_start"]
         )
-        self.adb_tap(262, 410)
-        self.adb_tap(262, 410)
+        self.adb_tap(*POINTS["name_input"])
+        self.adb_tap(*POINTS["name_input"])
 
         start_time = time.time()
         elapsed_time = 0
         self.temp_account_name = self.account_name + str(random.randint(1, 999))
         self.adb_input(self.temp_account_name)
 
-        self.adb_tap(478, 910)
+        self.adb_tap(*POINTS["input_done"])
 
         while not self.tap_until(
-            region=(280, 479, 72, 20),
+            region=REGIONS["name"],
             image_name="Name",
-            click_x=405,
-            click_y=632,
+            click=POINTS["name_ok"],
             skip_time_ms=5,
         ):
             elapsed_time = time.time() - start_time
-            LOGGER.info(f"Stuck at name. Elapsed time: {elapsed_time}s")
-            self.adb_tap(262, 410)
-            self.adb_tap(262, 410)
+            self.logger.info("Stuck at name. Elapsed time: %ss", elapsed_time)
+            self.adb_tap(*POINTS["name_input"])
+            self.adb_tap(*POINTS["name_input"])
             self.adb_input("1")
-            self.adb_tap(478, 910)
+            self.adb_tap(*POINTS["input_done"])
             if elapsed_time > self.timeout:
                 raise RerollStuckException(
                     f"Instance {self.adb_port} has been stuck at Name"
                 )
-        self.adb_tap(349, 637)
-        self.adb_tap(353, 637)
+        self.adb_tap(*POINTS["name_confirm"])
+        self.adb_tap(*POINTS["name_done"])
 
+        self.record_event(
+            "account_registered",
+            account_name=self.temp_account_name,
+            duration=time.time() - register_start,
+        )
         self.state = RerollState.REGISTERED
 
     def pass_tutorial(self):
         self.tap_until(
-            region=(238, 873, 64, 64),
+            region=REGIONS["back"],
             image_name="Back",
-            click_x=268,
-            click_y=585,
+            click=POINTS["tutorial_start"],
         )
 
         # Tutorial pack
         self.open_pack(pack_num=0)
         self.tap_until(
-            region=(30, 332, 24, 24),
+            region=REGIONS["dex_task"],
             image_name="DexTask",
-            click_x=483,
-            click_y=826,
+            click=POINTS["tutorial_dex"],
         )
         self.tap_until(
-            region=(252, 201, 36, 18),
+            region=REGIONS["reward"],
             image_name="Reward",
-            click_x=47,
-            click_y=406,
+            click=POINTS["dex_task"],
         )
         self.tap_until(
-            region=(363, 520, 36, 48),
+            region=REGIONS["full"],
             image_name="Full",
-            click_x=274,
-            click_y=889,
+            click=POINTS["task_reward"],
         )
 
         self.tap_until(
-            region=(309, 641, 72, 18),
+            region=REGIONS["notification"],
             image_name="Notification",
-            click_x=268,
-            click_y=366,
+            click=POINTS["reward_full"],
             timeout_ms=45,
         )
-        self.adb_tap(336, 763)
+        self.adb_tap(*POINTS["notification_ok"])
 
         # First pack
         self.open_pack(pack_num=1)
 
         self.tap_until(
-            region=(120, 681, 49, 29),
+            region=REGIONS["wonder_icon"],
             image_name="WonderIcon",
-            click_x=268,
-            click_y=611,
+            click=POINTS["tutorial_home"],
         )
         self.tap_until(
-            region=(189, 547, 72, 18),
+            region=REGIONS["wonder"],
             image_name="Wonder",
-            click_x=148,
-            click_y=695,
+            click=POINTS["wonder"],
         )
         self.tap_until(
-            region=(237, 804, 64, 64),
+            region=REGIONS["wonder_back"],
             image_name="Back",
-            click_x=340,
-            click_y=775,
+            click=POINTS["wonder_start"],
         )
         self.wonder_pick(tutorial_pack=True)
 
         self.tap_until(
-            region=(463, 816, 34, 40),
+            region=REGIONS["task"],
             image_name="Task",
-            click_x=347,
-            click_y=793,
+            click=POINTS["tutorial_task"],
         )
 
         if self.state != RerollState.FOUNDGP:
@@ -1016,103 +1591,96 @@ class Reroll:
     def open_234_pack(self):
         if self.reroll_pack.series == "A1":
             self.tap_until(
-                region=(464, 700, 28, 48),
+                region=REGIONS["point"],
                 image_name="Point",
-                click_x=403,
-                click_y=320,
+                click=POINTS["pack_select_a1"],
             )
             time.sleep(1)
             if self.reroll_pack == RerollPack.CHARIZARD:
-                self.adb_tap(108, 529)
+                self.adb_tap(*POINTS["pack_left"])
             elif self.reroll_pack == RerollPack.PIKACHU:
-                self.adb_tap(422, 529)
+                self.adb_tap(*POINTS["pack_right"])
         elif self.reroll_pack.series == "A1a":
             self.tap_until(
-                region=(250, 820, 38, 32),
+                region=REGIONS["small_back"],
                 image_name="SmallBack",
-                click_x=184,
-                click_y=366,
+                click=POINTS["pack_select_a1a"],
             )
         elif self.reroll_pack.series == "A2":
             self.tap_until(
-                region=(464, 700, 28, 48),
+                region=REGIONS["point"],
                 image_name="Point",
-                click_x=420,
-                click_y=312,
+                click=POINTS["pack_select_a2"],
             )
             if self.reroll_pack == RerollPack.PALKIA:
-                self.adb_tap(422, 529)
+                self.adb_tap(*POINTS["pack_right"])
         elif self.reroll_pack.series == "A2a":
             self.tap_until(
-                region=(464, 700, 28, 48),
+                region=REGIONS["point"],
                 image_name="Point",
-                click_x=420,
-                click_y=312,
+                click=POINTS["pack_select_a2"],
             )
         elif self.reroll_pack.series == "A2b":
             self.tap_until(
-                region=(464, 700, 28, 48),
+                region=REGIONS["point"],
                 image_name="Point",
-                click_x=268,
-                click_y=312,
+                click=POINTS["pack_select_a2b"],
             )
         else:
-            LOGGER.error(
-                self.format_log(f"Invalid pack series: {self.reroll_pack.series}")
-            )
+            self.logger.error("Invalid pack series: %s", self.reroll_pack.series)
         if self.state != RerollState.FOUNDGP and self.max_packs_to_open > 1:
             self.open_pack(pack_num=2)
             self.total_pack += 1
+            self.save_checkpoint()
         if self.state != RerollState.FOUNDGP and self.max_packs_to_open > 2:
             self.open_pack(pack_num=3)
             self.total_pack += 1
+            self.save_checkpoint()
         # 4th pack, first hourglass pack
         if self.state != RerollState.FOUNDGP and self.max_packs_to_open > 3:
             self.open_pack(pack_num=4)
             self.total_pack += 1
+            self.save_checkpoint()
         if self.state != RerollState.FOUNDGP and self.max_packs_to_open > 3:
             self.open_pack(pack_num=5)
             self.total_pack += 1
+            self.save_checkpoint()
         # 6th pack
         if self.state != RerollState.FOUNDGP and self.max_packs_to_open > 3:
             self.open_pack(pack_num=6)
             self.total_pack += 1
+            self.save_checkpoint()
 
         if self.state == RerollState.FOUNDGP or self.state == RerollState.FOUNDINVALID:
             self.tap_until(
-                region=(251, 906, 38, 38),
+                region=REGIONS["home"],
                 image_name="Home",
-                click_x=276,
-                click_y=889,
+                click=POINTS["result_home"],
             )
         else:
             self.state = RerollState.COMPLETED
 
     def change_tag(self):
         self.tap_until(
-            region=(120, 681, 49, 29),
+            region=REGIONS["wonder_icon"],
             image_name="WonderIcon",
-            click_x=276,
-            click_y=832,
+            click=POINTS["tag_home"],
         )
         self.tap_until(
-            region=(412, 456, 27, 27),
+            region=REGIONS["profile"],
             image_name="Profile",
-            click_x=269,
-            click_y=93,
+            click=POINTS["tag_profile"],
         )
         self.tap_until(
-            region=(436, 488, 19, 13),
+            region=REGIONS["checked"],
             image_name="Checked",
-            click_x=267,
-            click_y=521,
+            click=POINTS["tag_select"],
             delay_ms=500,
         )
         self.tap_until(
-            region=(234, 601, 72, 19),
+            region=REGIONS["badge"],
             image_name="Badge",
-            click_x=268,
-            click_y=821,
+            click=POINTS["tag_badge"],
         )
 
     def add_friends(self):
@@ -1120,156 +1688,142 @@ class Reroll:
         添加好友
         """
         self.tap_until(
-            region=(251, 907, 36, 36),
+            region=REGIONS["on_community"],
             image_name="OnCommu",
-            click_x=270,
-            click_y=924,
+            click=POINTS["nav_community"],
         )
         self.tap_until(
-            region=(158, 136, 20, 15),
+            region=REGIONS["friend_num"],
             image_name="FriendNum",
-            click_x=70,
-            click_y=831,
+            click=POINTS["friends"],
         )
         while not self.screen_search(
             image_path=self.get_image_path("Search"),
-            region=(432, 784, 30, 30),
+            region=REGIONS["friend_search"],
         ):
-            self.adb_tap(485, 143)
-            self.adb_tap(251, 795)
+            self.adb_tap(*POINTS["friend_search"])
+            self.adb_tap(*POINTS["friend_search_input"])
         is_start = True
         friend_code_list = self.friend_code_seeker.get_friend_codes()
         for check_id in friend_code_list:
+            self.mark_progress(f"friend:{check_id}")
             if not is_start:
                 while not self.screen_search(
                     image_path=self.get_image_path("Search"),
-                    region=(432, 784, 30, 30),
+                    region=REGIONS["friend_search"],
                 ):
-                    self.adb_tap(485, 143)
+                    self.adb_tap(*POINTS["friend_search"])
                 while not self.screen_search(
                     image_path=self.get_image_path("OK"),
-                    region=(481, 899, 23, 24),
+                    region=REGIONS["ok"],
                 ):
-                    self.adb_tap(382, 795)
+                    self.adb_tap(*POINTS["friend_search_clear"])
                 for _ in range(16):
                     self.adb_device.keyevent(67)
             is_start = False
             self.adb_input(check_id)
             self.tap_until(
-                region=(479, 304, 24, 24),
+                region=REGIONS["friend_result"],
                 image_name="FriendResult",
-                click_x=445,
-                click_y=795,
+                click=POINTS["friend_search_ok"],
                 skip_time_ms=5,
             )
             if self.screen_search(
                 image_path=self.get_image_path("NotFound"),
-                region=(162, 389, 72, 19),
+                region=REGIONS["not_found"],
             ):
-                self.adb_tap(271, 666)
+                self.adb_tap(*POINTS["not_found_ok"])
                 self.tap_until(
-                    region=(44, 798, 44, 40),
+                    region=REGIONS["community"],
                     image_name="Commu",
-                    click_x=271,
-                    click_y=919,
+                    click=POINTS["friend_not_found_back"],
                 )
                 continue
             if self.screen_search(
                 image_path=self.get_image_path("Apply"),
-                region=(324, 407, 55, 43),
+                region=REGIONS["apply"],
             ):
-                self.adb_tap(469, 422)
+                self.adb_tap(*POINTS["friend_apply"])
                 time.sleep(self.delay_ms / 500)
         self.tap_until(
-            region=(44, 798, 44, 40),
+            region=REGIONS["community"],
             image_name="Commu",
-            click_x=271,
-            click_y=882,
+            click=POINTS["friends_back"],
         )
         # wait be accepted
         start_time = time.time()
         while True:
             self.tap_until(
-                region=(158, 136, 30, 15),
+                region=REGIONS["friend_num_wide"],
                 image_name="FriendNum",
-                click_x=70,
-                click_y=831,
+                click=POINTS["friends"],
             )
-            self.adb_tap(269, 823)
+            self.adb_tap(*POINTS["friend_list"])
             friend_screenshot = self.adb_screenshot()
             if self.image_search(
                 image_path=self.get_image_path("FriendAll"),
                 screenshot=friend_screenshot,
-                region=(171, 444, 72, 20),
+                region=REGIONS["friend_all"],
             ):
                 break
             self.tap_until(
-                region=(44, 798, 44, 40),
+                region=REGIONS["community"],
                 image_name="Commu",
-                click_x=271,
-                click_y=882,
+                click=POINTS["friends_back"],
             )
             if time.time() - start_time > MAX_WAIT_FRIEND_TIME_SECOND:
-                LOGGER.info(self.format_log("Timeout for checking friend request"))
+                self.logger.info("Timeout for checking friend request")
                 # back to home
                 break
         self.tap_until(
-            region=(44, 798, 44, 40),
+            region=REGIONS["community"],
             image_name="Commu",
-            click_x=271,
-            click_y=882,
+            click=POINTS["friends_back"],
         )
         self.tap_until(
-            region=(120, 681, 49, 29),
+            region=REGIONS["wonder_icon"],
             image_name="WonderIcon",
-            click_x=70,
-            click_y=924,
+            click=POINTS["nav_home"],
         )
 
     def auto_unfriend_all(self):
         # unfriend
         self.tap_until(
-            region=(44, 798, 44, 40),
+            region=REGIONS["community"],
             image_name="Commu",
-            click_x=270,
-            click_y=924,
+            click=POINTS["nav_community"],
         )
         while True:
             self.tap_until(
-                region=(158, 136, 20, 15),
+                region=REGIONS["friend_num"],
                 image_name="FriendNum",
-                click_x=70,
-                click_y=831,
+                click=POINTS["friends"],
             )
             if self.screen_search(
                 image_path=self.get_image_path("NoFriend"),
-                region=(225, 445, 72, 18),
+                region=REGIONS["no_friend"],
             ):
                 self.tap_until(
-                    region=(44, 798, 44, 40),
+                    region=REGIONS["community"],
                     image_name="Commu",
-                    click_x=271,
-                    click_y=882,
+                    click=POINTS["friends_back"],
                 )
                 break
             self.tap_until(
-                region=(164, 703, 24, 16),
+                region=REGIONS["friended"],
                 image_name="Friended",
-                click_x=271,
-                click_y=277,
+                click=POINTS["unfriend_first"],
             )
-            self.adb_tap(271, 705)
+            self.adb_tap(*POINTS["unfriend"])
             self.tap_until(
-                region=(149, 690, 55, 43),
+                region=REGIONS["unfriend_apply"],
                 image_name="Apply",
-                click_x=438,
-                click_y=632,
+                click=POINTS["unfriend_ok"],
             )
             self.tap_until(
-                region=(44, 798, 44, 40),
+                region=REGIONS["community"],
                 image_name="Commu",
-                click_x=271,
-                click_y=882,
+                click=POINTS["friends_back"],
             )
 
     def auto_friend(self, friend_code):
@@ -1279,23 +1833,21 @@ class Reroll:
         start_time = time.time()
         while (time.time() - start_time) < MAX_FRIEND_TIME_SECOND:
             self.tap_until(
-                region=(44, 798, 44, 40),
+                region=REGIONS["community"],
                 image_name="Commu",
-                click_x=268,
-                click_y=884,
+                click=POINTS["accept_back"],
             )
             self.tap_until(
-                region=(158, 136, 20, 15),
+                region=REGIONS["friend_num"],
                 image_name="FriendNum",
-                click_x=70,
-                click_y=831,
+                click=POINTS["friends"],
             )
-            self.adb_tap(434, 821)
+            self.adb_tap(*POINTS["friend_requests"])
             if self.screen_search(
                 image_path=self.get_image_path("ToAccept"),
-                region=(440, 291, 55, 55),
+                region=REGIONS["to_accept"],
             ):
-                self.adb_tap(467, 318)
+                self.adb_tap(*POINTS["friend_accept"])
             gp_valid = self.checker.get_valid(check_id=friend_code)
             if gp_valid == 1:
                 return True
@@ -1309,24 +1861,27 @@ class Reroll:
         获取朋友ID
         """
         self.tap_until(
-            region=(251, 907, 36, 36),
+            region=REGIONS["on_community"],
             image_name="OnCommu",
-            click_x=270,
-            click_y=924,
+            click=POINTS["nav_community"],
         )
         self.tap_until(
-            region=(158, 136, 20, 15),
+            region=REGIONS["friend_num"],
             image_name="FriendNum",
-            click_x=70,
-            click_y=831,
+            click=POINTS["friends"],
         )
-        self.adb_tap(485, 143)
+        self.adb_tap(*POINTS["friend_search"])
         time.sleep(self.delay_ms / 1000)
-        # ocr (157, 566, 382, 599)
         screenshot = self.adb_screenshot()
-        cropped_image = screenshot[566:599, 157:382]
+        cropped_image = to_array(
+            screenshot, self.layout.region(REGIONS["friend_code"])
+        )
 
         # 使用 pytesseract 进行 OCR 识别
+        import pytesseract
+
+        if self.tesseract_path:
+            pytesseract.pytesseract.tesseract_cmd = self.tesseract_path
         friend_code = pytesseract.image_to_string(
             cropped_image, config="--psm 6 digits -c tessedit_char_whitelist=0123456789"
         )
@@ -1338,138 +1893,171 @@ class Reroll:
         """
         if in_game:
             self.tap_until(
-                region=(190, 762, 32, 32),
+                region=REGIONS["setting"],
                 image_name="Setting",
-                click_x=474,
-                click_y=893,
+                click=POINTS["menu"],
             )
             self.tap_until(
-                region=(52, 393, 35, 38),
+                region=REGIONS["account_manage"],
                 image_name="AccountM",
-                click_x=270,
-                click_y=786,
+                click=POINTS["settings"],
             )
             self.tap_until(
-                region=(114, 781, 78, 21),
+                region=REGIONS["nin_account"],
                 image_name="NinAccount",
-                click_x=235,
-                click_y=415,
+                click=POINTS["account"],
             )
         else:
-            self.adb_tap(224, 435)
+            self.adb_tap(*POINTS["title_account"])
         self.tap_until(
-            region=(239, 149, 60, 60),
+            region=REGIONS["warning_delete"],
             image_name="WarrningDelete",
-            click_x=467,
-            click_y=905,
+            click=POINTS["delete_data"],
         )
         self.tap_until(
-            region=(207, 505, 54, 18),
+            region=REGIONS["confirm_delete"],
             image_name="ComfirmDelete",
-            click_x=387,
-            click_y=865,
+            click=POINTS["delete_confirm"],
         )
         self.tap_until(
-            region=(172, 365, 125, 20),
+            region=REGIONS["deleted"],
             image_name="Deleted",
-            click_x=457,
-            click_y=635,
+            click=POINTS["delete_ok"],
         )
-        self.adb_tap(277, 635)
+        self.adb_tap(*POINTS["delete_done"])
         self.reset()
 
+    def recycle_account(self):
+        """
+        回收完成的账户, wipe 模式失败后本次运行改用游戏内删除
+        """
+        if self.recycle_mode == RECYCLE_WIPE:
+            if self.wipe_account():
+                return
+            self.logger.warning("Account wipe not verified, falling back to UI delete")
+            self.recycle_mode = RECYCLE_UI
+            # 账户文件可能已删除, 由 register 按画面处理
+            self.reset()
+            return
+        self.delete_account()
+
+    @timed("wipe_account")
+    def wipe_account(self):
+        """
+        停止游戏后删除账户文件, 重新启动并确认进入选择地区画面
+        删除前确认账户文件存在, 重启后确认不是原来的账户
+        """
+        wiped_md5 = self.account_data_md5()
+        if not wiped_md5:
+            self.logger.warning("No account data to wipe")
+            return False
+        self.stop_game()
+        output = self.adb_device.shell(WIPE_COMMAND)
+        if "WIPED" not in output:
+            self.logger.warning("Failed to remove account data: %s", output.strip())
+            self.launch_game()
+            return False
+        self.launch_game()
+        deadline = time.time() + WIPE_VERIFY_SECOND
+        while not self.screen_search(
+            image_path=self.get_image_path("Region"),
+            region=REGIONS["region_select"],
+        ):
+            if self.stop_event.is_set():
+                raise RerollStoppedException(f"Instance {self.adb_port} stopped")
+            if time.time() >= deadline:
+                self.logger.warning("Region select not shown after wipe")
+                return False
+            self.adb_tap(*POINTS["title"])
+        if self.account_data_md5() == wiped_md5:
+            self.logger.warning("Account data restored after wipe")
+            return False
+        self.record_event("account_wiped", packs=self.current_pack)
+        self.reset()
+        return True
+
     def do_extra_wonder_pick(self):
         self.tap_until(
-            region=(228, 676, 270, 697),
+            region=REGIONS["extra_wp_confirm"],
             image_name="WPComfirm",
-            click_x=240,
-            click_y=635,
+            click=POINTS["extra_wp_select"],
         )
         self.tap_until(
-            region=(63, 320, 134, 389),
+            region=REGIONS["wp_card_back"],
             image_name="WPCardBack",
-            click_x=385,
-            click_y=821,
+            click=POINTS["wp_pick"],
         )
         time.sleep(2) #wait for sneak peek event showup
         if self.screen_search(
             image_path=self.get_image_path(image_name="SneakOne"),
-            region=(213, 101, 244, 127),
+            region=REGIONS["sneak_one"],
         ):
             self.tap_until(
-                region=(226, 319, 310, 395),
+                region=REGIONS["sneak_tool"],
                 image_name="SneakTool",
-                click_x=270,
-                click_y=350,
+                click=POINTS["wp_card"],
             )
             self.tap_until(
-                region=(179, 122, 31, 21),
+                region=REGIONS["choose"],
                 image_name="Choose",
-                click_x=275,
-                click_y=861,
+                click=POINTS["sneak_choose"],
             )
             
         self.tap_until(
-            region=(99, 72, 68, 68),
+            region=REGIONS["get"],
             image_name="Get",
-            click_x=270,
-            click_y=350,
+            click=POINTS["wp_card"],
         )
         self.tap_until(
-            region=(240, 51, 50, 50),
+            region=REGIONS["dex"],
             image_name="Dex",
-            click_x=522,
-            click_y=889,
+            click=POINTS["next"],
             delay_ms=110,
             skip_time_ms=8,
         )
         self.tap_until(
-            region=(217, 33, 323, 72),
+            region=REGIONS["wonder_pick"],
             image_name="WonderPick",
-            click_x=279,
-            click_y=880,
+            click=POINTS["wp_back"],
         )
         self.tap_until(
-            region=(120, 681, 49, 29),
+            region=REGIONS["wonder_icon"],
             image_name="WonderIcon",
-            click_x=271,
-            click_y=837,
+            click=POINTS["wp_home"],
         )
         #get two hourglass from mission
         self.tap_until(
-            region=(181, 416, 324, 443),
+            region=REGIONS["wp_reward"],
             image_name="WPReward",
-            click_x=483,
-            click_y=837,
+            click=POINTS["mission"],
         )
         self.tap_until(
-            region=(231, 715, 302, 747),
+            region=REGIONS["accomplish"],
             image_name="Accomplish",
-            click_x=280,
-            click_y=493,
+            click=POINTS["mission_reward"],
         )
         self.tap_until(
-            region=(168, 417, 248, 515),
+            region=REGIONS["mission_hourglass"],
             image_name="MissionCompleteHourglass",
-            click_x=267,
-            click_y=731,
+            click=POINTS["mission_complete"],
         )
         self.tap_until(
-            region=(237, 873, 301, 937),
+            region=REGIONS["mission_close"],
             image_name="Close",
-            click_x=268,
-            click_y=621,
+            click=POINTS["mission_hourglass"],
         )
         self.tap_until(
-            region=(120, 681, 169, 710),
+            region=REGIONS["wonder_icon_wide"],
             image_name="WonderIcon",
-            click_x=273,
-            click_y=905,
+            click=POINTS["mission_close"],
         )
 
     def reroll(self):
-        while True:
+        while not self.stop_event.is_set():
             try:
+                if self.pause_requested.is_set() and self.state in SAFE_PAUSE_STATES:
+                    self.wait_while_paused()
+                    continue
                 if self.state == RerollState.INIT:
                     self.error_check()
                     self.register()
@@ -1479,6 +2067,8 @@ class Reroll:
                     self.pass_tutorial()
                 elif self.state == RerollState.FINISHED_TUTORIAL:
                     self.do_extra_wonder_pick()
+                    self.state = RerollState.AUTOFRIEND
+                elif self.state == RerollState.AUTOFRIEND:
                     self.add_friends()
                     if self.max_packs_to_open > 1:
                         self.open_234_pack()
@@ -1487,31 +2077,199 @@ class Reroll:
                 elif self.state == RerollState.COMPLETED:
                     # self.auto_unfriend_all()
                     # backup account
-                    self.delete_account()
+                    self.recycle_account()
                 elif self.state == RerollState.FOUNDGP:
                     self.change_tag()
-                    self.backup_account()
+                    self.backup_account(valid=True)
                 elif self.state == RerollState.FOUNDINVALID:
                     self.auto_unfriend_all()
                     self.backup_account()
                 elif self.state == RerollState.BREAKDOWN:
-                    LOGGER.error(self.format_log("Breakdown"))
+                    self.logger.error("Breakdown")
                     break
                 else:
-                    LOGGER.error(self.format_log("Invalid reroll state"))
+                    self.logger.error("Invalid reroll state")
                     break
+            except RerollStoppedException:
+                break
+            except RerollBreakdownException:
+                raise
             except RerollStuckException as e:
-                LOGGER.error(self.format_log(f"Reroll stuck: {e}"))
-                self.restart_game_instance()
+                self.logger.error("Reroll stuck: %s", e)
+                self.record_event("stuck", state=self.state.name, reason=str(e))
+                self.restart_game_instance(reason=str(e))
             except Exception as e:
-                LOGGER.error(self.format_log(f"Error: {e}"))
+                self.logger.error("Error: %s", e)
                 break
 
+    def account_data_md5(self):
+        """
+        账户数据文件的 md5, 文件不存在时返回 None
+        """
+        output = self.adb_device.shell(ACCOUNT_MD5_COMMAND).strip()
+        match = MD5_PATTERN.match(output)
+        return match.group(0) if match else None
+
+    def has_account_data(self):
+        """
+        检查设备上是否存在账户数据文件
+        """
+        result = self.adb_device.shell(f"su -c 'ls {ACCOUNT_DATA_PATH}'")
+        return "No such file or directory" not in result
+
+    def resume(self):
+        """
+        从存档恢复进度, 并与当前画面核对
+        """
+        checkpoint = self.checkpoint.load()
+        if not checkpoint:
+            return
+        try:
+            state = RerollState[checkpoint["state"]]
+        except KeyError:
+            self.logger.warning("Invalid checkpoint: %s", checkpoint)
+            self.checkpoint.clear()
+            return
+        self.total_pack = checkpoint.get("total_pack", 0)
+        self.current_pack = checkpoint.get("current_pack", 0)
+        self.temp_account_name = checkpoint.get(
+            "temp_account_name", self.account_name
+        )
+        self.wp_checked = checkpoint.get("wp_checked", False)
+        self.found_pack = checkpoint.get("found_pack")
+        self.committed_staged_md5 = checkpoint.get("staged_md5")
+        self.logger.info("Found checkpoint: %s", checkpoint)
+
+        if state in (
+            RerollState.INIT,
+            RerollState.RESET,
+            RerollState.RESTART,
+            RerollState.BREAKDOWN,
+        ):
+            self.current_pack = 0
+            self.found_pack = None
+            return
+        if not self.has_account_data():
+            self.logger.warning("No account data for checkpoint state %s", state.name)
+            self.current_pack = 0
+            self.found_pack = None
+            return
+
+        if state in (
+            RerollState.FOUNDGP,
+            RerollState.FOUNDINVALID,
+            RerollState.COMPLETED,
+        ):
+            # 账户已有结果, 不能删除重来, 卡住时重启游戏后继续处理
+            self.state = state
+        elif self.current_pack > 1 and self.screen_search(
+            image_path=self.get_image_path("Result"),
+            region=REGIONS["result"],
+        ):
+            # 开包结果仍在屏幕上, 先检查是否为神包
+            self.state = state
+            self.check_pack_result(self.current_pack)
+            if self.state not in (RerollState.FOUNDGP, RerollState.FOUNDINVALID):
+                self.state = RerollState.RESTART
+        elif state in RESUME_SCREENS and self.current_pack <= 1 and self.on_resume_screen(state):
+            self.state = state
+        else:
+            # 开包途中或画面与状态不符, 无法确认进度, 按重启处理, 由 register 删除旧账号
+            self.state = RerollState.RESTART
+        self.logger.warning("Resumed from checkpoint as %s", self.state.name)
+
+    def on_resume_screen(self, state):
+        """
+        当前画面是否为 state 的处理流程开始的画面, 启用导航时先尝试返回该画面
+        """
+        screens = RESUME_SCREENS[state]
+        for image_name, region in screens:
+            if self.screen_search(self.get_image_path(image_name), region):
+                return True
+        if self.navigator:
+            image_name, region = screens[0]
+            return self.navigate_to(image_name, region)
+        return False
+
     def start(self):
-        self.reroll()
+        self.started_at = time.time()
+        self.account_started_at = self.started_at
+        if self.checkpoint:
+            try:
+                self.resume()
+            except Exception as e:
+                self.logger.error("Failed to resume from checkpoint: %s", e)
+        self.session_start_pack = self.total_pack
+        if self.watchdog:
+            self.watchdog.reset()
+        register_worker(self.adb_port)
+        try:
+            self.reroll()
+        except RerollBreakdownException as e:
+            self.logger.error("Breakdown: %s", e)
+            self.record_event("breakdown", state=self.state.name, reason=str(e))
+            self.state = RerollState.BREAKDOWN
+        finally:
+            self.finished = True
+            unregister_worker()
+
+    def stop(self):
+        """
+        在下一次等待画面时停止
+        """
+        self.stop_event.set()
+        self.resume_event.set()
+
+    def pause(self):
+        """
+        在下一个账户开始前暂停
+        """
+        self.resume_event.clear()
+        self.pause_requested.set()
+
+    def unpause(self):
+        self.pause_requested.clear()
+        self.resume_event.set()
+
+    def wait_while_paused(self):
+        """
+        关闭游戏释放主机资源, 恢复后重新启动
+        """
+        self.paused_at = time.time()
+        self.record_event("paused", state=self.state.name)
+        self.logger.warning("Paused by scheduler")
+        self.stop_game()
+        while self.pause_requested.is_set() and not self.stop_event.is_set():
+            self.resume_event.wait(1)
+        paused_seconds = time.time() - self.paused_at
+        self.paused_at = None
+        # 暂停时间不计入账户周期
+        self.account_started_at += paused_seconds
+        if self.stop_event.is_set():
+            return
+        self.launch_game()
+        if self.watchdog:
+            self.watchdog.reset()
+        self.record_event("resumed", state=self.state.name, duration=paused_seconds)
+        self.logger.warning("Resumed by scheduler")
 
     def status(self):
+        now = time.time()
         return {
             "port": self.adb_port,
             "total_pack": self.total_pack,
+            "session_pack": self.total_pack - self.session_start_pack,
+            "state": self.state.name,
+            "state_seconds": now - self.state_since,
+            "running_seconds": now - self.started_at,
+            "accounts": self.account_count,
+            "avg_cycle_seconds": (
+                self.cycle_seconds / self.account_count if self.account_count else None
+            ),
+            "restarts": self.restart_count,
+            "last_launch_seconds": self.last_launch_seconds,
+            "paused": self.paused_at is not None,
+            "stalled_seconds": (
+                self.watchdog.stalled_seconds() if self.watchdog else None
+            ),
         }
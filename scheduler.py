@@ -0,0 +1,217 @@
+import logging
+import os
+from metrics import STEP_LATENCY
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+LOGGER = logging.getLogger("Scheduler")
+
+DEFAULT_INTERVAL_SECOND = 30
+DEFAULT_CPU_HIGH_PERCENT = 90
+DEFAULT_CPU_LOW_PERCENT = 70
+DEFAULT_MIN_MEMORY_PERCENT = 10
+# 1 分钟平均负载除以 CPU 核数
+DEFAULT_MAX_LOAD_PER_CPU = 1.5
+# 截图耗时相对基线的倍数
+DEFAULT_MAX_LATENCY_INFLATION = 2.0
+DEFAULT_OK_LATENCY_INFLATION = 1.3
+# 调整后至少等待的检查次数
+ADJUST_COOLDOWN_TICKS = 2
+# 基线取最近窗口中的最小值
+BASELINE_WINDOW = 20
+# 估计截图耗时所需的最少样本
+MIN_CAPTURE_SAMPLES = 5
+PROBE_STEP = "capture"
+
+
+class HostMonitor:
+    """
+    读取主机 CPU, 负载与可用内存, 优先使用 psutil, 否则读取 /proc
+    """
+
+    def __init__(self):
+        self.last_cpu_times = None
+        if psutil:
+            psutil.cpu_percent(None)
+
+    def cpu_percent(self):
+        if psutil:
+            return psutil.cpu_percent(None)
+        try:
+            with open("/proc/stat", "r") as f:
+                values = [int(value) for value in f.readline().split()[1:]]
+        except OSError:
+            return None
+        # idle + iowait
+        idle = values[3] + (values[4] if len(values) > 4 else 0)
+        total = sum(values)
+        last, self.last_cpu_times = self.last_cpu_times, (idle, total)
+        if not last or total == last[1]:
+            return None
+        return 100 * (1 - (idle - last[0]) / (total - last[1]))
+
+    def load_per_cpu(self):
+        try:
+            return os.getloadavg()[0] / (os.cpu_count() or 1)
+        except (AttributeError, OSError):
+            return None
+
+    def memory_available_percent(self):
+        if psutil:
+            memory = psutil.virtual_memory()
+            return memory.available * 100 / memory.total
+        try:
+            with open("/proc/meminfo", "r") as f:
+                meminfo = {
+                    line.split(":")[0]: int(line.split()[1]) for line in f if ":" in line
+                }
+            return meminfo["MemAvailable"] * 100 / meminfo["MemTotal"]
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def sample(self):
+        return {
+            "cpu_percent": self.cpu_percent(),
+            "load_per_cpu": self.load_per_cpu(),
+            "memory_available_percent": self.memory_available_percent(),
+        }
+
+
+class AdmissionScheduler:
+    """
+    按主机负载与截图耗时的膨胀调整同时运行的设备数
+    只在账户之间暂停设备, 暂停时关闭游戏
+    """
+
+    def __init__(
+        self,
+        workers,
+        max_active=None,
+        min_active=1,
+        initial_active=None,
+        interval=DEFAULT_INTERVAL_SECOND,
+        cpu_high=DEFAULT_CPU_HIGH_PERCENT,
+        cpu_low=DEFAULT_CPU_LOW_PERCENT,
+        min_memory_percent=DEFAULT_MIN_MEMORY_PERCENT,
+        max_load_per_cpu=DEFAULT_MAX_LOAD_PER_CPU,
+        max_latency_inflation=DEFAULT_MAX_LATENCY_INFLATION,
+        ok_latency_inflation=DEFAULT_OK_LATENCY_INFLATION,
+    ):
+        self.workers = list(workers)
+        self.max_active = min(max_active or len(self.workers), len(self.workers))
+        self.min_active = max(1, min(min_active, self.max_active))
+        self.target = max(self.min_active, min(initial_active or self.max_active, self.max_active))
+        self.interval = interval
+        self.cpu_high = cpu_high
+        self.cpu_low = cpu_low
+        self.min_memory_percent = min_memory_percent
+        self.max_load_per_cpu = max_load_per_cpu
+        self.max_latency_inflation = max_latency_inflation
+        self.ok_latency_inflation = ok_latency_inflation
+        self.monitor = HostMonitor()
+        self.cooldown = 0
+        # 端口 -> (总耗时, 次数)
+        self.last_capture = {}
+        # 端口 -> 最近的平均截图耗时
+        self.capture_history = {}
+        self.last_sample = {}
+
+    def latency_inflation(self):
+        """
+        每台运行中设备最近一段时间的截图耗时与其基线之比
+        """
+        totals = {}
+        for (device, step, _), series in STEP_LATENCY.snapshot().items():
+            if step == PROBE_STEP:
+                total, count = totals.get(device, (0, 0))
+                totals[device] = (total + series[-2], count + series[-1])
+        inflation = {}
+        for device, (total, count) in totals.items():
+            last_total, last_count = self.last_capture.get(device, (0, 0))
+            self.last_capture[device] = (total, count)
+            if count - last_count < MIN_CAPTURE_SAMPLES:
+                continue
+            mean = (total - last_total) / (count - last_count)
+            history = self.capture_history.setdefault(device, [])
+            history.append(mean)
+            del history[:-BASELINE_WINDOW]
+            baseline = min(history)
+            if baseline > 0:
+                inflation[device] = mean / baseline
+        return inflation
+
+    def decide(self, sample, inflation):
+        """
+        返回新的目标运行数
+        """
+        worst_inflation = max(inflation.values(), default=None)
+        cpu = sample["cpu_percent"]
+        memory = sample["memory_available_percent"]
+        load = sample["load_per_cpu"]
+        overloaded = (
+            (cpu is not None and cpu >= self.cpu_high)
+            or (memory is not None and memory < self.min_memory_percent)
+            or (load is not None and load >= self.max_load_per_cpu)
+            or (worst_inflation is not None and worst_inflation >= self.max_latency_inflation)
+        )
+        underloaded = (
+            (cpu is None or cpu <= self.cpu_low)
+            and (memory is None or memory >= self.min_memory_percent * 2)
+            and (load is None or load < self.max_load_per_cpu * 2 / 3)
+            and (worst_inflation is None or worst_inflation <= self.ok_latency_inflation)
+        )
+        if self.cooldown > 0:
+            self.cooldown -= 1
+            return self.target
+        if overloaded and self.target > self.min_active:
+            self.cooldown = ADJUST_COOLDOWN_TICKS
+            return self.target - 1
+        if underloaded and self.target < self.max_active:
+            self.cooldown = ADJUST_COOLDOWN_TICKS
+            return self.target + 1
+        return self.target
+
+    def apply(self, inflation):
+        """
+        暂停或恢复设备以接近目标运行数
+        """
+        # 已退出的设备不再占用名额
+        live = [worker for worker in self.workers if not worker.finished]
+        active = [worker for worker in live if not worker.pause_requested.is_set()]
+        paused = [worker for worker in live if worker.pause_requested.is_set()]
+        if len(active) > self.target:
+            # 先暂停截图耗时膨胀最严重的设备
+            active.sort(key=lambda worker: inflation.get(worker.adb_port, 1), reverse=True)
+            for worker in active[: len(active) - self.target]:
+                LOGGER.warning(f"Pausing {worker.adb_port} at the next account boundary")
+                worker.pause()
+        elif len(active) < self.target:
+            paused.sort(key=lambda worker: worker.paused_at or 0)
+            for worker in paused[: self.target - len(active)]:
+                LOGGER.warning(f"Resuming {worker.adb_port}")
+                worker.unpause()
+
+    def tick(self):
+        sample = self.monitor.sample()
+        inflation = self.latency_inflation()
+        target = self.decide(sample, inflation)
+        if target != self.target:
+            LOGGER.warning(
+                f"Adjusting active devices {self.target} -> {target} "
+                f"(cpu {sample['cpu_percent']}, memory {sample['memory_available_percent']}, "
+                f"inflation {max(inflation.values(), default=None)})"
+            )
+            self.target = target
+        self.last_sample = dict(sample, target=self.target, inflation=inflation)
+        self.apply(inflation)
+
+    def run(self, stop_event):
+        self.apply({})
+        while not stop_event.wait(self.interval):
+            try:
+                self.tick()
+            except Exception as e:
+                LOGGER.error(f"Scheduler error: {e}")
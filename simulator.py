@@ -0,0 +1,527 @@
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from adbutils import AdbError
+from PIL import Image
+from layout import detect_resolution
+from metrics import STEP_LATENCY
+from templatepack import collect_template_regions
+
+LOGGER = logging.getLogger("Simulator")
+
+DEFAULT_RECORDING_DIR = os.path.join(os.curdir, "recordings")
+DEFAULT_RESOLUTION = (540, 960)
+DEFAULT_BACKGROUND = (24, 24, 24)
+# 各类 adb 调用的模拟耗时(毫秒)
+DEFAULT_LATENCY_MS = {
+    "click": 15,
+    "swipe": 20,
+    "shell": 30,
+    "keyevent": 15,
+    "screenshot": 60,
+    "exec": 40,
+    "pull": 40,
+    "app_start": 1500,
+    "app_stop": 200,
+}
+LATENCY_JITTER = 0.2
+RETURN_SCREEN = "$return"
+ACCOUNT_FILE_PATTERN = re.compile(r"deviceAccount:\.xml")
+SIMULATED_PID = 4242
+SIMULATED_FOCUS = "jp.pokemon.pokemontcgp/com.unity3d.player.UnityPlayerActivity"
+
+
+class ScreenGraph:
+    """
+    录制的画面状态图, 从 screens.json 读取
+
+    {
+      "resolution": [540, 960],
+      "start": "title",
+      "home": "home",
+      "latency_ms": {"screenshot": 80},
+      "screens": {
+        "title": {
+          "frame": "title.png",
+          "templates": ["Error", {"name": "App", "at": [0, 0]}],
+          "account": false,
+          "transitions": [
+            {"on": "click", "area": [0, 0, 540, 960], "to": "menu", "after_ms": 500},
+            {"on": "swipe", "to": "opened"},
+            {"on": "time", "after_ms": 3000, "to": "menu"}
+          ]
+        }
+      },
+      "faults": {
+        "error_dialog": {"screen": "error", "probability": 0.002}
+      }
+    }
+
+    frame 为录制的截图, templates 为叠加在画面上的模板, 未指定位置时使用
+    reroll.py 中的搜索区域. 故障画面中 to 为 "$return" 时回到被打断的画面
+    """
+
+    def __init__(self, path, language="Chinese", res_dir=os.path.join(os.curdir, "res")):
+        self.path = path
+        self.base_dir = os.path.dirname(os.path.abspath(path))
+        with open(path, "r", encoding="utf-8") as f:
+            self.graph = json.load(f)
+        self.resolution = tuple(self.graph.get("resolution", DEFAULT_RESOLUTION))
+        self.start = self.graph["start"]
+        self.home = self.graph.get("home")
+        self.screens = self.graph["screens"]
+        self.faults = self.graph.get("faults", {})
+        self.latency_ms = dict(DEFAULT_LATENCY_MS, **self.graph.get("latency_ms", {}))
+        self.template_dir = os.path.join(res_dir, language)
+        self.template_regions = None
+        self.lock = threading.Lock()
+        self.frames = {}
+        for name, screen in self.screens.items():
+            for transition in screen.get("transitions", []):
+                target = transition.get("to")
+                if target not in self.screens and target != RETURN_SCREEN:
+                    raise ValueError(f"Screen {name} has unknown target {target}")
+
+    def frame(self, name):
+        """
+        画面截图, 首次使用时生成并缓存
+        """
+        with self.lock:
+            frame = self.frames.get(name)
+            if frame is None:
+                # 应用未运行且没有桌面画面时返回空白画面
+                screen = self.screens[name] if name is not None else {}
+                frame = self.compose(screen)
+                self.frames[name] = frame
+            return frame
+
+    def compose(self, screen):
+        if screen.get("frame"):
+            frame = Image.open(os.path.join(self.base_dir, screen["frame"])).convert("RGB")
+        else:
+            frame = Image.new("RGB", self.resolution, DEFAULT_BACKGROUND)
+        for template in screen.get("templates", []):
+            if isinstance(template, str):
+                template = {"name": template}
+            image = Image.open(
+                os.path.join(self.template_dir, f"{template['name']}.png")
+            ).convert("RGB")
+            frame.paste(image, tuple(template.get("at") or self.default_position(template["name"])))
+        return frame
+
+    def default_position(self, name):
+        if self.template_regions is None:
+            self.template_regions = collect_template_regions()
+        for region in self.template_regions.get(name, []):
+            if region:
+                return region[0], region[1]
+        return 0, 0
+
+
+class SimulatedConnection:
+    """
+    open_transport 返回的连接, 只支持 exec 服务
+    """
+
+    def __init__(self, device):
+        self.device = device
+        self.output = b""
+
+    def send_command(self, command):
+        if not command.startswith("exec:"):
+            raise AdbError(f"Unsupported transport command {command}")
+        self.output = self.device.exec_out(command[len("exec:"):])
+
+    def check_okay(self):
+        pass
+
+    def read_until_close(self, encoding=None):
+        return self.output.decode(encoding) if encoding else self.output
+
+    def close(self):
+        pass
+
+
+class SimulatedSync:
+    def __init__(self, device):
+        self.device = device
+
+    def pull(self, src, dst):
+        self.device.wait("pull")
+        content = self.device.files.get(src)
+        if content is None:
+            raise FileNotFoundError(src)
+        with open(dst, "wb") as f:
+            f.write(content)
+        return len(content)
+
+
+class SimulatedDevice:
+    """
+    代替 AdbDevice, 按状态图回放画面并模拟各操作的耗时与故障
+    """
+
+    def __init__(self, graph, serial="127.0.0.1:5555", latency_scale=1.0, fault_scale=1.0, seed=None):
+        self.graph = graph
+        self.serial = serial
+        self.latency_scale = latency_scale
+        self.fault_scale = fault_scale
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.screen = graph.start
+        self.entered_at = time.time()
+        # (目标画面, 生效时间)
+        self.pending = None
+        # 故障结束后返回的画面
+        self.return_screen = None
+        self.running = True
+        self.files = {}
+        self.account_seq = 0
+        self.sync = SimulatedSync(self)
+        self.calls = {}
+
+    def get_serialno(self):
+        return self.serial
+
+    def get_state(self):
+        return "device"
+
+    def wait(self, action):
+        self.calls[action] = self.calls.get(action, 0) + 1
+        latency = self.graph.latency_ms.get(action, 0) * self.latency_scale
+        if latency > 0:
+            time.sleep(
+                latency
+                * self.random.uniform(1 - LATENCY_JITTER, 1 + LATENCY_JITTER)
+                / 1000
+            )
+
+    def current_screen(self):
+        """
+        处理到期的切换, 定时切换和故障注入
+        """
+        with self.lock:
+            now = time.time()
+            if self.pending and now >= self.pending[1]:
+                self.enter(self.pending[0], self.pending[1])
+            if not self.running:
+                return self.graph.home
+            for transition in self.transitions("time"):
+                if now - self.entered_at >= transition.get("after_ms", 0) / 1000:
+                    self.enter(transition["to"], now)
+                    break
+            if self.return_screen is None and self.pending is None:
+                for fault in self.graph.faults.values():
+                    if self.random.random() < fault.get("probability", 0) * self.fault_scale:
+                        LOGGER.info(f"[{self.serial}] Injected fault {fault['screen']}")
+                        self.return_screen = self.screen
+                        self.enter(fault["screen"], now)
+                        break
+            return self.screen
+
+    def enter(self, target, at):
+        if target == RETURN_SCREEN:
+            target, self.return_screen = self.return_screen or self.graph.start, None
+        self.screen = target
+        self.entered_at = at
+        self.pending = None
+        if self.graph.screens[target].get("account"):
+            self.account_seq += 1
+            self.files[self.account_path()] = (
+                f"<map><string name=\"account\">{self.serial}-{self.account_seq}</string></map>"
+            ).encode("utf-8")
+
+    def transitions(self, action):
+        screen = self.graph.screens.get(self.screen, {})
+        return [
+            transition
+            for transition in screen.get("transitions", [])
+            if transition.get("on") == action
+        ]
+
+    def trigger(self, action, x=None, y=None):
+        with self.lock:
+            if not self.running or self.pending:
+                return
+            for transition in self.transitions(action):
+                area = transition.get("area")
+                if area and x is not None:
+                    left, top, width, height = area
+                    if not (left <= x < left + width and top <= y < top + height):
+                        continue
+                self.pending = (
+                    transition["to"],
+                    time.time() + transition.get("after_ms", 0) / 1000,
+                )
+                return
+
+    def click(self, x, y):
+        self.wait("click")
+        self.trigger("click", x, y)
+
+    def swipe(self, x1, y1, x2, y2, duration=0.5):
+        self.wait("swipe")
+        time.sleep(duration)
+        self.trigger("swipe", x1, y1)
+
+    def keyevent(self, key_code):
+        self.wait("keyevent")
+        self.trigger("keyevent")
+
+    def screenshot(self):
+        self.wait("screenshot")
+        return self.graph.frame(self.current_screen()).copy()
+
+    def app_stop(self, package):
+        self.wait("app_stop")
+        with self.lock:
+            self.running = False
+            self.pending = None
+            self.return_screen = None
+
+    def app_start(self, package, activity=None):
+        self.wait("app_start")
+        with self.lock:
+            self.running = True
+            self.enter(self.graph.start, time.time())
+
+    def shell(self, command):
+        self.wait("shell")
+        if isinstance(command, (list, tuple)):
+            command = " ".join(command)
+        if command.startswith("input text"):
+            self.trigger("input")
+            return ""
+        if command.startswith("wm size"):
+            width, height = self.graph.resolution
+            return f"Physical size: {width}x{height}\n"
+        if command.startswith("pidof"):
+            return f"{SIMULATED_PID}\n" if self.running else ""
+        if command.startswith("dumpsys window"):
+            if not self.running:
+                return ""
+            return f"  mCurrentFocus=Window{{0 u0 {SIMULATED_FOCUS}}}\n"
+        if "rm -f" in command and ACCOUNT_FILE_PATTERN.search(command):
+            self.files.pop(self.account_path(), None)
+            return "WIPED\n"
+        if "md5sum" in command and ACCOUNT_FILE_PATTERN.search(command):
+            content = self.files.get(self.account_path())
+            if content is None:
+                return f"md5sum: {self.account_path()}: No such file or directory"
+            return f"{hashlib.md5(content).hexdigest()}  {self.account_path()}\n"
+        if " ls " in f" {command} " and ACCOUNT_FILE_PATTERN.search(command):
+            if self.account_path() in self.files:
+                return self.account_path()
+            return f"ls: {self.account_path()}: No such file or directory"
+        return ""
+
+    def exec_out(self, command):
+        """
+        模拟 reroll.py 的账户备份命令, 其他命令视为不支持
+        """
+        from reroll import ACCOUNT_DATA_PATH, ACCOUNT_STAGED_PATH, BACKUP_RETRY_COMMAND
+
+        self.wait("exec")
+        if command == BACKUP_RETRY_COMMAND:
+            content = self.files.get(ACCOUNT_STAGED_PATH, b"")
+        elif f"mv {ACCOUNT_DATA_PATH} {ACCOUNT_STAGED_PATH}" in command:
+            content = self.files.pop(ACCOUNT_DATA_PATH, None)
+            if content is None:
+                return b"MISSING\n"
+            self.files[ACCOUNT_STAGED_PATH] = content
+        else:
+            raise AdbError(f"Unsupported exec command {command}")
+        return (
+            f"{hashlib.md5(content).hexdigest()}  {ACCOUNT_STAGED_PATH}\n".encode("ascii")
+            + content
+        )
+
+    def open_transport(self, command=None, timeout=None):
+        self.wait("exec")
+        return SimulatedConnection(self)
+
+    def account_path(self):
+        return "/data/data/jp.pokemon.pokemontcgp/shared_prefs/deviceAccount:.xml"
+
+
+def run_simulation(graph, devices=1, minutes=10, latency_scale=1.0, fault_scale=1.0, seed=None, **reroll_kwargs):
+    """
+    在模拟设备上运行真实的 Reroll 流程, 返回吞吐量与耗时报告
+    """
+    from friendseeker import FriendSeeker
+    from reroll import Reroll
+
+    friend_codes_path = os.path.join(os.curdir, "data", "simulator_friend_codes.json")
+    os.makedirs(os.path.dirname(friend_codes_path), exist_ok=True)
+    with open(friend_codes_path, "w") as f:
+        json.dump([], f)
+    friend_seeker = FriendSeeker(local_path=friend_codes_path, remote=False, local=True)
+
+    workers = []
+    for index in range(devices):
+        device = SimulatedDevice(
+            graph,
+            serial=f"127.0.0.1:{5555 + index * 2}",
+            latency_scale=latency_scale,
+            fault_scale=fault_scale,
+            seed=None if seed is None else seed + index,
+        )
+        workers.append(
+            Reroll(
+                adb_device=device,
+                friend_code_seeker=friend_seeker,
+                discord_msg=None,
+                resolution=detect_resolution(device),
+                **reroll_kwargs,
+            )
+        )
+
+    cpu_seconds = {}
+
+    def run_worker(worker):
+        try:
+            worker.start()
+        finally:
+            cpu_seconds[worker.adb_port] = time.thread_time()
+
+    started_at = time.time()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=devices) as executor:
+        futures = [executor.submit(run_worker, worker) for worker in workers]
+        done, _ = concurrent.futures.wait(futures, timeout=minutes * 60)
+        for worker in workers:
+            worker.stop()
+    elapsed = time.time() - started_at
+    return build_report(workers, cpu_seconds, elapsed)
+
+
+def build_report(workers, cpu_seconds, elapsed):
+    hours = elapsed / 3600
+    ports = {worker.adb_port for worker in workers}
+    report = {
+        "elapsed_seconds": elapsed,
+        "packs": sum(worker.total_pack for worker in workers),
+        "packs_per_hour": sum(worker.total_pack for worker in workers) / hours if hours else 0,
+        "devices": [],
+        "steps": {},
+    }
+    for worker in workers:
+        cpu = cpu_seconds.get(worker.adb_port, 0)
+        report["devices"].append(
+            {
+                "port": worker.adb_port,
+                "packs": worker.total_pack,
+                "packs_per_hour": worker.total_pack / hours if hours else 0,
+                "accounts": worker.account_count,
+                "restarts": worker.restart_count,
+                "cpu_seconds": cpu,
+                "cpu_percent": 100 * cpu / elapsed if elapsed else 0,
+                "calls": dict(worker.adb_device.calls),
+            }
+        )
+    steps = {}
+    for (device, step, image), series in STEP_LATENCY.snapshot().items():
+        if device not in ports:
+            continue
+        key = f"{step}:{image}" if image else step
+        merged = steps.setdefault(key, [0] * len(series))
+        for index, value in enumerate(series):
+            merged[index] += value
+    for key, series in sorted(steps.items()):
+        count = series[-1]
+        report["steps"][key] = {
+            "count": count,
+            "mean_ms": 1000 * series[-2] / count if count else 0,
+            "p95_ms": 1000 * STEP_LATENCY.quantile(series, 0.95),
+        }
+    return report
+
+
+def print_report(report):
+    print(
+        f"{report['packs']} packs in {report['elapsed_seconds'] / 60:.1f} min, "
+        f"{report['packs_per_hour']:.1f} packs/h"
+    )
+    for device in report["devices"]:
+        print(
+            f"  {device['port']}: {device['packs']} packs "
+            f"({device['packs_per_hour']:.1f}/h), {device['accounts']} accounts, "
+            f"{device['restarts']} restarts, cpu {device['cpu_percent']:.1f}%"
+        )
+    print("Step latency (mean / p95 ms):")
+    for key, step in report["steps"].items():
+        print(f"  {key}: {step['count']} x {step['mean_ms']:.1f} / {step['p95_ms']:.0f}")
+
+
+def capture(port, output_dir, name):
+    """
+    从真实模拟器截取当前画面, 加入状态图
+    """
+    from adbutils import adb
+
+    os.makedirs(output_dir, exist_ok=True)
+    device = adb.device(serial=f"127.0.0.1:{port}")
+    device.screenshot().save(os.path.join(output_dir, f"{name}.png"))
+    graph_path = os.path.join(output_dir, "screens.json")
+    try:
+        with open(graph_path, "r", encoding="utf-8") as f:
+            graph = json.load(f)
+    except FileNotFoundError:
+        graph = {"resolution": list(DEFAULT_RESOLUTION), "start": name, "screens": {}}
+    graph["screens"].setdefault(name, {"transitions": []})["frame"] = f"{name}.png"
+    with open(graph_path, "w", encoding="utf-8") as f:
+        json.dump(graph, f, indent=2, ensure_ascii=False)
+    return graph_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run Reroll against simulated devices")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="benchmark the reroll flow offline")
+    run_parser.add_argument("graph", help="path to screens.json")
+    run_parser.add_argument("--devices", type=int, default=1)
+    run_parser.add_argument("--minutes", type=float, default=10)
+    run_parser.add_argument("--pack", default="PALKIA")
+    run_parser.add_argument("--language", default="Chinese")
+    run_parser.add_argument("--delay-ms", type=int, default=300)
+    run_parser.add_argument("--latency-scale", type=float, default=1.0)
+    run_parser.add_argument("--fault-scale", type=float, default=1.0)
+    run_parser.add_argument("--seed", type=int)
+    run_parser.add_argument("--output", help="write the report as json")
+
+    capture_parser = subparsers.add_parser("capture", help="add the current emulator screen to a recording")
+    capture_parser.add_argument("--port", required=True)
+    capture_parser.add_argument("--name", required=True)
+    capture_parser.add_argument("--output", default=os.path.join(DEFAULT_RECORDING_DIR, "default"))
+
+    args = parser.parse_args()
+    if args.command == "run":
+        graph = ScreenGraph(args.graph, language=args.language)
+        report = run_simulation(
+            graph,
+            devices=args.devices,
+            minutes=args.minutes,
+            latency_scale=args.latency_scale,
+            fault_scale=args.fault_scale,
+            seed=args.seed,
+            reroll_pack=args.pack,
+            language=args.language,
+            delay_ms=args.delay_ms,
+        )
+        print_report(report)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(report, f, indent=2)
+    elif args.command == "capture":
+        print(f"Captured {args.name} into {capture(args.port, args.output, args.name)}")
+
+
+if __name__ == "__main__":
+    main()
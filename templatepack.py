@@ -0,0 +1,275 @@
+import argparse
+import ast
+import hashlib
+import json
+import logging
+import os
+import struct
+import time
+import cv2
+import numpy as np
+from layout import REGIONS
+
+LOGGER = logging.getLogger("TemplatePack")
+
+PACK_MAGIC = b"SLVTPL01"
+PACK_VERSION = 1
+# 数组按 64 字节对齐
+PACK_ALIGNMENT = 64
+PYRAMID_LEVELS = 2
+DEFAULT_RES_DIR = os.path.join(os.curdir, "res")
+DEFAULT_PACK_DIR = os.path.join(os.curdir, "data")
+DEFAULT_SOURCE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reroll.py")
+
+
+def pack_path(language, pack_dir=DEFAULT_PACK_DIR):
+    return os.path.join(pack_dir, f"templates_{language}.pack")
+
+
+def template_files(template_dir):
+    return sorted(
+        entry.name
+        for entry in os.scandir(template_dir)
+        if entry.is_file() and entry.name.endswith(".png")
+    )
+
+
+def content_hash(template_dir):
+    """
+    模板文件名与内容的 sha256, res 目录变化后与模板包不一致
+    """
+    sha256 = hashlib.sha256()
+    for filename in template_files(template_dir):
+        sha256.update(filename.encode("utf-8") + b"\0")
+        with open(os.path.join(template_dir, filename), "rb") as f:
+            sha256.update(f.read())
+        sha256.update(b"\0")
+    return sha256.hexdigest()
+
+
+def collect_template_regions(source_path=DEFAULT_SOURCE_PATH):
+    """
+    从 reroll.py 中找出模板名与固定搜索区域的组合
+    """
+    with open(source_path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    regions = {}
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call):
+            continue
+        keywords = {keyword.arg: keyword.value for keyword in node.keywords}
+        name = None
+        image_name = keywords.get("image_name")
+        image_path = keywords.get("image_path")
+        if isinstance(image_name, ast.Constant):
+            name = image_name.value
+        elif (
+            isinstance(image_path, ast.Call)
+            and getattr(image_path.func, "attr", None) == "get_image_path"
+            and image_path.args
+            and isinstance(image_path.args[0], ast.Constant)
+        ):
+            name = image_path.args[0].value
+        if not isinstance(name, str):
+            continue
+        region = None
+        if "region" in keywords:
+            node = keywords["region"]
+            if (
+                isinstance(node, ast.Subscript)
+                and isinstance(node.value, ast.Name)
+                and node.value.id == "REGIONS"
+                and isinstance(node.slice, ast.Constant)
+            ):
+                # layout 中命名的区域
+                region = REGIONS.get(node.slice.value)
+            else:
+                try:
+                    region = tuple(ast.literal_eval(node))
+                except ValueError:
+                    # BORDER_REGIONS 等变量
+                    continue
+        regions.setdefault(name, [])
+        if region not in regions[name]:
+            regions[name].append(region)
+    return regions
+
+
+def _align(offset):
+    return (offset + PACK_ALIGNMENT - 1) // PACK_ALIGNMENT * PACK_ALIGNMENT
+
+
+def build_pack(language, res_dir=DEFAULT_RES_DIR, output=None, source_path=DEFAULT_SOURCE_PATH):
+    """
+    预先解码一种语言的所有模板并写入一个二进制包
+    """
+    template_dir = os.path.join(res_dir, language)
+    output = output or pack_path(language)
+    try:
+        default_regions = collect_template_regions(source_path)
+    except OSError:
+        default_regions = {}
+    arrays = []
+    templates = {}
+    offset = 0
+
+    def add_array(array):
+        nonlocal offset
+        array = np.ascontiguousarray(array)
+        offset = _align(offset)
+        entry = {"offset": offset, "shape": list(array.shape), "dtype": array.dtype.str}
+        arrays.append((offset, array))
+        offset += array.nbytes
+        return entry
+
+    for filename in template_files(template_dir):
+        image = cv2.imread(os.path.join(template_dir, filename), cv2.IMREAD_COLOR)
+        if image is None:
+            LOGGER.warning(f"Skipped unreadable template {filename}")
+            continue
+        color = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        pyramid = []
+        level = gray
+        for _ in range(PYRAMID_LEVELS):
+            if min(level.shape[:2]) < 8:
+                break
+            level = cv2.pyrDown(level)
+            pyramid.append(add_array(level))
+        name = os.path.splitext(filename)[0]
+        templates[name] = {
+            "color": add_array(color),
+            "gray": add_array(gray),
+            "pyramid": pyramid,
+            # 平均颜色与标准差, 用于快速排除
+            "signature": {
+                "mean": [float(v) for v in color.reshape(-1, 3).mean(axis=0)],
+                "std": float(gray.std()),
+            },
+            "regions": default_regions.get(name, []),
+        }
+
+    header = json.dumps(
+        {
+            "version": PACK_VERSION,
+            "language": language,
+            "content_hash": content_hash(template_dir),
+            "built_at": time.time(),
+            "templates": templates,
+        }
+    ).encode("utf-8")
+    data_start = _align(len(PACK_MAGIC) + 4 + len(header))
+    tmp_path = f"{output}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(PACK_MAGIC)
+        f.write(struct.pack("<I", len(header)))
+        f.write(header)
+        for array_offset, array in arrays:
+            f.seek(data_start + array_offset)
+            f.write(array.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, output)
+    return output, len(templates)
+
+
+class TemplatePack:
+    """
+    只读内存映射的模板包, 多个进程共享同一份物理内存
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(len(PACK_MAGIC)) != PACK_MAGIC:
+                raise ValueError(f"{path} is not a template pack")
+            (header_size,) = struct.unpack("<I", f.read(4))
+            self.header = json.loads(f.read(header_size))
+        if self.header.get("version") != PACK_VERSION:
+            raise ValueError(f"Unsupported template pack version in {path}")
+        self.data_start = _align(len(PACK_MAGIC) + 4 + header_size)
+        self.buffer = np.memmap(path, dtype=np.uint8, mode="r")
+        self.templates = self.header["templates"]
+
+    @property
+    def content_hash(self):
+        return self.header["content_hash"]
+
+    def is_fresh(self, template_dir):
+        return self.content_hash == content_hash(template_dir)
+
+    def array(self, entry):
+        dtype = np.dtype(entry["dtype"])
+        count = int(np.prod(entry["shape"]))
+        start = self.data_start + entry["offset"]
+        return np.frombuffer(
+            self.buffer, dtype=dtype, count=count, offset=start
+        ).reshape(entry["shape"])
+
+    def get(self, name, kind="color"):
+        return self.array(self.templates[name][kind])
+
+    def pyramid(self, name):
+        return [self.array(entry) for entry in self.templates[name]["pyramid"]]
+
+    def signature(self, name):
+        return self.templates[name]["signature"]
+
+    def regions(self, name):
+        return [tuple(region) if region else None for region in self.templates[name]["regions"]]
+
+
+def load_pack(language, res_dir=DEFAULT_RES_DIR, path=None):
+    """
+    模板包存在且与 res 目录一致时返回, 否则返回 None
+    """
+    path = path or pack_path(language)
+    if not os.path.exists(path):
+        return None
+    try:
+        pack = TemplatePack(path)
+    except (OSError, ValueError) as e:
+        LOGGER.warning(f"Failed to load template pack {path}: {e}")
+        return None
+    if not pack.is_fresh(os.path.join(res_dir, language)):
+        LOGGER.warning(f"Template pack {path} is stale, run python templatepack.py build")
+        return None
+    return pack
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or inspect template packs")
+    parser.add_argument("--res", default=DEFAULT_RES_DIR)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="compile res/<language> into a pack")
+    build_parser.add_argument("--language", default="Chinese")
+    build_parser.add_argument("--output")
+
+    info_parser = subparsers.add_parser("info", help="show a pack and check it is fresh")
+    info_parser.add_argument("--language", default="Chinese")
+    info_parser.add_argument("--path")
+
+    args = parser.parse_args()
+    if args.command == "build":
+        start = time.perf_counter()
+        output, count = build_pack(args.language, args.res, args.output)
+        print(
+            f"Packed {count} templates into {output} "
+            f"in {(time.perf_counter() - start) * 1000:.0f}ms"
+        )
+    elif args.command == "info":
+        pack = TemplatePack(args.path or pack_path(args.language))
+        fresh = pack.is_fresh(os.path.join(args.res, args.language))
+        print(
+            f"{pack.path}: {len(pack.templates)} templates, "
+            f"{pack.buffer.nbytes / 1024:.0f}KB, "
+            f"hash {pack.content_hash[:12]} ({'fresh' if fresh else 'stale'})"
+        )
+        for name, entry in sorted(pack.templates.items()):
+            regions = ", ".join(str(region) for region in pack.regions(name)) or "-"
+            print(f"  {name} {tuple(entry['color']['shape'])} {regions}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import os
+import pytest
+from backupcatalog import BackupCatalog
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    return BackupCatalog(str(tmp_path / "catalog.sqlite3"))
+
+
+def test_commit_backup_moves_file_and_indexes_it(tmp_path, catalog):
+    tmp_file = tmp_path / "account.xml.tmp"
+    tmp_file.write_bytes(b"<account/>")
+    backup_path = str(tmp_path / "deviceAccount_5555_1700000000.xml")
+    sha256 = catalog.commit_backup(
+        str(tmp_file), backup_path, port="5555", valid=1, star_count=5
+    )
+    assert not tmp_file.exists()
+    assert os.path.exists(backup_path)
+    rows = catalog.query()
+    assert len(rows) == 1
+    assert rows[0]["path"] == backup_path
+    assert rows[0]["sha256"] == sha256
+    assert rows[0]["size"] == len(b"<account/>")
+    assert catalog.query(min_stars=6) == []
+
+
+def test_commit_backup_rolls_back_when_the_move_fails(tmp_path, catalog):
+    tmp_file = tmp_path / "account.xml.tmp"
+    tmp_file.write_bytes(b"<account/>")
+    # 目标目录不存在, os.replace 失败
+    backup_path = str(tmp_path / "missing" / "deviceAccount_5555_1700000000.xml")
+    with pytest.raises(OSError):
+        catalog.commit_backup(str(tmp_file), backup_path, port="5555")
+    assert catalog.query() == []
+    assert not tmp_file.exists()
+
+
+def test_scan_does_not_duplicate_relative_paths(tmp_path, catalog, monkeypatch):
+    backup_dir = tmp_path / "backup"
+    backup_dir.mkdir()
+    (backup_dir / "deviceAccount_5555_1700000000.xml").write_bytes(b"a")
+    (backup_dir / "ABCD_valid.xml").write_bytes(b"a")
+    monkeypatch.chdir(tmp_path)
+    assert catalog.scan("backup") == 2
+    assert catalog.scan("./backup") == 0
+    assert catalog.scan(str(backup_dir)) == 0
+    rows = {os.path.basename(row["path"]): row for row in catalog.query()}
+    assert rows["deviceAccount_5555_1700000000.xml"]["port"] == "5555"
+    assert rows["deviceAccount_5555_1700000000.xml"]["created_at"] == 1700000000
+    assert rows["ABCD_valid.xml"]["valid"] == 1
+    assert len(catalog.duplicates()) == 1
@@ -0,0 +1,36 @@
+from checkpoint import RerollCheckpoint
+
+
+def test_round_trip(tmp_path):
+    checkpoint = RerollCheckpoint("5555", checkpoint_dir=str(tmp_path))
+    data = {
+        "state": "FINISHED_TUTORIAL",
+        "current_pack": 2,
+        "total_pack": 17,
+        "temp_account_name": "SlvGP",
+        "wp_checked": True,
+        "found_pack": None,
+        "staged_md5": "0123456789abcdef0123456789abcdef",
+    }
+    checkpoint.save(data)
+    loaded = checkpoint.load()
+    assert {key: loaded[key] for key in data} == data
+    assert loaded["port"] == "5555"
+    assert "saved_at" in loaded
+    assert [path.name for path in tmp_path.iterdir()] == ["checkpoint_5555.json"]
+
+
+def test_missing_or_corrupt_checkpoint_loads_as_none(tmp_path):
+    checkpoint = RerollCheckpoint("5555", checkpoint_dir=str(tmp_path))
+    assert checkpoint.load() is None
+    (tmp_path / "checkpoint_5555.json").write_text("{not json")
+    assert checkpoint.load() is None
+
+
+def test_clear(tmp_path):
+    checkpoint = RerollCheckpoint("5555", checkpoint_dir=str(tmp_path))
+    checkpoint.save({"state": "REGISTERED"})
+    checkpoint.clear()
+    assert checkpoint.load() is None
+    # 不存在时也可以清除
+    checkpoint.clear()
@@ -0,0 +1,68 @@
+import json
+import time
+from journal import FLUSH_INTERVAL_SECOND, EventJournal, read_events, summarize
+
+
+def test_rotation_keeps_every_event_in_order(tmp_path):
+    path = str(tmp_path / "events.jsonl")
+    journal = EventJournal(path=path, max_bytes=200, backup_count=10)
+    for index in range(40):
+        journal.emit("tick", device="5555", index=index)
+        if index % 10 == 9:
+            # 队列空闲时写盘并检查大小
+            time.sleep(FLUSH_INTERVAL_SECOND * 1.5)
+    journal.close()
+
+    rotated = sorted(p.name for p in tmp_path.iterdir() if p.name != "events.jsonl")
+    assert rotated
+    assert all(name.startswith("events.jsonl.") for name in rotated)
+    assert [record["index"] for record in read_events(path)] == list(range(40))
+
+
+def test_rotation_drops_the_oldest_file(tmp_path):
+    path = tmp_path / "events.jsonl"
+    for index in range(1, 4):
+        (tmp_path / f"events.jsonl.{index}").write_text(
+            json.dumps({"ts": 10 - index, "event": "old"}) + "\n"
+        )
+    path.write_text(json.dumps({"ts": 10, "event": "current"}) + "\n")
+    journal = EventJournal(path=str(path), backup_count=3)
+    journal._rotate()
+    journal.close()
+    assert not path.exists()
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "events.jsonl.1",
+        "events.jsonl.2",
+        "events.jsonl.3",
+    ]
+    assert [record["ts"] for record in read_events(str(path))] == [8, 9, 10]
+
+
+def test_summarize():
+    events = [
+        {"ts": 0, "event": "state_changed", "device": "1", "previous": "INIT", "duration": 30},
+        {"ts": 600, "event": "pack_opened", "device": "1", "pack_num": 2, "duration": 20},
+        {"ts": 1200, "event": "pack_opened", "device": "1", "pack_num": 2, "duration": 40},
+        {"ts": 1800, "event": "pack_opened", "device": "2", "pack_num": 3, "duration": 30},
+        {"ts": 2400, "event": "stuck", "device": "2"},
+        {"ts": 3000, "event": "account_cycle", "device": "1", "duration": 300},
+        {"ts": 3600, "event": "account_cycle", "device": "2", "duration": 500},
+        {"event": "ignored"},
+    ]
+    summary = summarize(events)
+    assert summary["hours"] == 1
+    assert summary["packs"] == 3
+    assert summary["packs_per_hour"] == 3
+    assert summary["device_packs_per_hour"] == {"1": 2, "2": 1}
+    assert summary["pack_duration"] == {2: 30, 3: 30}
+    assert summary["phase_seconds"] == {"INIT": 30}
+    assert summary["accounts"] == 2
+    assert summary["cycle_duration"] == 400
+    assert summary["failure_rates"]["stuck"] == {"per_hour": 1, "per_account": 0.5}
+    assert summary["failure_rates"]["restart"] == {"per_hour": 0, "per_account": 0}
+
+
+def test_summarize_without_events():
+    summary = summarize([])
+    assert summary["hours"] == 0
+    assert summary["packs_per_hour"] == 0
@@ -0,0 +1,48 @@
+from metrics import Counter, Histogram, Registry
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("step_seconds", "Step latency", ("step",), buckets=(0.1, 0.5, 1))
+    for value in (0.05, 0.1, 0.3, 0.7, 2):
+        histogram.observe(value, "tap")
+    series = histogram.snapshot()[("tap",)]
+    # 每个区间的计数, 上界包含在区间内, 超出最大上界的只计入总数
+    assert series[:3] == [2, 1, 1]
+    assert series[-2] == 3.15
+    assert series[-1] == 5
+
+    lines = list(histogram.collect())
+    assert 'step_seconds_bucket{step="tap",le="0.1"} 2' in lines
+    assert 'step_seconds_bucket{step="tap",le="0.5"} 3' in lines
+    assert 'step_seconds_bucket{step="tap",le="1"} 4' in lines
+    assert 'step_seconds_bucket{step="tap",le="+Inf"} 5' in lines
+    assert 'step_seconds_count{step="tap"} 5' in lines
+
+
+def test_histogram_quantile_returns_bucket_bound():
+    histogram = Histogram("step_seconds", "Step latency", buckets=(0.1, 0.5, 1))
+    for value in (0.05, 0.2, 0.3, 0.9):
+        histogram.observe(value)
+    series = histogram.snapshot()[()]
+    assert histogram.quantile(series, 0.25) == 0.1
+    assert histogram.quantile(series, 0.5) == 0.5
+    assert histogram.quantile(series, 1) == 1
+    histogram.observe(5)
+    assert histogram.quantile(histogram.snapshot()[()], 1) == float("inf")
+
+
+def test_exposition_text_format():
+    registry = Registry()
+    counter = registry.register(Counter("steps_total", "Steps", ("device",)))
+    counter.inc("5555")
+    counter.inc("5555", amount=2)
+    registry.register(Histogram("latency_seconds", "Latency", buckets=(1,)))
+    text = registry.exposition()
+    assert text.endswith("\n")
+    lines = text.splitlines()
+    assert lines[:3] == [
+        "# HELP steps_total Steps",
+        "# TYPE steps_total counter",
+        'steps_total{device="5555"} 3',
+    ]
+    assert "# TYPE latency_seconds histogram" in lines
@@ -0,0 +1,82 @@
+import threading
+import pytest
+from scheduler import ADJUST_COOLDOWN_TICKS, AdmissionScheduler
+
+IDLE = {"cpu_percent": 30, "load_per_cpu": 0.2, "memory_available_percent": 60}
+BUSY = {"cpu_percent": 95, "load_per_cpu": 0.2, "memory_available_percent": 60}
+
+
+class FakeWorker:
+    def __init__(self, port):
+        self.adb_port = port
+        self.finished = False
+        self.paused_at = None
+        self.pause_requested = threading.Event()
+
+    def pause(self):
+        self.pause_requested.set()
+
+    def unpause(self):
+        self.pause_requested.clear()
+
+
+@pytest.fixture
+def workers():
+    return [FakeWorker(str(port)) for port in range(5555, 5559)]
+
+
+def test_decide_sheds_when_overloaded(workers):
+    scheduler = AdmissionScheduler(workers, min_active=1, initial_active=3)
+    assert scheduler.decide(BUSY, {}) == 2
+    # 调整后冷却期内保持不变, decide 只返回目标, 由 tick 更新
+    for _ in range(ADJUST_COOLDOWN_TICKS):
+        assert scheduler.decide(BUSY, {}) == 3
+    assert scheduler.decide(BUSY, {}) == 2
+
+
+@pytest.mark.parametrize(
+    "sample, inflation",
+    [
+        (dict(IDLE, memory_available_percent=5), {}),
+        (dict(IDLE, load_per_cpu=2), {}),
+        (IDLE, {"5555": 1.0, "5556": 2.5}),
+    ],
+)
+def test_decide_sheds_on_each_signal(workers, sample, inflation):
+    scheduler = AdmissionScheduler(workers, initial_active=3)
+    assert scheduler.decide(sample, inflation) == 2
+
+
+def test_decide_admits_when_underloaded_up_to_max(workers):
+    scheduler = AdmissionScheduler(workers, max_active=4, initial_active=4)
+    assert scheduler.decide(IDLE, {"5555": 1.1}) == 4
+    scheduler.target = 2
+    assert scheduler.decide(IDLE, {"5555": 1.1}) == 3
+    # 截图耗时仍在膨胀时不增加
+    scheduler.cooldown = 0
+    assert scheduler.decide(IDLE, {"5555": 1.5}) == 2
+
+
+def test_decide_never_goes_below_min_active(workers):
+    scheduler = AdmissionScheduler(workers, min_active=2, initial_active=2)
+    assert scheduler.decide(BUSY, {}) == 2
+
+
+def test_apply_pauses_the_most_inflated_and_ignores_finished(workers):
+    scheduler = AdmissionScheduler(workers, initial_active=2)
+    scheduler.apply({"5555": 1.0, "5556": 3.0, "5557": 1.2, "5558": 2.0})
+    assert [worker.adb_port for worker in workers if worker.pause_requested.is_set()] == [
+        "5556",
+        "5558",
+    ]
+
+    # 运行中的设备退出后, 恢复一台暂停的设备补上名额
+    workers[0].finished = True
+    scheduler.apply({})
+    active = [
+        worker.adb_port
+        for worker in workers
+        if not worker.finished and not worker.pause_requested.is_set()
+    ]
+    assert len(active) == 2
+    assert "5557" in active
@@ -0,0 +1,87 @@
+import pytest
+import watchdog
+from watchdog import (
+    REMEDY_BACK,
+    REMEDY_DISMISS,
+    REMEDY_GIVE_UP,
+    REMEDY_RECONNECT,
+    REMEDY_RESTART,
+    ProgressWatchdog,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(watchdog.time, "time", clock.time)
+    return clock
+
+
+def test_escalates_then_repeats_the_last_remedy(clock):
+    dog = ProgressWatchdog(stall_seconds=90, step_seconds=60, max_stall_seconds=900)
+    remedies = []
+    for _ in range(int(600 / 5)):
+        clock.now += 5
+        remedies.append(dog.check())
+    assert [remedy for remedy in remedies if remedy] == [
+        REMEDY_BACK,
+        REMEDY_DISMISS,
+        REMEDY_RESTART,
+        REMEDY_RECONNECT,
+        REMEDY_RECONNECT,
+        REMEDY_RECONNECT,
+        REMEDY_RECONNECT,
+        REMEDY_RECONNECT,
+        REMEDY_RECONNECT,
+    ]
+    assert remedies.index(REMEDY_BACK) == int(90 / 5) - 1
+    clock.now += 300
+    assert dog.check() == REMEDY_GIVE_UP
+
+
+def test_new_marker_resets_escalation(clock):
+    dog = ProgressWatchdog(stall_seconds=90, step_seconds=60)
+    clock.now += 100
+    assert dog.check() == REMEDY_BACK
+    dog.progress("Home")
+    assert dog.stalled_seconds() == 0
+    clock.now += 100
+    assert dog.check() == REMEDY_BACK
+
+
+def test_bouncing_between_markers_is_not_progress(clock):
+    dog = ProgressWatchdog(stall_seconds=90, step_seconds=60)
+    dog.progress("A")
+    dog.progress("B")
+    remedy = None
+    for _ in range(20):
+        clock.now += 5
+        dog.progress("A")
+        dog.progress("B")
+        remedy = remedy or dog.check()
+    assert remedy == REMEDY_BACK
+
+
+def test_marker_counts_again_after_a_quiet_window(clock):
+    dog = ProgressWatchdog(stall_seconds=90, step_seconds=60)
+    dog.progress("A")
+    clock.now += 91
+    assert dog.check() == REMEDY_BACK
+    dog.progress("A")
+    assert dog.stalled_seconds() == 0
+
+
+def test_state_transitions_always_count(clock):
+    dog = ProgressWatchdog(stall_seconds=90, step_seconds=60)
+    for _ in range(3):
+        clock.now += 80
+        dog.transition("REGISTERED")
+        assert dog.check() is None
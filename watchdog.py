@@ -0,0 +1,81 @@
+import time
+
+DEFAULT_STALL_SECONDS = 90
+# 每级补救措施之间的间隔
+DEFAULT_STEP_SECONDS = 60
+# 超过该时间仍无进展时停止该设备
+DEFAULT_MAX_STALL_SECONDS = 15 * 60
+
+REMEDY_BACK = "back"
+REMEDY_DISMISS = "dismiss"
+REMEDY_RESTART = "restart"
+REMEDY_RECONNECT = "reconnect"
+REMEDY_GIVE_UP = "give_up"
+# 按代价从低到高排列, 用完后重复最后一级
+REMEDIES = (REMEDY_BACK, REMEDY_DISMISS, REMEDY_RESTART, REMEDY_RECONNECT)
+
+
+class ProgressWatchdog:
+    """
+    记录每台设备的进展 (状态切换与匹配到新的画面)
+    长时间没有进展时依次给出代价更高的补救措施
+    """
+
+    def __init__(
+        self,
+        stall_seconds=DEFAULT_STALL_SECONDS,
+        step_seconds=DEFAULT_STEP_SECONDS,
+        max_stall_seconds=DEFAULT_MAX_STALL_SECONDS,
+        remedies=REMEDIES,
+    ):
+        self.stall_seconds = stall_seconds
+        self.step_seconds = step_seconds
+        self.max_stall_seconds = max_stall_seconds
+        self.remedies = tuple(remedies)
+        # marker -> 最近一次出现的时间
+        self.seen = {}
+        self.last_progress = time.time()
+        self.level = 0
+
+    def progress(self, marker):
+        """
+        marker 在一个 stall_seconds 窗口内未出现过时视为有进展
+        在几个画面之间来回切换不算
+        """
+        now = time.time()
+        self.seen = {
+            seen_marker: seen_at
+            for seen_marker, seen_at in self.seen.items()
+            if now - seen_at < self.stall_seconds
+        }
+        is_new = marker not in self.seen
+        self.seen[marker] = now
+        if is_new:
+            self.reset()
+
+    def transition(self, state):
+        """
+        状态切换总是视为进展
+        """
+        self.seen[f"state:{state}"] = time.time()
+        self.reset()
+
+    def reset(self):
+        self.last_progress = time.time()
+        self.level = 0
+
+    def stalled_seconds(self):
+        return time.time() - self.last_progress
+
+    def check(self):
+        """
+        返回需要执行的补救措施, 没有时返回 None
+        """
+        stalled = self.stalled_seconds()
+        if stalled >= self.max_stall_seconds:
+            return REMEDY_GIVE_UP
+        if stalled < self.stall_seconds + self.level * self.step_seconds:
+            return None
+        remedy = self.remedies[min(self.level, len(self.remedies) - 1)]
+        self.level += 1
+        return remedy